@@ -0,0 +1,118 @@
+"""Active working set before and after archival of stale loads.
+
+Seeds a temporary SQLite file with --rows loads, of which --active-share
+have a load date in the future and the rest are long past (accumulated
+history); --undated-share of the history has a free-text date ("16.04")
+and a created_at long in the past. Times typical reads of the active list (first page, date
+filter, search, the last page) before and after one LoadArchiver.run_once,
+and reports how long the archival itself took.
+
+    python benchmarks/bench_archive.py --rows 500000 --active-share 0.02
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_server import ISO_DATE_GLOB, LoadArchiver, LoadStore  # noqa: E402
+
+CITIES = ["Ташкент", "Самарканд", "Бухара", "Андижан", "Москва", "Алматы", "Казань", "Екатеринбург"]
+TRANSPORT = ["Тент", "Реф", "Изотерм", "Борт"]
+
+
+def seed(store: LoadStore, rows: int, active_share: float, undated_share: float, chunk: int = 5000) -> None:
+    rnd = random.Random(42)
+    for start in range(0, rows, chunk):
+        batch = []
+        for i in range(start, min(start + chunk, rows)):
+            src, dst = rnd.sample(CITIES, 2)
+            if rnd.random() < active_share:
+                load_date = f"2026-11-{rnd.randint(1, 30):02d}"
+            elif rnd.random() < undated_share:
+                load_date = f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}"
+            else:
+                load_date = f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+            batch.append(
+                {
+                    "direction": f"{src} - {dst}",
+                    "cargo": f"Груз {i}",
+                    "transport": rnd.choice(TRANSPORT),
+                    "load_date": load_date,
+                    "extra": "",
+                }
+            )
+        store.create_many(batch)
+    # история: заявки без ISO-даты созданы давно
+    with store._conn() as conn:
+        conn.execute(
+            "UPDATE loads SET created_at = '2025-01-01T00:00:00+00:00', updated_at = created_at "
+            "WHERE load_date NOT GLOB ?",
+            (ISO_DATE_GLOB,),
+        )
+        conn.commit()
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(store: LoadStore, repeat: int) -> dict:
+    # последняя страница активных: курсор за последней активной строкой
+    pages = 0
+    before = None
+    while True:
+        page = store.list_page(limit=100, before=before)
+        pages += 1
+        if len(page) < 100:
+            break
+        before = (page[-1]["created_at"], page[-1]["id"])
+    return {
+        "first page": timed(lambda: store.list_page(limit=30), repeat),
+        "date_from": timed(lambda: store.list_page(limit=30, date_from="2026-11-20"), repeat),
+        "search": timed(lambda: store.list_page(limit=30, q="самарканд реф"), repeat),
+        "last page": timed(lambda: store.list_page(limit=100, before=before), repeat),
+        "pages of 100": pages,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--active-share", type=float, default=0.02)
+    parser.add_argument("--undated-share", type=float, default=0.02, help="history rows dated like 16.04")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LoadStore(os.path.join(tmp, "loads.db"))
+        seed(store, args.rows, args.active_share, args.undated_share)
+        before = measure(store, args.repeat)
+
+        started = time.perf_counter()
+        result = LoadArchiver(store, batch=5000).run_once()
+        archived = time.perf_counter() - started
+        after = measure(store, args.repeat)
+        with store._conn() as conn:
+            active = conn.execute("SELECT COUNT(*) FROM loads").fetchone()[0]
+
+    print(
+        f"rows={args.rows} expired={result['expired']} moved={result['moved']} in {archived:.1f}s, "
+        f"left in loads={active}"
+    )
+    for key in before:
+        unit = "" if key == "pages of 100" else "ms"
+        print(f"{key:>14}: before {before[key]:8.2f}{unit}  after {after[key]:8.2f}{unit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Broadcast fan-out against a fake Bot API.
+
+The fake bot enforces Telegram-like limits (global messages per second and
+one message per second per chat) and answers violations with
+TelegramRetryAfter, the way the real API does. A share of recipients have
+"blocked" the bot. Half-way through, the broadcaster is cancelled and
+--workers fresh ones resume together from the persisted queue, as after a
+restart into several webhook workers on one bot.db (each gets --rate
+divided by --workers). "duplicate deliveries" must stay at 0.
+
+    python benchmarks/bench_broadcast.py --users 500 --rate 25
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+
+from broadcast import Broadcaster  # noqa: E402
+from db import AsyncDB, dt_to_str, now_utc  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self, global_limit: int, blocked: set[int], latency: float):
+        self.global_limit = global_limit
+        self.blocked = blocked
+        self.latency = latency
+        self._window: deque[float] = deque()
+        self._chat_last: dict[int, float] = {}
+        self.delivered: dict[int, int] = {}
+        self.retry_after = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        while self._window and now - self._window[0] > 1.0:
+            self._window.popleft()
+        method = SendMessage(chat_id=chat_id, text=text)
+        if len(self._window) >= self.global_limit or now - self._chat_last.get(chat_id, -10.0) < 1.0:
+            self.retry_after += 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+        self._window.append(now)
+        self._chat_last[chat_id] = now
+        self.delivered[chat_id] = self.delivered.get(chat_id, 0) + 1
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=25.0)
+    parser.add_argument("--api-limit", type=int, default=30)
+    parser.add_argument("--blocked", type=float, default=0.02)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--workers", type=int, default=2, help="broadcasters resuming after the restart")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDB(os.path.join(tmp, "bench.db"))
+        until = dt_to_str(now_utc() + timedelta(days=7))
+        with db.sync._conn() as c:
+            c.executemany(
+                "INSERT INTO users(tg_id, created_at, access_until) VALUES(?, ?, ?)",
+                [(100_000 + i, until, until) for i in range(args.users)],
+            )
+            c.commit()
+
+        user_ids = await db.list_active_user_ids()
+        blocked = set(random.sample(user_ids, int(len(user_ids) * args.blocked)))
+        bot = FakeBot(args.api_limit, blocked, args.latency)
+
+        first = Broadcaster(bot, db, rate=args.rate)
+        await first.enqueue(1, "🆕 *Новая заявка*")
+        started = time.perf_counter()
+
+        # "рестарт" посередине рассылки
+        task = asyncio.create_task(first.run())
+        await asyncio.sleep(args.users / args.rate / 2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        print(f"restart after {sum(bot.delivered.values())} deliveries")
+
+        workers = [Broadcaster(bot, db, rate=args.rate / args.workers) for _ in range(args.workers)]
+        for i, worker in enumerate(workers):
+            worker.owner += f"/{i}"
+        tasks = [asyncio.create_task(worker.run()) for worker in workers]
+        while True:
+            jobs = await db.list_broadcasts(limit=1)
+            if jobs and jobs[0]["finished_at"]:
+                break
+            await asyncio.sleep(0.2)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        job = jobs[0]
+        duplicates = sum(1 for n in bot.delivered.values() if n > 1)
+        print(
+            f"users={args.users} sent={job['sent']} failed={job['failed']} "
+            f"in {elapsed:.1f}s -> {job['sent'] / elapsed:.1f} msg/s "
+            f"(RetryAfter from fake API: {bot.retry_after}, duplicate deliveries: {duplicates})"
+        )
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""Rows/sec: single-row POST /api/loads versus POST /api/loads/bulk.
+
+Runs the Flask app in-process (test client) against a temporary SQLite
+file, so the numbers measure the app and SQLite, not the network. Each
+mode posts its own distinct loads; "bulk retry" re-posts the NDJSON
+batch, so every row is answered as a duplicate of an existing load.
+
+    python benchmarks/bench_bulk_ingest.py --rows 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_rows(n: int, tag: str) -> list[dict]:
+    # одинаковые заявки сервер считает дублями — у каждого режима свои
+    return [
+        {
+            "direction": f"Ташкент - Москва #{tag}{i}",
+            "cargo": "Текстиль, 20 тонн",
+            "transport": "Тент",
+            "date": "2026-04-16",
+            "extra": "Срочная погрузка",
+        }
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["LOADS_DB_PATH"] = os.path.join(tmp, "loads.db")
+        os.environ["SERVER_API_KEY"] = ""
+        from load_server import create_app
+
+        client = create_app().test_client()
+
+        started = time.perf_counter()
+        for row in make_rows(args.rows, "s"):
+            assert client.post("/api/loads", json=row).status_code == 201
+        single = time.perf_counter() - started
+
+        body = json.dumps(make_rows(args.rows, "a"), ensure_ascii=False).encode("utf-8")
+        started = time.perf_counter()
+        resp = client.post("/api/loads/bulk", data=body, content_type="application/json")
+        array = time.perf_counter() - started
+        assert resp.json["inserted"] == args.rows, resp.json
+
+        body = "\n".join(json.dumps(row, ensure_ascii=False) for row in make_rows(args.rows, "n")).encode("utf-8")
+        started = time.perf_counter()
+        resp = client.post("/api/loads/bulk", data=body, content_type="application/x-ndjson")
+        ndjson = time.perf_counter() - started
+        assert resp.json["inserted"] == args.rows, resp.json
+
+        started = time.perf_counter()
+        resp = client.post("/api/loads/bulk", data=body, content_type="application/x-ndjson")
+        retry = time.perf_counter() - started
+        assert resp.json["duplicates"] == args.rows, resp.json
+
+    modes = (("single POST", single), ("bulk array", array), ("bulk ndjson", ndjson), ("bulk retry", retry))
+    for name, elapsed in modes:
+        print(f"{name:<12} {args.rows / elapsed:10.1f} rows/s  ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
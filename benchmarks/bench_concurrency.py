@@ -0,0 +1,174 @@
+"""Read throughput of /loads/latest while writes keep arriving through /api/loads.
+
+For every --modes value a child process seeds a temporary loads.db and
+serves load_server.app the way ``python load_server.py`` does in that
+SERVER_MODE: waitress with a fixed pool of --threads threads
+(production) or werkzeug's thread-per-request server (dev). The parent
+runs two phases against it, each --duration seconds long:
+
+- idle:   --concurrency readers GET /loads/latest, nothing else
+- writes: the same readers while --writers clients POST /api/loads
+          at --write-rate loads per second in total
+
+Readers never send If-None-Match, so every write makes the next reads
+rebuild the page from SQLite. Writes that fail (for example with
+"database is locked") are counted as errors.
+
+    python benchmarks/bench_concurrency.py --rows 20000 --duration 10 --json concurrency.json
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+import aiohttp
+
+from common import print_results, random_load, seed_loads, summarize, write_results
+
+MODES = ["production", "dev"]
+
+
+def serve(mode: str, rows: int, threads: int, ready, stop) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["LOADS_DB_PATH"] = os.path.join(tmp, "loads.db")
+        os.environ["SERVER_API_KEY"] = ""
+        os.chdir(tmp)
+        import logging
+
+        import load_server
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        logging.getLogger("waitress.queue").setLevel(logging.ERROR)
+        seed_loads(load_server.LoadStore(os.environ["LOADS_DB_PATH"]), rows)
+        if mode == "production":
+            from waitress import create_server
+
+            server = create_server(load_server.app, host="127.0.0.1", port=0, threads=threads)
+            threading.Thread(target=server.run, daemon=True).start()
+            ready.put(server.effective_port)
+            stop.wait()
+            server.close()
+        else:
+            from werkzeug.serving import make_server
+
+            server = make_server("127.0.0.1", 0, load_server.app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            ready.put(server.server_port)
+            stop.wait()
+            server.shutdown()
+
+
+async def read_loop(session: aiohttp.ClientSession, url: str, until: float, latencies: list, errors: list):
+    while time.perf_counter() < until:
+        t0 = time.perf_counter()
+        try:
+            async with session.get(url) as r:
+                await r.read()
+                ok = r.status == 200
+        except aiohttp.ClientError:
+            ok = False
+        if ok:
+            latencies.append((time.perf_counter() - t0) * 1000)
+        else:
+            errors[0] += 1
+
+
+async def write_loop(
+    session: aiohttp.ClientSession, url: str, until: float, interval: float, ids, latencies: list, errors: list
+):
+    rnd = random.Random()
+    next_at = time.perf_counter()
+    while time.perf_counter() < until:
+        i = next(ids)
+        t0 = time.perf_counter()
+        try:
+            async with session.post(url, json={**random_load(rnd, i), "date": "2026-11-20"}) as r:
+                await r.read()
+                ok = r.status == 201
+        except aiohttp.ClientError:
+            ok = False
+        if ok:
+            latencies.append((time.perf_counter() - t0) * 1000)
+        else:
+            errors[0] += 1
+        # постоянный темп: если запись затянулась, следующая уходит сразу
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+
+async def run_phases(base: str, args, ids) -> dict:
+    results = {}
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for phase in ("idle", "writes"):
+            reads: list[float] = []
+            writes: list[float] = []
+            read_errors, write_errors = [0], [0]
+            started = time.perf_counter()
+            until = started + args.duration
+            tasks = [
+                read_loop(session, f"{base}/loads/latest", until, reads, read_errors) for _ in range(args.concurrency)
+            ]
+            if phase == "writes":
+                interval = args.writers / args.write_rate
+                tasks += [
+                    write_loop(session, f"{base}/api/loads", until, interval, ids, writes, write_errors)
+                    for _ in range(args.writers)
+                ]
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+            results[f"latest/{phase}"] = summarize(reads, elapsed, read_errors[0])
+            if phase == "writes":
+                results["api_post/writes"] = summarize(writes, elapsed, write_errors[0])
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated: production,dev")
+    parser.add_argument("--rows", type=int, default=20000, help="loads seeded before the run")
+    parser.add_argument("--threads", type=int, default=8, help="waitress threads (SERVER_THREADS)")
+    parser.add_argument("--concurrency", type=int, default=16, help="parallel readers")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--write-rate", type=float, default=50, help="loads per second, all writers together")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per phase")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    # номера партий не повторяются между режимами — иначе записи отсеялись бы как дубли
+    ids = iter(range(args.rows, 10**9))
+    for mode in modes:
+        ready, stop = ctx.Queue(), ctx.Event()
+        server = ctx.Process(target=serve, args=(mode, args.rows, args.threads, ready, stop))
+        server.start()
+        port = ready.get(timeout=600)
+        try:
+            for name, r in asyncio.run(run_phases(f"http://127.0.0.1:{port}", args, ids)).items():
+                results[f"concurrency/{mode}/{name}"] = r
+        finally:
+            stop.set()
+            server.join(5)
+            if server.is_alive():
+                server.terminate()
+
+    print_results(results)
+    if args.json:
+        params = {
+            "rows": args.rows, "threads": args.threads, "concurrency": args.concurrency,
+            "writers": args.writers, "write_rate": args.write_rate, "duration": args.duration,
+        }
+        write_results(args.json, "concurrency", params, results)
+
+
+if __name__ == "__main__":
+    main()
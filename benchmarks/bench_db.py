@@ -0,0 +1,83 @@
+"""Updates/sec of the bot's persistence layer under concurrent synthetic traffic.
+
+Every synthetic update replays what the /start handler does
+(ensure_user, has_access, get_access_until, get_phone); every tenth one
+also saves a phone and creates an access request. The same traffic is run
+through the blocking ``DB`` (called straight from the event loop, as the
+bot used to) and through ``AsyncDB``. A heartbeat task measures how long
+the event loop was stalled.
+
+    python benchmarks/bench_db.py --updates 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DB, AsyncDB  # noqa: E402
+
+
+async def heartbeat(stop: asyncio.Event, lags: list[float], interval: float = 0.005) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - t0 - interval)
+
+
+async def run(name: str, db, total: int, concurrency: int, is_async: bool) -> None:
+    async def call(fn, *args):
+        return await fn(*args) if is_async else fn(*args)
+
+    async def update(i: int) -> None:
+        tg_id = 1_000_000 + i % 2000
+        await call(db.ensure_user, tg_id)
+        if await call(db.has_access, tg_id):
+            await call(db.get_access_until, tg_id)
+        phone = await call(db.get_phone, tg_id)
+        if i % 10 == 0:
+            await call(db.set_phone, tg_id, phone or f"+99890{tg_id % 10_000_000:07d}")
+            await call(db.create_access_request, tg_id, phone or "+998900000000")
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            await update(i)
+
+    stop = asyncio.Event()
+    lags: list[float] = []
+    hb = asyncio.create_task(heartbeat(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await hb
+
+    max_lag = max(lags, default=0.0) * 1000
+    print(f"{name:<8} {total / elapsed:9.1f} updates/s  max loop stall={max_lag:7.2f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_db = DB(os.path.join(tmp, "sync.db"))
+        await run("DB", sync_db, args.updates, args.concurrency, is_async=False)
+
+        async_db = AsyncDB(os.path.join(tmp, "async.db"))
+        try:
+            await run("AsyncDB", async_db, args.updates, args.concurrency, is_async=True)
+        finally:
+            await async_db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""Latency of bot.py handlers fed through Dispatcher.feed_update.
+
+Builds the real dispatcher from bot.create_dispatcher() on a Bot whose
+session is faked (every Telegram call succeeds locally) and feeds it
+synthetic updates with --concurrency of them in flight. bot.db is a
+temporary file seeded with --users users; the loads list is served from
+ServerClient's cache, so nothing leaves the machine. Scenarios:
+
+- start_new:     /start from a user without a phone (asks for it)
+- phone_text:    the phone number typed by that user (access request)
+- start_access:  /start from a user with active access
+- status:        the "status" button
+- loads:         the "loads" button (first page of --loads loads)
+- loads_page:    the "next page" button (edits the message)
+
+    python benchmarks/bench_handlers.py --updates 2000 --users 10000 --json handlers.json
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from common import bot_env, fake_bot, print_results, random_load, summarize, write_results
+
+SCENARIOS = ["start_new", "phone_text", "start_access", "status", "loads", "loads_page"]
+
+
+def user(tg_id: int) -> dict:
+    return {"id": tg_id, "is_bot": False, "first_name": f"u{tg_id}"}
+
+
+def message_update(update_id: int, tg_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": tg_id, "type": "private"},
+        "from": user(tg_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id: int, tg_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user(tg_id),
+            "chat_instance": "1",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": tg_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "bench"},
+                "text": "menu",
+            },
+        },
+    }
+
+
+async def run(args) -> dict:
+    from aiogram.types import Update
+
+    import bot as app
+    from db import dt_to_str
+
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    tg_bot = fake_bot()
+    dp = app.create_dispatcher(tg_bot)
+
+    # пользователи с доступом: 1..users; новые (без телефона) — начиная с 10**9
+    until = dt_to_str(datetime(2099, 1, 1, tzinfo=timezone.utc))
+    with app.db.sync._conn() as c:
+        c.executemany(
+            "INSERT OR IGNORE INTO users(tg_id, created_at, phone, access_until) VALUES(?, ?, ?, ?)",
+            [(tg_id, until, f"+99890{tg_id:07d}", until) for tg_id in range(1, args.users + 1)],
+        )
+        c.commit()
+
+    # список заявок — из общего кэша ServerClient, как между обновлениями с сервера
+    rnd = random.Random(3)
+    data = {
+        "loads": [{"id": i, **random_load(rnd, i), "date": "2026-11-20", "updated_at": "x"} for i in range(args.loads)],
+        "updated_at": "2026-11-01T00:00:00+00:00",
+    }
+    app.server.base = "http://bench.invalid"
+    app.server.cache_ttl = 1e9
+    app.server._cached = {"ok": True, "data": data, "version": data["updated_at"]}
+    app.server._cached_at = time.monotonic()
+
+    update_ids = itertools.count(1)
+    new_users = itertools.count(10**9)
+    known = itertools.cycle(range(1, args.users + 1))
+    fresh: list[int] = []
+
+    def make(name: str) -> dict:
+        n = next(update_ids)
+        if name == "start_new":
+            tg_id = next(new_users)
+            fresh.append(tg_id)
+            return message_update(n, tg_id, "/start")
+        if name == "phone_text":
+            tg_id = fresh.pop()
+            return message_update(n, tg_id, f"+99893{tg_id % 10**7:07d}")
+        tg_id = next(known)
+        if name == "start_access":
+            return message_update(n, tg_id, "/start")
+        if name == "status":
+            return callback_update(n, tg_id, "status")
+        if name == "loads":
+            return callback_update(n, tg_id, "loads")
+        return callback_update(n, tg_id, "loads:page:1")
+
+    results = {}
+    for name in args.scenarios:
+        updates = [Update.model_validate(make(name), context={"bot": tg_bot}) for _ in range(args.updates)]
+        latencies: list[float] = []
+        errors = 0
+        queue = iter(updates)
+
+        async def worker():
+            nonlocal errors
+            for update in queue:
+                t0 = time.perf_counter()
+                try:
+                    await dp.feed_update(tg_bot, update)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        results[f"handlers/{name}"] = summarize(latencies, time.perf_counter() - started, errors)
+
+    await app.db.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000, help="updates per scenario")
+    parser.add_argument("--users", type=int, default=10_000, help="users with access in bot.db")
+    parser.add_argument("--loads", type=int, default=30, help="loads in the cached list")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if "phone_text" in args.scenarios and "start_new" not in args.scenarios:
+        parser.error("phone_text needs start_new before it")
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot_env(tmp)
+        results = asyncio.run(run(args))
+
+    print_results(results)
+    if args.json:
+        params = {"updates": args.updates, "users": args.users, "loads": args.loads, "concurrency": args.concurrency}
+        write_results(args.json, "handlers", params, results)
+
+
+if __name__ == "__main__":
+    main()
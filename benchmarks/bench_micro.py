@@ -0,0 +1,98 @@
+"""Microbenchmarks: list rendering, phone normalization and DB methods.
+
+Times single calls in a tight loop, with no event loop or network around
+them:
+
+- render/*: LoadRenderer.pages for the /loads list (it replaced
+  format_loads) with a cold and a warm fragment cache, and
+  format_new_load for broadcasts;
+- normalize_phone/*: a valid, a formatted and an invalid number;
+- db/*: the bot's DB methods on a temporary bot.db with --users users
+  (the persistent WAL connection AsyncDB runs on).
+
+    python benchmarks/bench_micro.py --repeat 5000 --users 10000 --json micro.json
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+from datetime import datetime, timezone
+
+from common import bot_env, measure, print_results, random_load, write_results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--loads", type=int, default=30, help="loads in the rendered list")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bot_env(tmp)
+        import bot
+        from db import DB, dt_to_str
+        from render import LoadRenderer
+
+        rnd = random.Random(5)
+        data = {
+            "loads": [
+                {"id": i, **random_load(rnd, i), "date": "2026-11-20", "updated_at": "x"} for i in range(args.loads)
+            ],
+            "updated_at": "2026-11-01T00:00:00+00:00",
+        }
+        warm = LoadRenderer()
+        warm.pages(data)
+        results["render/pages_cold"] = measure(lambda: LoadRenderer().pages(data), args.repeat)
+        results["render/pages_warm"] = measure(lambda: warm.pages(data), args.repeat)
+        item = data["loads"][0]
+        results["render/format_new_load"] = measure(lambda: bot.format_new_load(item), args.repeat)
+
+        results["normalize_phone/valid"] = measure(lambda: bot.normalize_phone("+998901234567"), args.repeat)
+        results["normalize_phone/formatted"] = measure(lambda: bot.normalize_phone("998 (90) 123-45-67"), args.repeat)
+        results["normalize_phone/invalid"] = measure(lambda: bot.normalize_phone("8 900 123 45 67"), args.repeat)
+
+        db = DB(os.path.join(tmp, "micro.db"), persistent=True)
+        until = dt_to_str(datetime(2099, 1, 1, tzinfo=timezone.utc))
+        with db._conn() as c:
+            c.executemany(
+                "INSERT INTO users(tg_id, created_at, phone, access_until) VALUES(?, ?, ?, ?)",
+                [(tg_id, until, f"+99890{tg_id:07d}", until) for tg_id in range(1, args.users + 1)],
+            )
+            c.commit()
+
+        known = itertools.cycle(range(1, args.users + 1))
+        fresh = itertools.count(10**9)
+        results["db/ensure_user_existing"] = measure(lambda: db.ensure_user(next(known)), args.repeat)
+        results["db/ensure_user_new"] = measure(lambda: db.ensure_user(next(fresh)), args.repeat)
+        results["db/get_phone"] = measure(lambda: db.get_phone(next(known)), args.repeat)
+        results["db/has_access_cached"] = measure(lambda: db.has_access(1), args.repeat, warmup=1)
+        results["db/load_access_until"] = measure(lambda: db._load_access_until(next(known)), args.repeat)
+        results["db/set_phone"] = measure(lambda: db.set_phone(next(known), "+998901234567"), args.repeat)
+        results["db/create_access_request"] = measure(
+            lambda: db.create_access_request(next(known), "+998901234567"), args.repeat
+        )
+        results["db/set_phone_and_request"] = measure(
+            lambda: db.set_phone_and_request(next(known), "+998901234567"), args.repeat
+        )
+        results["db/list_pending"] = measure(lambda: db.list_pending(20), max(1, args.repeat // 10))
+        results["db/list_active_user_ids"] = measure(db.list_active_user_ids, max(1, args.repeat // 100))
+        # pending-заявки создал create_access_request выше, по одной на пользователя
+        pending = [row["id"] for row in db.list_pending(args.repeat)]
+        results["db/approve_and_grant"] = measure(lambda: db.approve_and_grant(pending.pop(), 1, 7), len(pending))
+        db.close()
+        bot.db.sync.close()
+
+    print_results(results)
+    if args.json:
+        params = {"repeat": args.repeat, "users": args.users, "loads": args.loads}
+        write_results(args.json, "micro", params, results)
+
+
+if __name__ == "__main__":
+    main()
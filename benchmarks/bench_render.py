@@ -0,0 +1,67 @@
+"""Rendering the loads list: cold versus cached fragments, and page sizes.
+
+Renders --loads synthetic loads (long fields, Markdown special characters)
+through render.LoadRenderer the way the bot does for /loads: first with an
+empty fragment cache, then again with every load already cached, as after
+a page click or the next refresh of an unchanged list. Checks that every
+page stays under Telegram's 4096 UTF-16 unit limit.
+
+    python benchmarks/bench_render.py --loads 100 --rounds 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render import LoadRenderer, tg_len  # noqa: E402
+
+CITIES = ["Ташкент", "Самарканд", "Бухара", "Москва", "Алматы", "Казань", "Екатеринбург"]
+
+
+def make_loads(n: int, rnd: random.Random) -> dict:
+    loads = []
+    for i in range(n):
+        a, b = rnd.sample(CITIES, 2)
+        loads.append(
+            {
+                "id": i + 1,
+                "direction": f"{a} - {b}",
+                "cargo": f"Текстиль_{i}, *{rnd.randint(1, 25)} т*",
+                "transport": rnd.choice(["Тент", "Реф", "Изотерм"]),
+                "date": "2026-04-16",
+                "extra": "Срочно 🚚 [оплата_нал] " * rnd.randint(0, 20),
+                "updated_at": "2026-04-16 10:00:00",
+            }
+        )
+    return {"ok": True, "loads": loads, "updated_at": "2026-04-16 10:00:00"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loads", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    data = make_loads(args.loads, random.Random(7))
+    cold, warm = [], []
+    for _ in range(args.rounds):
+        renderer = LoadRenderer()
+        started = time.perf_counter()
+        pages = renderer.pages(data)
+        cold.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        renderer.pages(data)
+        warm.append((time.perf_counter() - started) * 1000)
+
+    sizes = [tg_len(p) for p in pages]
+    print(f"loads={args.loads} pages={len(pages)} max page={max(sizes)} UTF-16 units (limit 4096)")
+    print(f"cold: p50={statistics.median(cold):.2f}ms  cached: p50={statistics.median(warm):.2f}ms")
+    print(f"cache: {renderer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
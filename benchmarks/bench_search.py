@@ -0,0 +1,84 @@
+"""Search latency over the loads FTS5 index (q=, transport=, date range).
+
+Seeds a temporary SQLite file through LoadStore.create_many (so the FTS
+triggers run exactly as in production) and times LoadStore.list_page for
+a few typical driver queries.
+
+    python benchmarks/bench_search.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_server import LoadStore  # noqa: E402
+
+CITIES = [
+    "Ташкент", "Tashkent", "Самарканд", "Samarqand", "Бухара", "Buxoro", "Андижан", "Наманган",
+    "Фергана", "Нукус", "Москва", "Алматы", "Бишкек", "Екатеринбург", "Новосибирск", "Казань",
+]
+CARGO = ["Текстиль", "Цемент", "Хлопок", "Мука", "Фрукты", "Стройматериалы", "Оборудование"]
+TRANSPORT = ["Тент", "Реф", "Изотерм", "Борт", "Контейнер"]
+
+QUERIES = [
+    {"q": "ташкент"},
+    {"q": "tashkent moskva"},
+    {"q": "самарк"},
+    {"q": "нукус казань", "transport": "реф"},
+    {"q": "хлопок", "date_from": "2026-04-10", "date_to": "2026-04-20"},
+    {"transport": "изотерм"},
+]
+
+
+def seed(store: LoadStore, rows: int, chunk: int = 5000) -> None:
+    rnd = random.Random(42)
+    for start in range(0, rows, chunk):
+        batch = []
+        for i in range(start, min(start + chunk, rows)):
+            src, dst = rnd.sample(CITIES, 2)
+            batch.append(
+                {
+                    "direction": f"{src} - {dst}",
+                    "cargo": f"{rnd.choice(CARGO)}, {rnd.randint(1, 25)} тонн",
+                    "transport": rnd.choice(TRANSPORT),
+                    "load_date": f"2026-04-{rnd.randint(1, 30):02d}",
+                    "extra": f"Заявка {i}",
+                }
+            )
+        store.create_many(batch)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LoadStore(os.path.join(tmp, "loads.db"))
+        started = time.perf_counter()
+        seed(store, args.rows)
+        print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+        for filters in QUERIES:
+            timings = []
+            found = 0
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                found = len(store.list_page(limit=30, **filters))
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(
+                f"{str(filters):<70} found={found:<3} "
+                f"p50={statistics.median(timings):6.2f}ms p95={p95:6.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""HTTP throughput and latency of load_server.py endpoints at several DB sizes.
+
+For every --rows value a child process seeds a temporary loads.db through
+LoadStore.create_many and serves create_app() with werkzeug's threaded
+server, the same server ``app.run(threaded=True)`` uses. The parent keeps
+--concurrency aiohttp requests in flight against each scenario:
+
+- latest:      GET /loads/latest (what the bot polls)
+- latest_304:  GET /loads/latest with If-None-Match (the bot's revalidation)
+- latest_msgpack: GET /loads/latest with Accept: application/msgpack
+- api_list:    GET /api/loads?limit=30
+- api_page:    GET /api/loads?limit=30&cursor=... (a page in the middle)
+- api_search:  GET /api/loads?q=ташкент реф
+- api_post:    POST /api/loads (JSON)
+- form_post:   POST / (the web form, answered with a redirect)
+- index:       GET / (only when templates/index.html is present)
+
+    python benchmarks/bench_server.py --rows 1000,100000 --concurrency 16 --json server.json
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+import aiohttp
+
+from common import ROOT, print_results, random_load, seed_loads, summarize, write_results
+
+SCENARIOS = ["latest", "latest_304", "latest_msgpack", "api_list", "api_page", "api_search", "api_post", "form_post", "index"]
+
+
+def serve(rows: int, ready, stop) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["LOADS_DB_PATH"] = os.path.join(tmp, "loads.db")
+        os.environ["SERVER_API_KEY"] = ""
+        os.chdir(tmp)
+        import logging
+
+        from werkzeug.serving import make_server
+
+        import load_server
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        seed_loads(load_server.LoadStore(os.environ["LOADS_DB_PATH"]), rows)
+        server = make_server("127.0.0.1", 0, load_server.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ready.put(server.server_port)
+        stop.wait()
+        server.shutdown()
+
+
+async def drive(session: aiohttp.ClientSession, make_request, total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, kwargs, ok = make_request(i)
+            t0 = time.perf_counter()
+            try:
+                async with session.request(method, url, allow_redirects=False, **kwargs) as r:
+                    await r.read()
+                    status = r.status
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            if status not in ok:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run_scenarios(base: str, args) -> dict:
+    results = {}
+    rnd = random.Random(1)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.get(f"{base}/loads/latest") as r:
+            etag = r.headers.get("ETag", "")
+        async with session.get(f"{base}/api/loads", params={"limit": 30}) as r:
+            cursor = (await r.json())["next_cursor"] or ""
+
+        requests = {
+            "latest": lambda i: ("GET", f"{base}/loads/latest", {}, (200,)),
+            "latest_304": lambda i: ("GET", f"{base}/loads/latest", {"headers": {"If-None-Match": etag}}, (304,)),
+            "latest_msgpack": lambda i: (
+                "GET", f"{base}/loads/latest", {"headers": {"Accept": "application/msgpack"}}, (200,)
+            ),
+            "api_list": lambda i: ("GET", f"{base}/api/loads", {"params": {"limit": 30}}, (200,)),
+            "api_page": lambda i: ("GET", f"{base}/api/loads", {"params": {"limit": 30, "cursor": cursor}}, (200,)),
+            "api_search": lambda i: ("GET", f"{base}/api/loads", {"params": {"q": "ташкент реф"}}, (200,)),
+            "api_post": lambda i: (
+                "POST", f"{base}/api/loads", {"json": {**random_load(rnd, i), "date": "2026-11-20"}}, (201,)
+            ),
+            "form_post": lambda i: (
+                "POST", f"{base}/", {"data": {**random_load(rnd, i), "date": "2026-11-20"}}, (302,)
+            ),
+            "index": lambda i: ("GET", f"{base}/", {}, (200,)),
+        }
+        for name in args.scenarios:
+            if name == "index" and not os.path.exists(os.path.join(ROOT, "templates", "index.html")):
+                print("index: skipped, templates/index.html is not in this checkout")
+                continue
+            # записи идут после чтений: иначе чтения мерили бы уже другую базу
+            results[name] = await drive(session, requests[name], args.requests, args.concurrency)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="1000,100000", help="comma-separated DB sizes")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for rows in (int(r) for r in args.rows.split(",")):
+        ready, stop = ctx.Queue(), ctx.Event()
+        server = ctx.Process(target=serve, args=(rows, ready, stop))
+        server.start()
+        port = ready.get(timeout=600)
+        try:
+            for name, r in asyncio.run(run_scenarios(f"http://127.0.0.1:{port}", args)).items():
+                results[f"server/{name}/rows={rows}"] = r
+        finally:
+            stop.set()
+            server.join(5)
+            if server.is_alive():
+                server.terminate()
+
+    print_results(results)
+    if args.json:
+        params = {"rows": args.rows, "requests": args.requests, "concurrency": args.concurrency}
+        write_results(args.json, "server", params, results)
+
+
+if __name__ == "__main__":
+    main()
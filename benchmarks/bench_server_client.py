@@ -0,0 +1,106 @@
+"""Before/after benchmark for ServerClient.get_loads.
+
+Starts a local aiohttp server that mimics ``/loads/latest`` and compares
+the old "new ClientSession per call" behaviour with the pooled session
+and with the shared, single-flight loads cache.
+
+    python benchmarks/bench_server_client.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import aiohttp
+from aiohttp import web
+
+from common import percentile
+from server_client import ServerClient
+
+
+PAYLOAD = {
+    "loads": [
+        {
+            "direction": "Ташкент - Москва",
+            "cargo": "Текстиль, 20 тонн",
+            "transport": "Тент",
+            "date": "2026-04-16",
+            "extra": "",
+        }
+    ]
+    * 30,
+    "updated_at": "2026-04-16T08:00:00+00:00",
+}
+
+
+async def loads_latest(request: web.Request) -> web.Response:
+    return web.json_response(PAYLOAD)
+
+
+async def get_loads_per_call_session(client: ServerClient, tg_id: int) -> dict:
+    # поведение до пула: отдельная сессия и коннектор на каждый вызов
+    url = f"{client.base}{client.endpoint}"
+    timeout = aiohttp.ClientTimeout(total=client.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(url, params={"tg_id": tg_id}) as r:
+            return {"ok": r.status == 200, "data": await r.json()}
+
+
+async def run(name: str, call, total: int, concurrency: int) -> None:
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            t0 = time.perf_counter()
+            resp = await call(i)
+            latencies.append(time.perf_counter() - t0)
+            assert resp["ok"], resp
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    ms = [x * 1000 for x in latencies]
+    print(
+        f"{name:<12} {total / elapsed:9.1f} req/s  "
+        f"p50={statistics.median(ms):7.2f}ms  "
+        f"p95={percentile(ms, 0.95):7.2f}ms  "
+        f"p99={percentile(ms, 0.99):7.2f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    app = web.Application()
+    app.router.add_get("/loads/latest", loads_latest)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    os.environ["SERVER_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["SERVER_API_KEY"] = ""
+    client = ServerClient()
+    try:
+        await run(
+            "per-call",
+            lambda i: get_loads_per_call_session(client, i),
+            args.requests,
+            args.concurrency,
+        )
+        await client.start()
+        await run("pooled", lambda i: client._fetch_loads(), args.requests, args.concurrency)
+        await run("cached", lambda i: client.get_loads(i), args.requests, args.concurrency)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Fan-out latency of the load stream with many open SSE listeners.
+
+A child process runs LoadEvents (the aiohttp stream server from
+load_server.py) on a temporary SQLite file and, once all listeners are
+connected, creates --loads loads through LoadStore.create_load from a
+worker thread (as a Flask request would). The parent opens --listeners
+SSE connections to /api/loads/stream and measures the time from each
+write to its arrival at every listener. The child reports how many OS
+threads it needed for all those connections.
+
+    python benchmarks/bench_stream.py --listeners 500 --loads 50
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+
+PORT = 5095
+
+
+def raise_fd_limit(want: int) -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < want:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(want, hard), hard))
+
+
+def serve(args, started, go, threads) -> None:
+    from load_server import LoadEvents, LoadStore
+
+    raise_fd_limit(args.listeners + 256)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LoadStore(os.path.join(tmp, "loads.db"))
+        events = LoadEvents(store)
+        store.listeners.append(events.notify)
+        events.start("127.0.0.1", PORT)
+        started.set()
+        go.wait()
+        threads.value = threading.active_count()
+        for n in range(args.loads):
+            # время записи уезжает к слушателям в поле extra
+            store.create_load(
+                direction="Ташкент - Москва", cargo=f"Текстиль, партия {n}", transport="Тент", load_date="2026-04-16",
+                extra=repr(time.time()),
+            )
+            time.sleep(args.interval)
+        time.sleep(5)
+
+
+async def listen(session: aiohttp.ClientSession, latencies: list, connected: list):
+    async with session.get(f"http://127.0.0.1:{PORT}/api/loads/stream") as r:
+        connected[0] += 1
+        data = []
+        async for raw in r.content:
+            line = raw.decode("utf-8").rstrip("\n")
+            if line.startswith("data: "):
+                data.append(line[6:])
+            elif not line and data:
+                now = time.time()
+                for item in json.loads("".join(data))["loads"]:
+                    latencies.append((now - float(item["extra"])) * 1000)
+                data = []
+
+
+async def run(args) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    started, go = ctx.Event(), ctx.Event()
+    threads = ctx.Value("i", 0)
+    server = ctx.Process(target=serve, args=(args, started, go, threads))
+    server.start()
+    started.wait(30)
+
+    latencies: list[float] = []
+    connected = [0]
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [asyncio.create_task(listen(session, latencies, connected)) for _ in range(args.listeners)]
+        while connected[0] < args.listeners:
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.2)
+        go.set()
+
+        total = args.listeners * args.loads
+        deadline = time.monotonic() + args.loads * args.interval + 10
+        while len(latencies) < total and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    server.terminate()
+    server.join()
+
+    latencies.sort()
+    print(f"listeners={args.listeners} loads={args.loads} delivered={len(latencies)}/{total}")
+    print(f"server process threads: {threads.value}")
+    print(
+        f"write -> listener: p50={statistics.median(latencies):.1f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f}ms max={latencies[-1]:.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listeners", type=int, default=500)
+    parser.add_argument("--loads", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.1)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.listeners + 256)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
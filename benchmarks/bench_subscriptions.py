@@ -0,0 +1,119 @@
+"""Route subscriptions: index rebuild time and per-load match latency.
+
+Stores N random subscriptions in a temporary bot.db, rebuilds the
+RouteMatcher from DB.list_subscriptions() the way bot.py does at startup,
+then matches random loads against it. Before that it checks that a
+subscription and a load naming the same city differently (ALIAS_PAIRS)
+still match, and exits with an error if one does not.
+
+    python benchmarks/bench_subscriptions.py --subs 50000 --loads 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DB  # noqa: E402
+from subscriptions import RouteMatcher, parse_subscription  # noqa: E402
+
+CITIES = [
+    "Ташкент", "Tashkent", "Самарканд", "Samarqand", "Бухара", "Андижан", "Наманган", "Фергана",
+    "Нукус", "Термез", "Карши", "Москва", "Moskva", "Алматы", "Бишкек", "Екатеринбург",
+    "Новосибирск", "Казань", "Ташкентская обл.", "Санкт-Петербург", "Краснодар", "Уфа",
+]
+TRANSPORT = ["Тент", "Реф", "Изотерм", "Борт", "Контейнер", "Ref"]
+
+# одно и то же место в подписке и в заявке, записанное по-разному
+ALIAS_PAIRS = [
+    ("Ташкент", "Toshkent"),
+    ("Tashkent", "г. Ташкент"),
+    ("Москва", "Moscow"),
+    ("msk", "Москва"),
+    ("Санкт-Петербург", "SPb"),
+    ("Питер", "Saint Petersburg"),
+    ("Андижан", "Andijon"),
+    ("Бухара", "Bukhara"),
+    ("Фергана", "Farg'ona"),
+    ("Алматы", "Алма-Ата"),
+    ("Екатеринбург", "Yekaterinburg"),
+]
+
+
+def check_aliases() -> None:
+    # подписка "A -" и "- A" должна ловить заявку "B - X" / "X - B" и наоборот
+    failed = []
+    for a, b in ALIAS_PAIRS:
+        for sub_city, load_city in ((a, b), (b, a)):
+            cases = ((f"{sub_city} -", f"{load_city} - Уфа"), (f"- {sub_city}", f"Уфа - {load_city}"))
+            for sub_text, direction in cases:
+                matcher = RouteMatcher()
+                matcher.add({"id": 1, "tg_id": 1, **parse_subscription(sub_text)})
+                if 1 not in matcher.match({"direction": direction, "transport": ""}):
+                    failed.append(f"{sub_text!r} vs {direction!r}")
+    if failed:
+        sys.exit("alias mismatch: " + "; ".join(failed))
+    print(f"aliases: {len(ALIAS_PAIRS)} pairs ok")
+
+
+def random_sub(rnd: random.Random) -> tuple[str, str, str]:
+    shape = rnd.random()
+    origin = rnd.choice(CITIES) if shape < 0.8 else ""
+    dest = rnd.choice(CITIES) if shape > 0.3 else ""
+    transport = rnd.choice(TRANSPORT) if rnd.random() < 0.4 or not (origin or dest) else ""
+    return origin, dest, transport
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subs", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--loads", type=int, default=5_000)
+    args = parser.parse_args()
+
+    check_aliases()
+    rnd = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DB(os.path.join(tmp, "bot.db"), persistent=True)
+        with db._conn() as c:
+            c.executemany(
+                "INSERT INTO subscriptions(tg_id, origin, dest, transport, created_at) VALUES(?, ?, ?, ?, '')",
+                [(rnd.randrange(args.users), *random_sub(rnd)) for _ in range(args.subs)],
+            )
+            c.commit()
+
+        started = time.perf_counter()
+        rows = db.list_subscriptions()
+        loaded = time.perf_counter() - started
+        matcher = RouteMatcher()
+        started = time.perf_counter()
+        matcher.load(rows)
+        built = time.perf_counter() - started
+        db.close()
+
+    print(f"subscriptions: {matcher.stats()}")
+    print(f"rebuild: read {loaded * 1000:.0f} ms, index {built * 1000:.0f} ms")
+
+    loads = [
+        {"direction": f"{a} - {b}", "transport": rnd.choice(TRANSPORT)}
+        for a, b in (rnd.sample(CITIES, 2) for _ in range(args.loads))
+    ]
+    timings = []
+    matched = []
+    for item in loads:
+        started = time.perf_counter()
+        matched.append(len(matcher.match(item)))
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    timings.sort()
+    print(
+        f"match: p50={statistics.median(timings):.0f}us p95={timings[int(len(timings) * 0.95) - 1]:.0f}us "
+        f"max={timings[-1]:.0f}us, avg matched users={statistics.mean(matched):.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
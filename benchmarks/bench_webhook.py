@@ -0,0 +1,175 @@
+"""Updates/sec and handler latency: webhook mode versus long polling.
+
+Builds the real dispatcher from bot.create_dispatcher() on a Bot whose
+session is faked (no Telegram traffic) and feeds it synthetic "/start"
+updates from distinct users:
+
+- webhook: POSTs update JSON to the local aiohttp app from
+  bot.create_webhook_app(), with the secret-token header;
+- polling: dp.start_polling() against a fake getUpdates that hands out
+  whatever has arrived, one network round trip (--rtt) per call.
+
+Latency is measured from the moment an update "arrives" to the handler's
+first sendMessage for that user. The handler runs for real, including
+bot.db access, in a temporary directory.
+
+    python benchmarks/bench_webhook.py --updates 2000 --rate 500 --rtt 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import bot_env, fake_bot, percentile
+
+SECRET = "bench-secret"
+
+
+def make_update(i: int) -> dict:
+    user_id = 100_000 + i
+    return {
+        "update_id": i + 1,
+        "message": {
+            "message_id": i + 1,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{i}"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def run(mode: str, args) -> dict:
+    from aiogram.methods import GetUpdates, SendMessage
+    from aiogram.types import Update
+    from aiohttp import ClientSession, web
+
+    import bot as app
+
+    # по строке лога на апдейт — слишком шумно для бенчмарка
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    arrived: dict[int, float] = {}
+    handled: dict[int, float] = {}
+    inbox: list[dict] = []
+    inbox_ready = asyncio.Event()
+    done = asyncio.Event()
+
+    async def telegram(bot, method):
+        if isinstance(method, SendMessage):
+            chat_id = int(method.chat_id)
+            if chat_id not in handled:
+                handled[chat_id] = time.perf_counter()
+                if len(handled) == args.updates:
+                    done.set()
+        elif isinstance(method, GetUpdates):
+            # long poll: ответ сразу, если апдейты уже есть, иначе ждём до timeout;
+            # плюс сетевой round trip на каждый вызов
+            if not inbox:
+                inbox_ready.clear()
+                try:
+                    await asyncio.wait_for(inbox_ready.wait(), method.timeout or 1)
+                except asyncio.TimeoutError:
+                    pass
+            await asyncio.sleep(args.rtt)
+            batch = inbox[: method.limit or 100]
+            del inbox[: len(batch)]
+            return [Update.model_validate(u, context={"bot": bot}) for u in batch]
+        return None
+
+    tg_bot = fake_bot(telegram)
+    dp = app.create_dispatcher(tg_bot)
+    updates = [make_update(i) for i in range(args.updates)]
+    interval = 1.0 / args.rate if args.rate else 0.0
+
+    if mode == "webhook":
+        runner = web.AppRunner(app.create_webhook_app(tg_bot, dp))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}{app.WEBHOOK_PATH}"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        acks: list[float] = []
+
+        async with ClientSession() as http:
+            async with http.post(url, json=make_update(-1), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as r:
+                assert r.status == 401, r.status
+
+            async def post(update: dict):
+                user_id = update["message"]["from"]["id"]
+                # Telegram -> наш сервер: половина round trip
+                await asyncio.sleep(args.rtt / 2)
+                arrived[user_id] = time.perf_counter()
+                async with http.post(url, data=json.dumps(update), headers={**headers, "Content-Type": "application/json"}) as r:
+                    assert r.status == 200, r.status
+                acks.append(time.perf_counter() - arrived[user_id])
+
+            started = time.perf_counter()
+            tasks = []
+            for update in updates:
+                tasks.append(asyncio.create_task(post(update)))
+                if interval:
+                    await asyncio.sleep(interval)
+            await asyncio.gather(*tasks)
+            await asyncio.wait_for(done.wait(), 120)
+            elapsed = time.perf_counter() - started
+        await runner.cleanup()
+        extra = {"ack_p50_ms": statistics.median(acks) * 1000}
+    else:
+        polling = asyncio.create_task(dp.start_polling(tg_bot, handle_signals=False, polling_timeout=10))
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        for update in updates:
+            arrived[update["message"]["from"]["id"]] = time.perf_counter()
+            inbox.append(update)
+            inbox_ready.set()
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.wait_for(done.wait(), 120)
+        elapsed = time.perf_counter() - started
+        await dp.stop_polling()
+        await polling
+        extra = {}
+
+    latencies = [(handled[u] - arrived[u]) * 1000 for u in handled]
+    return {
+        "mode": mode,
+        "updates": args.updates,
+        "updates_per_s": round(args.updates / elapsed, 1),
+        "latency_p50_ms": round(statistics.median(latencies), 2),
+        "latency_p95_ms": round(percentile(latencies, 0.95), 2),
+        **{k: round(v, 2) for k, v in extra.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["webhook", "polling", "both"], default="both")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500, help="updates/s offered, 0 = all at once")
+    parser.add_argument("--rtt", type=float, default=0.05, help="simulated network round trip to Telegram, s")
+    args = parser.parse_args()
+
+    if args.mode == "both":
+        # каждый режим в своём процессе: shutdown диспетчера закрывает общий bot.db
+        for mode in ("webhook", "polling"):
+            subprocess.run([sys.executable, __file__, *sys.argv[1:], "--mode", mode], check=True)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot_env(tmp)
+        os.environ.update({"WEBHOOK_URL": "https://example.invalid", "WEBHOOK_SECRET": SECRET})
+        result = asyncio.run(run(args.mode, args))
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Shared helpers for the benchmark scripts: percentiles, result files, fixtures.
+
+Every suite script reports a flat dict of named measurements, each with
+the same summary fields (count, errors, per-second throughput and
+p50/p95/p99 latency in milliseconds). write_results() stores them as
+JSON together with the commit and environment, so two runs can be
+compared with ``python benchmarks/suite.py --compare old.json new.json``.
+"""
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CITIES = [
+    "Ташкент", "Tashkent", "Самарканд", "Samarqand", "Бухара", "Андижан", "Наманган", "Фергана",
+    "Нукус", "Москва", "Алматы", "Бишкек", "Екатеринбург", "Новосибирск", "Казань",
+]
+CARGO = ["Текстиль", "Цемент", "Хлопок", "Мука", "Фрукты", "Стройматериалы", "Оборудование"]
+TRANSPORT = ["Тент", "Реф", "Изотерм", "Борт", "Контейнер"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    # nearest-rank, values не обязаны быть отсортированы
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, int(round(len(values) * p)) - 1))]
+
+
+def summarize(latencies_ms: list[float], elapsed: float, errors: int = 0) -> dict:
+    count = len(latencies_ms)
+    return {
+        "count": count,
+        "errors": errors,
+        "per_s": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(latencies_ms) / count, 4) if count else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 0.50), 4),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 4),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 4),
+        "max_ms": round(max(latencies_ms), 4) if count else 0.0,
+    }
+
+
+def measure(fn, repeat: int, warmup: int = 0) -> dict:
+    # последовательный вызов fn(): latency на вызов и вызовы в секунду
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def print_results(results: dict) -> None:
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'per_s':>10}  {'p50_ms':>9}  {'p95_ms':>9}  {'p99_ms':>9}  errors")
+    for name, r in results.items():
+        print(
+            f"{name:<{width}}  {r['per_s']:>10.1f}  {r['p50_ms']:>9.3f}  {r['p95_ms']:>9.3f}  "
+            f"{r['p99_ms']:>9.3f}  {r['errors']}"
+        )
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def environment() -> dict:
+    return {
+        "commit": git_commit(),
+        "at": datetime.datetime.now(tz=datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(path: str, suite: str, params: dict, results: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"suite": suite, "env": environment(), "params": params, "results": results},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+        f.write("\n")
+
+
+def random_load(rnd: random.Random, i: int) -> dict:
+    src, dst = rnd.sample(CITIES, 2)
+    return {
+        "direction": f"{src} - {dst}",
+        # номер партии: одинаковые заявки сервер отбрасывает как дубли
+        "cargo": f"{rnd.choice(CARGO)}, {rnd.randint(1, 25)} тонн, партия {i}",
+        "transport": rnd.choice(TRANSPORT),
+        "load_date": f"2026-11-{rnd.randint(1, 30):02d}",
+        "extra": f"Заявка {i}",
+    }
+
+
+def seed_loads(store, rows: int, seed: int = 42, chunk: int = 5000) -> None:
+    # через LoadStore.create_many: индекс FTS и обычные индексы — как в проде
+    rnd = random.Random(seed)
+    for start in range(0, rows, chunk):
+        store.create_many([random_load(rnd, i) for i in range(start, min(start + chunk, rows))])
+
+
+def fake_bot(hook=None):
+    """aiogram Bot whose API calls are all answered locally.
+
+    sendMessage and editMessageText get a Message back, getMe the bench
+    bot, everything else True. ``hook(bot, method)`` is awaited first;
+    if it returns anything but None, that is the answer instead.
+    """
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.methods import EditMessageText, GetMe, SendMessage
+    from aiogram.types import Chat, Message, User
+
+    class FakeSession(AiohttpSession):
+        # сеть не нужна: aiohttp-сессия так и не создаётся, close() ничего не закрывает
+        async def make_request(self, bot, method, timeout=None):
+            if hook is not None:
+                result = await hook(bot, method)
+                if result is not None:
+                    return result
+            if isinstance(method, (SendMessage, EditMessageText)):
+                return Message(
+                    message_id=1,
+                    date=int(time.time()),
+                    chat=Chat(id=int(method.chat_id or 0), type="private"),
+                    text=method.text,
+                )
+            if isinstance(method, GetMe):
+                return User(id=1, is_bot=True, first_name="bench", username="bench_bot")
+            return True
+
+    return Bot("123456:bench", session=FakeSession(), default=DefaultBotProperties(parse_mode="Markdown"))
+
+
+def bot_env(workdir: str) -> None:
+    # bot.py при импорте открывает bot.db в текущем каталоге и читает env
+    os.chdir(workdir)
+    os.environ.update(
+        {
+            "BOT_TOKEN": "123456:bench",
+            "ADMINS": "",
+            "ADMIN_NOTIFY": "0",
+            "BROADCAST_ENABLED": "0",
+            "SERVER_BASE_URL": "",
+            "SERVER_STREAM_URL": "",
+        }
+    )
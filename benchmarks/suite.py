@@ -0,0 +1,113 @@
+"""Run the whole benchmark suite and compare results between commits.
+
+Runs bench_server.py, bench_handlers.py and bench_micro.py, each in its
+own process, and merges their results into one JSON file (by default
+bench-<commit>.json in the current directory):
+
+    python benchmarks/suite.py                     # full run
+    python benchmarks/suite.py --quick             # small sizes, a minute or so
+    python benchmarks/suite.py --compare bench-6fa9deb.json
+
+--compare with one file runs the suite and compares the fresh results
+against that file. With two files it only compares them:
+
+    python benchmarks/suite.py --compare bench-old.json bench-new.json
+
+Rows whose p95 latency grew, or whose throughput dropped, by more than
+--threshold percent are marked REGRESSION, and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import environment, git_commit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PARTS = {
+    "server": ("bench_server.py", [], ["--rows", "1000,20000", "--requests", "300"]),
+    "handlers": ("bench_handlers.py", [], ["--updates", "300", "--users", "2000"]),
+    "micro": ("bench_micro.py", [], ["--repeat", "1000", "--users", "2000"]),
+}
+
+
+def run_suite(parts: list[str], quick: bool) -> dict:
+    merged = {"suite": "all", "env": environment(), "params": {"quick": quick}, "results": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in parts:
+            script, full, small = PARTS[name]
+            out = os.path.join(tmp, f"{name}.json")
+            print(f"== {script}", flush=True)
+            subprocess.run(
+                [sys.executable, os.path.join(HERE, script), *(small if quick else full), "--json", out], check=True
+            )
+            with open(out, encoding="utf-8") as f:
+                part = json.load(f)
+            merged["params"][name] = part["params"]
+            merged["results"].update(part["results"])
+    return merged
+
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    print(f"\n{old['env']['commit']} -> {new['env']['commit']}")
+    print(f"{'benchmark':<40}  {'p95_ms old':>11}  {'p95_ms new':>11}  {'p95':>8}  {'per_s':>8}")
+    regressions = 0
+    for name, r in new["results"].items():
+        base = old["results"].get(name)
+        if base is None:
+            print(f"{name:<40}  {'-':>11}  {r['p95_ms']:>11.3f}  {'new':>8}")
+            continue
+        p95 = (r["p95_ms"] / base["p95_ms"] - 1) * 100 if base["p95_ms"] else 0.0
+        per_s = (r["per_s"] / base["per_s"] - 1) * 100 if base["per_s"] else 0.0
+        regressed = p95 > threshold or per_s < -threshold or r["errors"] > base["errors"]
+        regressions += regressed
+        print(
+            f"{name:<40}  {base['p95_ms']:>11.3f}  {r['p95_ms']:>11.3f}  {p95:>+7.1f}%  {per_s:>+7.1f}%"
+            + ("  REGRESSION" if regressed else "")
+        )
+    for name in old["results"].keys() - new["results"].keys():
+        print(f"{name:<40}  missing in the new run")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parts", default=",".join(PARTS), help="comma-separated: server,handlers,micro")
+    parser.add_argument("--quick", action="store_true", help="small DB sizes and request counts")
+    parser.add_argument("--out", help="results file, default bench-<commit>.json")
+    parser.add_argument("--compare", nargs="+", metavar="FILE", help="baseline file, or two files to compare")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold, percent")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes one or two files")
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0], encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            new = json.load(f)
+        sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+    parts = [p for p in args.parts.split(",") if p]
+    unknown = set(parts) - set(PARTS)
+    if unknown:
+        parser.error(f"unknown parts: {', '.join(sorted(unknown))}")
+
+    results = run_suite(parts, args.quick)
+    out = args.out or f"bench-{git_commit()}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"\nresults: {out}")
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            old = json.load(f)
+        sys.exit(1 if compare(old, results, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,30 @@
 ﻿import os
 import re
+import asyncio
 import logging
+import sqlite3
 from dotenv import load_dotenv
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import CommandStart
-
-from db import DB
-from keyboards import user_menu, phone_request_kb, admin_decision_kb, admin_panel_kb, payment_kb
+from aiogram.filters import Command, CommandObject, CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from broadcast import Broadcaster, LoadWatcher
+from db import AsyncDB
+from fsm_storage import SQLiteStorage
+from notifier import AdminNotifier, HIGH, NORMAL, DIGEST
+from keyboards import user_menu, phone_request_kb, admin_decision_kb, admin_panel_kb, payment_kb, loads_pager_kb, LoadsPage
+from metrics import CONTENT_TYPE, REGISTRY, Gauge
+from middlewares import MetricsMiddleware, ThrottlingMiddleware
+from render import LoadRenderer, escape_md
 from server_client import ServerClient
+from sqlprof import SQLProfiler, format_report
+from subscriptions import RouteMatcher, describe_subscription, parse_subscription
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -21,11 +36,63 @@ WEEK_PRICE = int(os.getenv("WEEK_PRICE_UZS", "20000"))
 ACCESS_DAYS = int(os.getenv("ACCESS_DAYS", "7"))
 PAYMENT_URL = os.getenv("PAYMENT_URL", "").strip() or None
 
-db = DB("bot.db")
+BROADCAST_ENABLED = os.getenv("BROADCAST_ENABLED", "1") == "1"
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1"))
+BROADCAST_POLL_INTERVAL = float(os.getenv("BROADCAST_POLL_INTERVAL", "10"))
+SUBS_PER_USER = int(os.getenv("SUBS_PER_USER", "10"))
+# индекс подписок пересобирается из bot.db: /sub и /unsub в другом воркере
+ROUTES_RELOAD_INTERVAL = float(os.getenv("ROUTES_RELOAD_INTERVAL", "60"))
+
+# состояния диалогов (ввод телефона) в bot.db: переживают рестарт и общие для всех воркеров
+FSM_TTL = float(os.getenv("FSM_TTL", "86400"))
+
+# флуд-контроль: THROTTLE_RATE апдейтов в секунду на пользователя, THROTTLE_BURST подряд;
+# повтор той же кнопки за THROTTLE_DEBOUNCE секунд отбрасывается. Админов не трогает
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "5"))
+THROTTLE_DEBOUNCE = float(os.getenv("THROTTLE_DEBOUNCE", "1"))
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", "10000"))
+THROTTLE_IDLE = float(os.getenv("THROTTLE_IDLE", "600"))
+
+# polling — long-poll getUpdates; webhook — Telegram сам присылает апдейты на WEBHOOK_URL + WEBHOOK_PATH
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip() or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# /metrics для Prometheus; METRICS_PORT=0 — не поднимать
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9102"))
+
+# профилировщик запросов к bot.db, отчёт — админская команда /sql
+SQL_PROFILE = os.getenv("SQL_PROFILE", "0") == "1"
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "50"))
+
+db = AsyncDB("bot.db", profiler=SQLProfiler(slow_ms=SQL_SLOW_MS, name="bot.db") if SQL_PROFILE else None)
 server = ServerClient()
+routes = RouteMatcher()
+renderer = LoadRenderer(maxsize=int(os.getenv("RENDER_CACHE_SIZE", "5000")))
+notifier = AdminNotifier(
+    ADMINS,
+    rate=float(os.getenv("ADMIN_NOTIFY_RATE", "10")),
+    digest_interval=float(os.getenv("ADMIN_DIGEST_INTERVAL", "60")),
+)
+
+NOTIFIER_QUEUE = Gauge(
+    "bot_notifier_queue", "Admin notifications waiting", ("queue",),
+    fn=lambda: {("send",): notifier.stats()["queued"], ("digest",): notifier.stats()["digest"]},
+)
+# считается из bot.db при каждом чтении /metrics
+BROADCAST_PENDING = Gauge("bot_broadcast_pending", "Broadcast messages waiting to be sent")
 
 PHONE_RE = re.compile(r"^\+998\d{9}$")  # +998901234567
 
+class PhoneForm(StatesGroup):
+    waiting = State()
+
 def is_admin(user_id: int) -> bool:
     return user_id in ADMINS
 
@@ -37,7 +104,8 @@ def normalize_phone(s: str) -> str | None:
         return s
     return None
 
-async def admin_notify(bot: Bot, text: str, *, important: bool = True):
+def admin_notify(text: str, *, important: bool = True, digest: bool = False):
+    # не ждёт отправки: сообщение уходит в фоновую очередь notifier
     admin_notify_enabled = os.getenv("ADMIN_NOTIFY", "1") == "1"
     admin_notify_loads = os.getenv("ADMIN_NOTIFY_LOADS", "0") == "1"
 
@@ -46,13 +114,9 @@ async def admin_notify(bot: Bot, text: str, *, important: bool = True):
     if not important and not admin_notify_loads:
         return
 
-    for admin_id in ADMINS:
-        try:
-            await bot.send_message(admin_id, text)
-        except Exception:
-            pass
+    notifier.notify(text, priority=DIGEST if digest else NORMAL)
 
-async def notify_admins_new_request(bot: Bot, tg_id: int, phone: str, req_id: int):
+def notify_admins_new_request(tg_id: int, phone: str, req_id: int):
     text = (
         "🧾 *Новый запрос доступа*\n"
         f"TG ID: `{tg_id}`\n"
@@ -63,52 +127,45 @@ async def notify_admins_new_request(bot: Bot, tg_id: int, phone: str, req_id: in
         "1) Проверь оплату пользователя\n"
         "2) После оплаты нажми ✅ Подтвердить оплату"
     )
-    for admin_id in ADMINS:
-        await bot.send_message(admin_id, text, reply_markup=admin_decision_kb(req_id))
-
-def format_loads(data: dict) -> str:
-    if isinstance(data, dict) and "loads" in data and isinstance(data["loads"], list):
-        loads = data["loads"][:30]
-        updated_at = data.get("updated_at", "")
-
-        if not loads:
-            return "Пока нет актуальных заявок."
-
-        out = ["🚚 *Актуальные заявки:*"]
-        if updated_at:
-            out.append(f"_Обновлено: {updated_at}_")
-
-        for i, item in enumerate(loads, 1):
-            direction = item.get("direction", "—")
-            cargo = item.get("cargo", "—")
-            transport = item.get("transport", "—")
-            date = item.get("date", "—")
-            extra = item.get("extra", "")
-
-            out.append(
-                f"\n*i{i})*\n"
-                f"*Направление:* {direction}\n"
-                f"*Карго и тоннаж:* {cargo}\n"
-                f"*Тип транспорта:* {transport}\n"
-            )
-            if extra:
-                out.append(f"*Доп информация:* {extra}")
-            if data:
-                out.append(f"*Дата:* {date}")
-
-        return "\n".join(out)
-
-    return f"Ответ:\n`{str(data)[:3500]}`"
-
-async def main():
-    if not BOT_TOKEN:
-        raise RuntimeError("BOT_TOKEN is empty")
-
-    bot = Bot(BOT_TOKEN, parse_mode="Markdown")
-    dp = Dispatcher()
-
-    # кто сейчас в режиме ввода телефона
-    waiting_phone: set[int] = set()
+    notifier.notify(text, priority=HIGH, reply_markup=admin_decision_kb(req_id))
+
+def format_new_load(item: dict) -> str:
+    # тот же кусок, что и в списке заявок: потом список возьмёт его из кэша
+    text, _ = renderer.fragment(item)
+    return "🆕 *Новая заявка*\n\n" + text
+
+def create_dispatcher(bot: Bot) -> Dispatcher:
+    # все хендлеры и фоновые задачи; одинаково для polling и webhook
+    storage = SQLiteStorage(db, ttl=FSM_TTL)
+    # FSM-middleware регистрируем сами, после троттлинга: иначе он читал бы состояние
+    # из bot.db на каждый апдейт, в том числе на флуд
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    # флуд отсекается до FSM и фильтров: до хендлера, БД и сервера заявок он не доходит
+    if THROTTLE_RATE > 0:
+        throttling = ThrottlingMiddleware(
+            THROTTLE_RATE,
+            THROTTLE_BURST,
+            debounce=THROTTLE_DEBOUNCE,
+            maxsize=THROTTLE_MAX_USERS,
+            idle=THROTTLE_IDLE,
+            exempt=ADMINS,
+        )
+        dp.update.outer_middleware(throttling)
+    dp.update.outer_middleware(dp.fsm)
+    # время и ошибки по каждому хендлеру (start, loads, approve...)
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+    broadcaster = Broadcaster(
+        bot, db, rate=BROADCAST_RATE, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL, matcher=routes
+    )
+
+    def loads_pages(resp: dict) -> list[str]:
+        # страницы собираются один раз на версию данных и живут в кэше ServerClient,
+        # каждая заявка при этом рендерится один раз за всё время (кэш renderer)
+        pages = resp.get("pages")
+        if pages is None:
+            pages = resp["pages"] = renderer.pages(resp.get("data", {}))
+        return pages
 
     async def ask_phone(chat_id: int):
         await bot.send_message(
@@ -118,10 +175,10 @@ async def main():
         )
 
     @dp.message(CommandStart())
-    async def start(m: Message):
+    async def start(m: Message, state: FSMContext):
         tg_id = m.from_user.id
-        db.ensure_user(tg_id)
-        await admin_notify(bot, f"👤 /start от `{tg_id}`", important=True)
+        await db.ensure_user(tg_id)
+        admin_notify(f"👤 /start от `{tg_id}`", digest=True)
 
         # админ-панель
         if is_admin(tg_id):
@@ -130,17 +187,17 @@ async def main():
                 reply_markup=admin_panel_kb()
             )
 
-        if db.has_access(tg_id):
-            until = db.get_access_until(tg_id)
+        if await db.has_access(tg_id):
+            until = await db.get_access_until(tg_id)
             await m.answer(
                 f"✅ Доступ активен до `{until}`.\nНажми «🚚 Актуальные заявки».",
                 reply_markup=user_menu()
             )
             return
 
-        phone = db.get_phone(tg_id)
+        phone = await db.get_phone(tg_id)
         if not phone:
-            waiting_phone.add(tg_id)
+            await state.set_state(PhoneForm.waiting)
             await m.answer(
                 f"Для доступа нужен номер телефона.\n"
                 f"Тариф: *{WEEK_PRICE}* сум / *{ACCESS_DAYS}* дней.\n",
@@ -150,7 +207,7 @@ async def main():
             return
 
         # телефон есть, но доступа нет
-        req_id = db.create_access_request(tg_id, phone)
+        req_id, created = await db.create_access_request(tg_id, phone)
         await m.answer(
             f"Номер `{phone}` сохранён.\n"
             f"Нажми кнопку оплаты ниже. После оплаты я подтвержу и доступ откроется.\n"
@@ -161,17 +218,19 @@ async def main():
             "Когда добавите реальную ссылку или QR-код, эта же кнопка будет вести на оплату.",
             reply_markup=user_menu()
         )
-        await notify_admins_new_request(bot, tg_id, phone, req_id)
-        await admin_notify(bot, f"🧾 Создан pending-запрос `{req_id}` от `{tg_id}` (`{phone}`)", important=True)
+        if created:
+            # повторный /start с уже открытой заявкой админов заново не дёргает
+            notify_admins_new_request(tg_id, phone, req_id)
+            admin_notify(f"🧾 Создан pending-запрос `{req_id}` от `{tg_id}` (`{phone}`)", important=True)
 
     @dp.callback_query(F.data == "change_phone")
-    async def change_phone(c: CallbackQuery):
+    async def change_phone(c: CallbackQuery, state: FSMContext):
         await c.answer()
-        waiting_phone.add(c.from_user.id)
+        await state.set_state(PhoneForm.waiting)
         await ask_phone(c.message.chat.id)
 
     @dp.message(F.contact)
-    async def got_contact(m: Message):
+    async def got_contact(m: Message, state: FSMContext):
         tg_id = m.from_user.id
         phone_raw = m.contact.phone_number
         # телега может прислать без "+"
@@ -182,10 +241,8 @@ async def main():
             await m.answer("Не смог распознать номер. Пришли в формате `+998901234567`.")
             return
 
-        db.set_phone(tg_id, phone)
-        waiting_phone.discard(tg_id)
-
-        req_id = db.create_access_request(tg_id, phone)
+        req_id, created = await db.set_phone_and_request(tg_id, phone)
+        await state.clear()
         await m.answer(
             f"✅ Номер сохранён: `{phone}`\n"
             f"Нажми кнопку оплаты ниже. После оплаты подтвержу и доступ откроется.\n"
@@ -196,27 +253,21 @@ async def main():
             "Когда добавите реальную ссылку или QR-код, эта же кнопка будет вести на оплату.",
             reply_markup=user_menu()
         )
-        await notify_admins_new_request(bot, tg_id, phone, req_id)
-        await admin_notify(bot, f"📞 Номер получен: `{phone}` от `{tg_id}`", important=True)
+        if created:
+            notify_admins_new_request(tg_id, phone, req_id)
+        admin_notify(f"📞 Номер получен: `{phone}` от `{tg_id}`", important=True)
 
-    @dp.message(F.text)
-    async def got_text(m: Message):
+    # только в режиме ввода телефона; команды сюда не попадают, иначе этот хендлер перехватит /pending и /stats
+    @dp.message(PhoneForm.waiting, F.text, ~F.text.startswith("/"))
+    async def got_text(m: Message, state: FSMContext):
         tg_id = m.from_user.id
-        if m.text.startswith("/"):
-            return
-
-        if tg_id not in waiting_phone:
-            return
-
         phone = normalize_phone(m.text)
         if not phone:
             await m.answer("Неверный формат. Пример: `+998901234567`")
             return
 
-        db.set_phone(tg_id, phone)
-        waiting_phone.discard(tg_id)
-
-        req_id = db.create_access_request(tg_id, phone)
+        req_id, created = await db.set_phone_and_request(tg_id, phone)
+        await state.clear()
         await m.answer(
             f"✅ Номер сохранён: `{phone}`\n"
             f"Нажми кнопку оплаты ниже. После оплаты подтвержу и доступ откроется.\n"
@@ -227,21 +278,22 @@ async def main():
             "Когда добавите реальную ссылку или QR-код, эта же кнопка будет вести на оплату.",
             reply_markup=user_menu()
         )
-        await notify_admins_new_request(bot, tg_id, phone, req_id)
+        if created:
+            notify_admins_new_request(tg_id, phone, req_id)
 
     @dp.callback_query(F.data == "status")
-    async def status(c: CallbackQuery):
+    async def status(c: CallbackQuery, state: FSMContext):
         await c.answer()
         tg_id = c.from_user.id
-        until = db.get_access_until(tg_id)
+        until = await db.get_access_until(tg_id)
 
-        if db.has_access(tg_id):
+        if await db.has_access(tg_id):
             await bot.send_message(c.message.chat.id, f"✅ Доступ активен до `{until}`", reply_markup=user_menu())
             return
 
-        phone = db.get_phone(tg_id)
+        phone = await db.get_phone(tg_id)
         if not phone:
-            waiting_phone.add(tg_id)
+            await state.set_state(PhoneForm.waiting)
             await bot.send_message(c.message.chat.id, "⛔️ Доступа нет. Сначала укажи номер.", reply_markup=user_menu())
             await ask_phone(c.message.chat.id)
             return
@@ -267,13 +319,13 @@ async def main():
         )
 
     @dp.callback_query(F.data == "loads")
-    async def loads(c: CallbackQuery):
+    async def loads(c: CallbackQuery, state: FSMContext):
         await c.answer()
         tg_id = c.from_user.id
-        if not db.has_access(tg_id):
-            phone = db.get_phone(tg_id)
+        if not await db.has_access(tg_id):
+            phone = await db.get_phone(tg_id)
             if not phone:
-                waiting_phone.add(tg_id)
+                await state.set_state(PhoneForm.waiting)
                 await bot.send_message(c.message.chat.id, "⛔️ Доступ закрыт. Укажи номер телефона.", reply_markup=user_menu())
                 await ask_phone(c.message.chat.id)
             else:
@@ -298,10 +350,125 @@ async def main():
             )
             return
 
-        text = format_loads(resp.get("data", {}))
-        await bot.send_message(c.message.chat.id, text, reply_markup=user_menu())
+        pages = loads_pages(resp)
+        await bot.send_message(c.message.chat.id, pages[0], reply_markup=loads_pager_kb(0, len(pages)))
+
+        admin_notify(f"🚚 Открыл заявки: `{tg_id}`", important=False, digest=True)
+
+    @dp.callback_query(LoadsPage.filter(F.action == "page"))
+    async def loads_page(c: CallbackQuery, callback_data: LoadsPage):
+        if not await db.has_access(c.from_user.id):
+            await c.answer("⛔️ Доступ закрыт.", show_alert=True)
+            return
+
+        resp = await server.get_loads(c.from_user.id)
+        if not resp.get("ok"):
+            await c.answer("⚠️ Сервер недоступен.", show_alert=True)
+            return
+
+        pages = loads_pages(resp)
+        page = max(0, min(callback_data.page, len(pages) - 1))
+        await c.answer()
+        try:
+            await c.message.edit_text(pages[page], reply_markup=loads_pager_kb(page, len(pages)))
+        except TelegramBadRequest as e:
+            # та же страница с теми же данными — Telegram не даёт "изменить" на то же самое
+            if "message is not modified" not in str(e):
+                raise
+
+    @dp.callback_query(F.data.startswith("loads:"))
+    async def loads_noop(c: CallbackQuery):
+        # "loads:noop" или кнопка, которую LoadsPage не разобрал (старая или испорченная)
+        if c.data == "loads:noop":
+            await c.answer()
+        else:
+            await c.answer("Кнопка устарела — открой «🚚 Актуальные заявки» заново.")
+
+    @dp.message(Command("search"))
+    async def search_cmd(m: Message, command: CommandObject):
+        tg_id = m.from_user.id
+        if not await db.has_access(tg_id):
+            await m.answer("⛔️ Доступ закрыт. Нажми «🚚 Актуальные заявки», чтобы открыть доступ.", reply_markup=user_menu())
+            return
+
+        query = (command.args or "").strip()
+        if not query:
+            await m.answer("Напиши, что искать: `/search Ташкент тент`", reply_markup=user_menu())
+            return
+
+        resp = await server.search_loads(query)
+        if not resp.get("ok"):
+            await m.answer(
+                f"⚠️ Сервер недоступен.\nДетали: `{resp.get('status','')}` `{resp.get('error','')}`",
+                reply_markup=user_menu()
+            )
+            return
+
+        pages = renderer.pages(resp.get("data", {}), title="🔎 *Найдено:*", empty="По запросу ничего не нашлось.")
+        for i, page in enumerate(pages, 1):
+            await m.answer(page, reply_markup=user_menu() if i == len(pages) else None)
+
+    @dp.message(Command("sub"))
+    async def sub_cmd(m: Message, command: CommandObject):
+        tg_id = m.from_user.id
+        if not await db.has_access(tg_id):
+            await m.answer("⛔️ Доступ закрыт. Нажми «🚚 Актуальные заявки», чтобы открыть доступ.", reply_markup=user_menu())
+            return
+
+        try:
+            sub = parse_subscription(command.args or "")
+        except ValueError:
+            await m.answer(
+                "Подписка на маршрут — новые заявки будут приходить только по ней:\n"
+                "`/sub Ташкент - Москва` — откуда и куда\n"
+                "`/sub Ташкент -` — только откуда\n"
+                "`/sub - Москва / Реф` — куда и тип транспорта\n"
+                "`/sub / Реф` — только тип транспорта\n\n"
+                "Список — /subs, удалить — `/unsub <номер>`."
+            )
+            return
+
+        if await db.count_subscriptions(tg_id) >= SUBS_PER_USER:
+            await m.answer(f"Можно сохранить не больше {SUBS_PER_USER} подписок. Удали лишние: /subs")
+            return
 
-        await admin_notify(bot, f"🚚 Открыл заявки: `{tg_id}`", important=False)
+        row = await db.add_subscription(tg_id, sub["origin"], sub["dest"], sub["transport"])
+        routes.add(row)
+        await m.answer(f"🔔 Подписка #{row['id']} сохранена: {escape_md(describe_subscription(row))}")
+
+    @dp.message(Command("subs"))
+    async def subs_cmd(m: Message):
+        tg_id = m.from_user.id
+        if not await db.has_access(tg_id):
+            await m.answer("⛔️ Доступ закрыт. Нажми «🚚 Актуальные заявки», чтобы открыть доступ.", reply_markup=user_menu())
+            return
+
+        subs = await db.list_subscriptions(tg_id)
+        if not subs:
+            await m.answer("Подписок нет — приходят все новые заявки. Добавить: /sub")
+            return
+        out = ["🔔 *Подписки:*"]
+        for s in subs:
+            out.append(f"#{s['id']}: {escape_md(describe_subscription(s))}")
+        out.append("\nУдалить: `/unsub <номер>`")
+        await m.answer("\n".join(out))
+
+    @dp.message(Command("unsub"))
+    async def unsub_cmd(m: Message, command: CommandObject):
+        tg_id = m.from_user.id
+        if not await db.has_access(tg_id):
+            await m.answer("⛔️ Доступ закрыт. Нажми «🚚 Актуальные заявки», чтобы открыть доступ.", reply_markup=user_menu())
+            return
+
+        arg = (command.args or "").strip().lstrip("#")
+        if not arg.isdigit():
+            await m.answer("Укажи номер подписки: `/unsub 12`. Список — /subs")
+            return
+        if not await db.delete_subscription(tg_id, int(arg)):
+            await m.answer("Такой подписки нет. Список — /subs")
+            return
+        routes.remove(int(arg))
+        await m.answer(f"Подписка #{arg} удалена.")
 
     # ====== АДМИН-ЧАСТЬ ======
 
@@ -309,7 +476,7 @@ async def main():
     async def pending_cmd(m: Message):
         if not is_admin(m.from_user.id):
             return
-        pending = db.list_pending(limit=20)
+        pending = await db.list_pending(limit=20)
         if not pending:
             await m.answer("Pending-заявок нет.")
             return
@@ -322,13 +489,66 @@ async def main():
                 reply_markup=admin_decision_kb(int(r["id"]))
             )
 
+    @dp.message(F.text == "/stats")
+    async def stats_cmd(m: Message):
+        if not is_admin(m.from_user.id):
+            return
+        st = db.sync.access_cache.stats()
+        ns = notifier.stats()
+        rs = routes.stats()
+        fs = renderer.stats()
+        await m.answer(
+            f"📊 *Кэш доступа*\n"
+            f"Hits: `{st['hits']}`\n"
+            f"Misses: `{st['misses']}`\n"
+            f"Размер: `{st['size']}` / `{st['maxsize']}`\n\n"
+            f"📨 *Уведомления админам*\n"
+            f"В очереди: `{ns['queued']}`, в сводке: `{ns['digest']}`\n"
+            f"Отправлено: `{ns['sent']}`, ошибок: `{ns['failed']}`\n\n"
+            f"🔔 *Подписки*\n"
+            f"Подписок: `{rs['subscriptions']}` у `{rs['users']}` пользователей, ключей: `{rs['keys']}`\n\n"
+            f"🧩 *Кэш рендера заявок*\n"
+            f"Hits: `{fs['hits']}`, misses: `{fs['misses']}`, размер: `{fs['size']}` / `{fs['maxsize']}`"
+        )
+
+    @dp.message(Command("sql"))
+    async def sql_cmd(m: Message, command: CommandObject):
+        # /sql [total_ms|max_ms|calls|slow] — топ запросов к bot.db
+        if not is_admin(m.from_user.id):
+            return
+        if db.sync.profiler is None:
+            await m.answer("Профилировщик выключен. Включить: `SQL_PROFILE=1`.")
+            return
+        order = (command.args or "total_ms").strip()
+        if order not in ("total_ms", "max_ms", "calls", "slow"):
+            await m.answer("Сортировка: `total_ms`, `max_ms`, `calls` или `slow`.")
+            return
+        report = format_report(await db.sql_report(10, order)) or "Запросов ещё не было."
+        await m.answer(f"🐢 *SQL, топ по {order}*\n```\n{report[:3800]}\n```")
+
+    @dp.message(F.text == "/broadcasts")
+    async def broadcasts_cmd(m: Message):
+        if not is_admin(m.from_user.id):
+            return
+        jobs = await db.list_broadcasts(limit=10)
+        st = broadcaster.stats()
+        out = [
+            "📣 *Рассылки*",
+            f"Отправлено: `{st['sent']}`, ошибок: `{st['failed']}`, повторов: `{st['retried']}`",
+            f"Скорость последней пачки: `{st['rate']}` msg/s",
+        ]
+        for j in jobs:
+            state = "✅" if j["finished_at"] else "⏳"
+            out.append(f"{state} #{j['id']} (заявка `{j['load_id']}`): `{j['sent']}`/`{j['total']}`, ошибок `{j['failed']}`")
+        await m.answer("\n".join(out))
+
     @dp.callback_query(F.data == "admin:pending")
     async def pending_btn(c: CallbackQuery):
         if not is_admin(c.from_user.id):
             await c.answer("Нет доступа", show_alert=True)
             return
         await c.answer()
-        pending = db.list_pending(limit=20)
+        pending = await db.list_pending(limit=20)
         if not pending:
             await bot.send_message(c.message.chat.id, "Pending-заявок нет.")
             return
@@ -349,16 +569,14 @@ async def main():
             return
 
         req_id = int(c.data.split(":")[1])
-        row = db.get_request(req_id)
-        if not row:
-            await c.answer("Не найдено", show_alert=True)
+        # подтверждение и продление — одна транзакция: из двух одновременных нажатий
+        # (два админа, двойной клик) доступ продлит только одно
+        approved = await db.approve_and_grant(req_id, c.from_user.id, ACCESS_DAYS)
+        if approved is None:
+            row = await db.get_request(req_id)
+            await c.answer("Уже решено" if row else "Не найдено", show_alert=True)
             return
-        if row["status"] != "pending":
-            await c.answer("Уже решено", show_alert=True)
-            return
-
-        db.approve_request(req_id, c.from_user.id)
-        until = db.grant_access_days(int(row["tg_id"]), ACCESS_DAYS)
+        tg_id, until = approved
 
         await c.message.edit_text(
             c.message.text + f"\n\n✅ *APPROVED* до `{until}`",
@@ -367,12 +585,12 @@ async def main():
         await c.answer("Подтверждено")
 
         await bot.send_message(
-            int(row["tg_id"]),
+            tg_id,
             f"✅ Оплата подтверждена. Доступ открыт до `{until}`.\nНажми «🚚 Актуальные заявки».",
             reply_markup=user_menu()
         )
 
-        await admin_notify(bot, f"✅ APPROVED `{row['tg_id']}` до `{until}` (req `{req_id}`)", important=True)
+        admin_notify(f"✅ APPROVED `{tg_id}` до `{until}` (req `{req_id}`)", important=True)
 
     @dp.callback_query(F.data.startswith("reject:"))
     async def reject(c: CallbackQuery):
@@ -381,28 +599,133 @@ async def main():
             return
 
         req_id = int(c.data.split(":")[1])
-        row = db.get_request(req_id)
-        if not row:
-            await c.answer("Не найдено", show_alert=True)
+        tg_id = await db.reject_request(req_id, c.from_user.id)
+        if tg_id is None:
+            row = await db.get_request(req_id)
+            await c.answer("Уже решено" if row else "Не найдено", show_alert=True)
             return
-        if row["status"] != "pending":
-            await c.answer("Уже решено", show_alert=True)
-            return
-
-        db.reject_request(req_id, c.from_user.id)
         await c.message.edit_text(c.message.text + "\n\n❌ *REJECTED*", reply_markup=None)
         await c.answer("Отклонено")
 
         await bot.send_message(
-            int(row["tg_id"]),
+            tg_id,
             "❌ Оплата не подтверждена. Если нужно — укажи номер снова (или админ выставит счёт заново).",
             reply_markup=user_menu()
         )
 
-    await dp.start_polling(bot)
+    background: list[asyncio.Task] = []
+    runners: list[web.AppRunner] = []
+
+    async def reload_routes():
+        while True:
+            await asyncio.sleep(ROUTES_RELOAD_INTERVAL)
+            try:
+                routes.load(await db.list_subscriptions())
+            except sqlite3.Error as e:
+                logging.warning("route index reload failed: %s", e)
+
+    @dp.startup()
+    async def on_startup():
+        await server.start()
+        await notifier.start(bot)
+        routes.load(await db.list_subscriptions())
+        background.append(asyncio.create_task(storage.run()))
+        if ROUTES_RELOAD_INTERVAL > 0:
+            background.append(asyncio.create_task(reload_routes()))
+        if METRICS_PORT:
+            runner = web.AppRunner(create_metrics_app())
+            await runner.setup()
+            try:
+                await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+            except OSError as e:
+                # занятый порт метрик не должен ронять бота
+                logging.warning("metrics server not started: %s", e)
+                await runner.cleanup()
+            else:
+                runners.append(runner)
+                logging.info("metrics on %s:%s/metrics", METRICS_HOST, METRICS_PORT)
+        if BROADCAST_ENABLED:
+            watcher = LoadWatcher(server, db, broadcaster, format_new_load, interval=BROADCAST_POLL_INTERVAL)
+            background.append(asyncio.create_task(broadcaster.run()))
+            background.append(asyncio.create_task(watcher.run()))
+
+    @dp.shutdown()
+    async def on_shutdown():
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        background.clear()
+        for runner in runners:
+            await runner.cleanup()
+        runners.clear()
+        await notifier.stop()
+        await server.close()
+        await storage.close()
+        await db.close()
+
+    return dp
+
+def create_metrics_app() -> web.Application:
+    async def metrics(request: web.Request):
+        BROADCAST_PENDING.set(await db.count_pending_broadcasts())
+        return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    return app
+
+def create_webhook_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    app = web.Application()
+    # апдейт без правильного X-Telegram-Bot-Api-Secret-Token получает 401;
+    # ответ 200 уходит сразу, хендлер работает в фоне
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+
+    async def delete_webhook(_):
+        # первым делом при остановке: Telegram перестаёт слать апдейты, пока мы закрываемся
+        await bot.delete_webhook()
+
+    async def set_webhook(_):
+        # последним при старте: апдейты пойдут, когда всё уже поднято
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.info("webhook set: %s%s", WEBHOOK_URL, WEBHOOK_PATH)
+
+    app.on_shutdown.append(delete_webhook)
+    setup_application(app, dp, bot=bot)
+    app.on_startup.append(set_webhook)
+    return app
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL is empty")
+
+    runner = web.AppRunner(create_webhook_app(bot, dp))
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logging.info("webhook server on %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+async def main():
+    if not BOT_TOKEN:
+        raise RuntimeError("BOT_TOKEN is empty")
+
+    bot = Bot(BOT_TOKEN, parse_mode="Markdown")
+    dp = create_dispatcher(bot)
+    if BOT_MODE == "webhook":
+        await run_webhook(bot, dp)
+    else:
+        # если раньше работал webhook, getUpdates без этого вернёт конфликт
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
 
 
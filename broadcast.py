@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from ratelimit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+LAST_LOAD_KEY = "broadcast_last_load_id"
+
+
+class Broadcaster:
+    # Рассылка из персистентной очереди broadcast_queue: общий token bucket
+    # под глобальный лимит Telegram (~30 msg/s), не чаще раза в per_chat_interval
+    # в один чат, RetryAfter ставит на паузу всю рассылку. Несколько воркеров на
+    # общем bot.db рассылают вместе: каждый забирает свои строки очереди на lease секунд.
+    def __init__(
+        self,
+        bot,
+        db,
+        *,
+        rate: float = 25.0,
+        per_chat_interval: float = 1.0,
+        concurrency: int = 10,
+        batch_size: int = 100,
+        max_attempts: int = 5,
+        lease: float = 300.0,
+        matcher=None,
+    ):
+        self.bot = bot
+        self.db = db
+        # RouteMatcher: у кого есть подписки на маршруты, тому только подходящие заявки
+        self.matcher = matcher
+        # без запаса на всплеск: равномерно, чтобы не упираться в окно Telegram
+        self.bucket = TokenBucket(rate, capacity=1.0)
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._chat_next: dict[int, float] = {}
+        self._wake = asyncio.Event()
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.last_rate = 0.0
+
+    async def enqueue(self, load_id: int, text: str, item: dict | None = None) -> int | None:
+        chat_ids = await self.db.list_active_user_ids()
+        if self.matcher is not None and item is not None:
+            chat_ids = self.matcher.recipients(chat_ids, item)
+        job_id = await self.db.create_broadcast(load_id, text, chat_ids)
+        if job_id is not None:
+            log.info("broadcast #%s: load %s -> %s recipients", job_id, load_id, len(chat_ids))
+            self._wake.set()
+        return job_id
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate": round(self.last_rate, 1),
+        }
+
+    async def run(self):
+        # после рестарта просто продолжаем с того, что осталось pending в БД
+        while True:
+            self._wake.clear()
+            batch = await self.db.next_broadcast_batch(self.batch_size, time.time(), self.owner, self.lease)
+            if not batch:
+                await self._idle()
+                continue
+            try:
+                await self._send_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("broadcast batch failed")
+                await asyncio.sleep(1)
+
+    async def _idle(self):
+        next_at = await self.db.next_broadcast_at()
+        timeout = 30.0 if next_at is None else min(30.0, max(0.05, next_at - time.time()))
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _send_batch(self, batch):
+        sent: list[tuple[int, int]] = []
+        failed: list[tuple[int, int]] = []
+        retry: list[tuple[int, int, int, float]] = []
+        sem = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def send(row, not_before: float):
+            job_id, chat_id, attempts = row["job_id"], row["chat_id"], row["attempts"]
+            wait = not_before - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            async with sem:
+                await self.bucket.acquire()
+                try:
+                    await self.bot.send_message(chat_id, row["text"])
+                except TelegramRetryAfter as e:
+                    # флуд-контроль Telegram — не считаем попыткой, ждём сколько просили
+                    self.bucket.pause(e.retry_after)
+                    retry.append((job_id, chat_id, attempts, time.time() + e.retry_after))
+                except (TelegramForbiddenError, TelegramBadRequest) as e:
+                    # бот заблокирован / чат не найден — повтор не поможет
+                    log.info("broadcast #%s: chat %s failed: %s", job_id, chat_id, e)
+                    failed.append((job_id, chat_id))
+                except Exception as e:
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        log.warning("broadcast #%s: chat %s gave up: %r", job_id, chat_id, e)
+                        failed.append((job_id, chat_id))
+                    else:
+                        retry.append((job_id, chat_id, attempts, time.time() + 2 ** attempts))
+                else:
+                    sent.append((job_id, chat_id))
+
+        now = time.monotonic()
+        tasks = []
+        for row in batch:
+            chat_id = row["chat_id"]
+            not_before = max(now, self._chat_next.get(chat_id, 0.0))
+            self._chat_next[chat_id] = not_before + self.per_chat_interval
+            tasks.append(send(row, not_before))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # даже при остановке посреди пачки сохраняем, кому уже отправили,
+            # чтобы после рестарта не слать им повторно; до остальных очередь
+            # доходит сразу, не дожидаясь конца аренды
+            done = {(job_id, chat_id) for job_id, chat_id, *_ in (*sent, *failed, *retry)}
+            retry += [
+                (row["job_id"], row["chat_id"], row["attempts"], 0.0)
+                for row in batch
+                if (row["job_id"], row["chat_id"]) not in done
+            ]
+            finished = await asyncio.shield(self.db.finish_broadcast_items(sent, failed, retry, self.owner))
+
+        elapsed = time.monotonic() - started
+        self.sent += len(sent)
+        self.failed += len(failed)
+        self.retried += len(retry)
+        self.last_rate = len(sent) / elapsed if elapsed > 0 else 0.0
+
+        now = time.monotonic()
+        self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+
+        log.info(
+            "broadcast: batch sent=%s failed=%s retry=%s, %.1f msg/s",
+            len(sent), len(failed), len(retry), self.last_rate,
+        )
+        for job_id in finished:
+            log.info("broadcast #%s finished", job_id)
+
+
+class LoadWatcher:
+    # забирает с сервера только новые заявки (?after_id=) и ставит каждую в рассылку;
+    # если задан SERVER_STREAM_URL — держит одну SSE-подписку вместо опроса
+    def __init__(self, server, db, broadcaster: Broadcaster, render, *, interval: float = 10.0):
+        self.server = server
+        self.db = db
+        self.broadcaster = broadcaster
+        self.render = render
+        self.interval = interval
+        self._last_id: int | None = None
+
+    async def run(self):
+        raw = await self.db.get_meta(LAST_LOAD_KEY)
+        self._last_id = int(raw) if raw is not None else None
+        while True:
+            try:
+                if self.server.stream_base:
+                    await self.follow()
+                else:
+                    await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("load watcher poll failed")
+            await asyncio.sleep(self.interval)
+
+    async def follow(self):
+        # при каждом (пере)подключении сначала догоняем пропущенное через after_id,
+        # дальше заявки приходят в событиях потока сразу после записи на сервере
+        async for event in self.server.stream_loads(on_connect=self.poll):
+            self.server.mark_stale()
+            if self._last_id is None:
+                await self.poll()
+                continue
+            for item in event.get("loads", []):
+                load_id = int(item["id"])
+                if load_id <= self._last_id:
+                    # смена статуса старой заявки — рассылать нечего
+                    continue
+                if item.get("status", "active") == "active":
+                    await self.broadcaster.enqueue(load_id, self.render(item), item)
+                await self._remember(load_id)
+        log.info("load stream closed by server, reconnecting")
+
+    async def poll(self):
+        if self._last_id is None:
+            # первый запуск: историю не рассылаем, запоминаем, откуда начинать
+            resp = await self.server.get_recent_loads(limit=1)
+            if not resp.get("ok") or resp.get("not_modified"):
+                return
+            loads = resp["data"].get("loads", [])
+            await self._remember(max((int(item["id"]) for item in loads), default=0))
+            return
+
+        while True:
+            resp = await self.server.get_loads_after(self._last_id, limit=100)
+            if not resp.get("ok"):
+                return
+            data = resp["data"]
+            for item in data.get("loads", []):
+                if item.get("status", "active") == "active":
+                    await self.broadcaster.enqueue(int(item["id"]), self.render(item), item)
+                await self._remember(int(item["id"]))
+            if not data.get("has_more"):
+                return
+
+    async def _remember(self, load_id: int):
+        self._last_id = load_id
+        await self.db.set_meta(LAST_LOAD_KEY, str(load_id))
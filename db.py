@@ -1,8 +1,21 @@
-﻿import sqlite3
+﻿import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
+from metrics import Histogram
+from sqlprof import SQLProfiler
+
 UTC = timezone.utc
 
+# время вызова AsyncDB глазами хендлера: ожидание потока БД + сам запрос
+DB_LATENCY = Histogram("bot_db_call_duration_seconds", "AsyncDB call time, queueing included", ("method",))
+
 def now_utc() -> datetime:
     return datetime.now(tz=UTC)
 
@@ -12,16 +25,85 @@ def dt_to_str(dt: datetime) -> str:
 def str_to_dt(s: str) -> datetime:
     return datetime.fromisoformat(s)
 
+class AccessCache:
+    # tg_id -> access_until (или None), LRU ограниченного размера.
+    # Активная подписка живёт в кэше ровно до момента access_until,
+    # остальные записи (доступа нет или он истёк) — negative_ttl секунд:
+    # сброс кэша действует только в своём процессе, и доступ, выданный
+    # другим воркером на общем bot.db, должен стать виден быстро.
+    MISS = object()
+
+    def __init__(self, maxsize: int = 10000, negative_ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self._data: OrderedDict[int, tuple[datetime | None, datetime]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tg_id: int):
+        with self._lock:
+            entry = self._data.get(tg_id)
+            if entry is not None:
+                until, expires = entry
+                if expires > now_utc():
+                    self._data.move_to_end(tg_id)
+                    self.hits += 1
+                    return until
+                del self._data[tg_id]
+            self.misses += 1
+            return self.MISS
+
+    def put(self, tg_id: int, until: datetime | None):
+        if self.maxsize <= 0:
+            return
+        now = now_utc()
+        expires = until if (until and until > now) else now + timedelta(seconds=self.negative_ttl)
+        with self._lock:
+            self._data[tg_id] = (until, expires)
+            self._data.move_to_end(tg_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, tg_id: int):
+        with self._lock:
+            self._data.pop(tg_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
 class DB:
-    def __init__(self, path: str = "bot.db"):
+    def __init__(self, path: str = "bot.db", *, persistent: bool = False, profiler: SQLProfiler | None = None):
         self.path = path
+        self.access_cache = AccessCache(
+            int(os.getenv("ACCESS_CACHE_SIZE", "10000")), float(os.getenv("ACCESS_CACHE_NEGATIVE_TTL", "5"))
+        )
+        # profiler: время каждого запроса и отчёт /sql (SQL_PROFILE=1)
+        self.profiler = profiler
+        self._factory = profiler.connection_factory if profiler is not None else sqlite3.Connection
+        # persistent=True: одно долгоживущее соединение в WAL-режиме вместо connect() на каждый вызов
+        self._shared: sqlite3.Connection | None = None
+        if persistent:
+            self._shared = sqlite3.connect(self.path, check_same_thread=False, factory=self._factory)
+            self._shared.row_factory = sqlite3.Row
+            self._shared.execute("PRAGMA journal_mode=WAL")
+            self._shared.execute("PRAGMA synchronous=NORMAL")
+            self._shared.execute("PRAGMA busy_timeout=5000")
         self._init()
 
     def _conn(self):
-        conn = sqlite3.connect(self.path)
+        if self._shared is not None:
+            return self._shared
+        conn = sqlite3.connect(self.path, factory=self._factory)
         conn.row_factory = sqlite3.Row
         return conn
 
+    def close(self):
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
     def _init(self):
         with self._conn() as c:
             c.execute("""
@@ -45,6 +127,68 @@ class DB:
             )
             """)
             c.execute("CREATE INDEX IF NOT EXISTS idx_req_status ON access_requests(status)")
+            # create_access_request ищет pending-заявку пользователя: без индекса — скан всей таблицы
+            c.execute("CREATE INDEX IF NOT EXISTS idx_req_tg_status ON access_requests(tg_id, status)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_users_access_until ON users(access_until)")
+
+            # рассылка новых заявок: задание на каждую заявку + очередь получателей
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_jobs(
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              load_id INTEGER NOT NULL UNIQUE,
+              text TEXT NOT NULL,
+              created_at TEXT NOT NULL,
+              total INTEGER NOT NULL,
+              sent INTEGER NOT NULL DEFAULT 0,
+              failed INTEGER NOT NULL DEFAULT 0,
+              finished_at TEXT
+            )
+            """)
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_queue(
+              job_id INTEGER NOT NULL,
+              chat_id INTEGER NOT NULL,
+              status TEXT NOT NULL DEFAULT 'pending',   -- pending/sending/sent/failed
+              attempts INTEGER NOT NULL DEFAULT 0,
+              next_at REAL NOT NULL DEFAULT 0,
+              owner TEXT,                               -- какой воркер забрал строку в sending
+              PRIMARY KEY(job_id, chat_id)
+            )
+            """)
+            if "owner" not in {row["name"] for row in c.execute("PRAGMA table_info(broadcast_queue)")}:
+                c.execute("ALTER TABLE broadcast_queue ADD COLUMN owner TEXT")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_bq_pending ON broadcast_queue(status, next_at)")
+
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS meta(
+              key TEXT PRIMARY KEY,
+              value TEXT NOT NULL
+            )
+            """)
+
+            # сохранённые фильтры маршрутов: пустое поле = любое значение
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions(
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              tg_id INTEGER NOT NULL,
+              origin TEXT NOT NULL DEFAULT '',
+              dest TEXT NOT NULL DEFAULT '',
+              transport TEXT NOT NULL DEFAULT '',
+              created_at TEXT NOT NULL
+            )
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_subs_tg_id ON subscriptions(tg_id)")
+
+            # состояния FSM (SQLiteStorage): ключ — StorageKey одной строкой, живёт до expires_at
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_state(
+              key TEXT PRIMARY KEY,
+              state TEXT,
+              data TEXT NOT NULL DEFAULT '{}',
+              expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_fsm_expires ON fsm_state(expires_at)")
             c.commit()
 
     def ensure_user(self, tg_id: int):
@@ -67,44 +211,81 @@ class DB:
             return row["phone"] if row and row["phone"] else None
 
     def get_access_until(self, tg_id: int):
+        until = self.access_cache.get(tg_id)
+        if until is not AccessCache.MISS:
+            return until
+        return self._load_access_until(tg_id)
+
+    def _load_access_until(self, tg_id: int):
         with self._conn() as c:
             row = c.execute("SELECT access_until FROM users WHERE tg_id=?", (tg_id,)).fetchone()
-            if not row or not row["access_until"]:
-                return None
-            return str_to_dt(row["access_until"])
+        until = str_to_dt(row["access_until"]) if row and row["access_until"] else None
+        self.access_cache.put(tg_id, until)
+        return until
 
     def has_access(self, tg_id: int) -> bool:
         until = self.get_access_until(tg_id)
         return bool(until and until > now_utc())
 
     def grant_access_days(self, tg_id: int, days: int):
-        self.ensure_user(tg_id)
-        current = self.get_access_until(tg_id)
-        base = current if (current and current > now_utc()) else now_utc()
-        new_until = base + timedelta(days=days)
         with self._conn() as c:
-            c.execute("UPDATE users SET access_until=? WHERE tg_id=?", (dt_to_str(new_until), tg_id))
+            c.execute("BEGIN IMMEDIATE")
+            new_until = self._grant(c, tg_id, days)
             c.commit()
+        self.access_cache.put(tg_id, new_until)
         return new_until
 
-    def create_access_request(self, tg_id: int, phone: str) -> int:
-        self.ensure_user(tg_id)
+    def _grant(self, c, tg_id: int, days: int) -> datetime:
+        # внутри BEGIN IMMEDIATE: между чтением access_until и записью никто другой доступ не продлит
+        row = c.execute("SELECT access_until FROM users WHERE tg_id=?", (tg_id,)).fetchone()
+        current = str_to_dt(row["access_until"]) if row and row["access_until"] else None
+        now = now_utc()
+        new_until = (current if current and current > now else now) + timedelta(days=days)
+        c.execute("""
+            INSERT INTO users(tg_id, created_at, access_until) VALUES(?, ?, ?)
+            ON CONFLICT(tg_id) DO UPDATE SET access_until=excluded.access_until
+        """, (tg_id, dt_to_str(now), dt_to_str(new_until)))
+        return new_until
 
-        # если уже есть pending-заявка, не плодим новые
+    def create_access_request(self, tg_id: int, phone: str) -> tuple[int, bool]:
+        # (id заявки, создал ли её этот вызов): pending-заявка у пользователя одна,
+        # и два одновременных вызова не создадут вторую
         with self._conn() as c:
-            row = c.execute(
-                "SELECT id FROM access_requests WHERE tg_id=? AND status='pending' ORDER BY id DESC LIMIT 1",
-                (tg_id,)
-            ).fetchone()
-            if row:
-                return int(row["id"])
+            c.execute("BEGIN IMMEDIATE")
+            c.execute(
+                "INSERT OR IGNORE INTO users(tg_id, created_at) VALUES(?, ?)",
+                (tg_id, dt_to_str(now_utc()))
+            )
+            result = self._request_access(c, tg_id, phone)
+            c.commit()
+            return result
 
-            cur = c.execute("""
-            INSERT INTO access_requests(tg_id, created_at, phone, status)
-            VALUES(?, ?, ?, 'pending')
+    def set_phone_and_request(self, tg_id: int, phone: str) -> tuple[int, bool]:
+        # то же, что set_phone + create_access_request, но одной транзакцией и одним коммитом
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("""
+                INSERT INTO users(tg_id, created_at, phone) VALUES(?, ?, ?)
+                ON CONFLICT(tg_id) DO UPDATE SET phone=excluded.phone
             """, (tg_id, dt_to_str(now_utc()), phone))
+            result = self._request_access(c, tg_id, phone)
             c.commit()
-            return int(cur.lastrowid)
+            return result
+
+    def _request_access(self, c, tg_id: int, phone: str) -> tuple[int, bool]:
+        # если уже есть pending-заявка, не плодим новые
+        row = c.execute(
+            "SELECT id FROM access_requests WHERE tg_id=? AND status='pending' ORDER BY id DESC LIMIT 1",
+            (tg_id,)
+        ).fetchone()
+        if row:
+            return int(row["id"]), False
+        row = c.execute("""
+            INSERT INTO access_requests(tg_id, created_at, phone, status)
+            VALUES(?, ?, ?, 'pending')
+            RETURNING id
+        """, (tg_id, dt_to_str(now_utc()), phone)).fetchone()
+        return int(row["id"]), True
 
     def get_request(self, req_id: int):
         with self._conn() as c:
@@ -119,20 +300,370 @@ class DB:
                 LIMIT ?
             """, (limit,)).fetchall()
 
-    def approve_request(self, req_id: int, admin_id: int):
+    def approve_and_grant(self, req_id: int, admin_id: int, days: int) -> tuple[int, datetime] | None:
+        # подтверждение заявки и продление доступа одной транзакцией.
+        # (tg_id, access_until), если заявку подтвердил этот вызов; None — заявки нет
+        # или она уже решена (второй админ, повторное нажатие), доступ не продлевается
         with self._conn() as c:
-            c.execute("""
+            c.execute("BEGIN IMMEDIATE")
+            row = c.execute("""
                 UPDATE access_requests
                 SET status='approved', admin_id=?, decided_at=?
                 WHERE id=? AND status='pending'
-            """, (admin_id, dt_to_str(now_utc()), req_id))
+                RETURNING tg_id
+            """, (admin_id, dt_to_str(now_utc()), req_id)).fetchone()
+            if row is None:
+                c.rollback()
+                return None
+            tg_id = int(row["tg_id"])
+            until = self._grant(c, tg_id, days)
             c.commit()
+        self.access_cache.put(tg_id, until)
+        return tg_id, until
 
-    def reject_request(self, req_id: int, admin_id: int):
+    def reject_request(self, req_id: int, admin_id: int) -> int | None:
+        # tg_id автора, если заявку отклонил этот вызов; None — её нет или она уже решена
         with self._conn() as c:
-            c.execute("""
+            row = c.execute("""
                 UPDATE access_requests
                 SET status='rejected', admin_id=?, decided_at=?
                 WHERE id=? AND status='pending'
-            """, (admin_id, dt_to_str(now_utc()), req_id))
+                RETURNING tg_id
+            """, (admin_id, dt_to_str(now_utc()), req_id)).fetchone()
+            c.commit()
+            return int(row["tg_id"]) if row else None
+
+    def get_meta(self, key: str) -> str | None:
+        with self._conn() as c:
+            row = c.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+            return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._conn() as c:
+            c.execute(
+                "INSERT INTO meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (key, value)
+            )
+            c.commit()
+
+    def list_active_user_ids(self) -> list[int]:
+        with self._conn() as c:
+            rows = c.execute(
+                "SELECT tg_id FROM users WHERE access_until > ?",
+                (dt_to_str(now_utc()),)
+            ).fetchall()
+            return [int(r["tg_id"]) for r in rows]
+
+    def add_subscription(self, tg_id: int, origin: str, dest: str, transport: str) -> dict:
+        with self._conn() as c:
+            cur = c.execute("""
+                INSERT INTO subscriptions(tg_id, origin, dest, transport, created_at)
+                VALUES(?, ?, ?, ?, ?)
+            """, (tg_id, origin, dest, transport, dt_to_str(now_utc())))
             c.commit()
+            row = c.execute("SELECT * FROM subscriptions WHERE id=?", (cur.lastrowid,)).fetchone()
+            return dict(row)
+
+    def list_subscriptions(self, tg_id: int | None = None) -> list[dict]:
+        # без tg_id — все подписки, для сборки индекса при старте
+        with self._conn() as c:
+            if tg_id is None:
+                rows = c.execute("SELECT id, tg_id, origin, dest, transport FROM subscriptions").fetchall()
+            else:
+                rows = c.execute(
+                    "SELECT id, tg_id, origin, dest, transport FROM subscriptions WHERE tg_id=? ORDER BY id",
+                    (tg_id,)
+                ).fetchall()
+            return [dict(r) for r in rows]
+
+    def count_subscriptions(self, tg_id: int) -> int:
+        with self._conn() as c:
+            return c.execute("SELECT COUNT(*) FROM subscriptions WHERE tg_id=?", (tg_id,)).fetchone()[0]
+
+    def delete_subscription(self, tg_id: int, sub_id: int) -> bool:
+        with self._conn() as c:
+            cur = c.execute("DELETE FROM subscriptions WHERE id=? AND tg_id=?", (sub_id, tg_id))
+            c.commit()
+            return cur.rowcount > 0
+
+    def create_broadcast(self, load_id: int, text: str, chat_ids: list[int]) -> int | None:
+        # одна рассылка на заявку: повторный вызов для того же load_id ничего не делает
+        with self._conn() as c:
+            cur = c.execute("""
+                INSERT OR IGNORE INTO broadcast_jobs(load_id, text, created_at, total)
+                VALUES(?, ?, ?, ?)
+            """, (load_id, text, dt_to_str(now_utc()), len(chat_ids)))
+            if not cur.rowcount:
+                c.commit()
+                return None
+            job_id = int(cur.lastrowid)
+            c.executemany(
+                "INSERT OR IGNORE INTO broadcast_queue(job_id, chat_id) VALUES(?, ?)",
+                [(job_id, chat_id) for chat_id in chat_ids]
+            )
+            if not chat_ids:
+                c.execute("UPDATE broadcast_jobs SET finished_at=? WHERE id=?", (dt_to_str(now_utc()), job_id))
+            c.commit()
+            return job_id
+
+    def next_broadcast_batch(self, limit: int, now: float, owner: str, lease: float = 300.0) -> list[dict]:
+        # пачка забирается одним UPDATE (pending -> sending), поэтому воркеры на общем
+        # bot.db не получат одни и те же строки. next_at у sending — конец аренды:
+        # строки воркера, упавшего посреди пачки, после него заберёт другой
+        with self._conn() as c:
+            rows = c.execute("""
+                UPDATE broadcast_queue SET status='sending', owner=?, next_at=?
+                WHERE rowid IN (
+                    SELECT rowid FROM broadcast_queue
+                    WHERE status IN ('pending', 'sending') AND next_at <= ?
+                    ORDER BY job_id, chat_id
+                    LIMIT ?
+                )
+                RETURNING job_id, chat_id, attempts
+            """, (owner, now + lease, now, limit)).fetchall()
+            job_ids = sorted({row["job_id"] for row in rows})
+            texts = dict(c.execute(
+                f"SELECT id, text FROM broadcast_jobs WHERE id IN ({','.join('?' * len(job_ids))})", job_ids
+            ).fetchall()) if job_ids else {}
+            c.commit()
+        rows = sorted(rows, key=lambda row: (row["job_id"], row["chat_id"]))
+        return [{**dict(row), "text": texts[row["job_id"]]} for row in rows]
+
+    def next_broadcast_at(self) -> float | None:
+        with self._conn() as c:
+            row = c.execute(
+                "SELECT MIN(next_at) AS next_at FROM broadcast_queue WHERE status IN ('pending', 'sending')"
+            ).fetchone()
+            return row["next_at"] if row and row["next_at"] is not None else None
+
+    def sql_report(self, top: int = 20, order: str = "total_ms") -> list[dict]:
+        if self.profiler is None:
+            return []
+        # планы — через отдельное обычное соединение, не через профилируемое
+        conn = sqlite3.connect(self.path)
+        try:
+            return self.profiler.report(top, order, explain_conn=conn)
+        finally:
+            conn.close()
+
+    def get_fsm(self, key: str) -> tuple[str | None, str] | None:
+        # (state, data) или None, если записи нет или она просрочена
+        with self._conn() as c:
+            row = c.execute(
+                "SELECT state, data FROM fsm_state WHERE key=? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+            return (row["state"], row["data"]) if row else None
+
+    def set_fsm_state(self, key: str, state: str | None, ttl: float):
+        # у просроченной записи data не воскресает
+        now = time.time()
+        self._write_fsm(
+            key,
+            "INSERT INTO fsm_state(key, state, expires_at) VALUES(?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state=excluded.state, expires_at=excluded.expires_at, "
+            "data=CASE WHEN fsm_state.expires_at > ? THEN fsm_state.data ELSE '{}' END",
+            (key, state, now + ttl, now),
+        )
+
+    def set_fsm_data(self, key: str, data: str, ttl: float):
+        now = time.time()
+        self._write_fsm(
+            key,
+            "INSERT INTO fsm_state(key, data, expires_at) VALUES(?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data=excluded.data, expires_at=excluded.expires_at, "
+            "state=CASE WHEN fsm_state.expires_at > ? THEN fsm_state.state END",
+            (key, data, now + ttl, now),
+        )
+
+    def _write_fsm(self, key: str, sql: str, params: tuple):
+        with self._conn() as c:
+            c.execute(sql, params)
+            # пустая запись (после clear()) не нужна
+            c.execute("DELETE FROM fsm_state WHERE key=? AND state IS NULL AND data='{}'", (key,))
+            c.commit()
+
+    def purge_fsm(self) -> int:
+        with self._conn() as c:
+            purged = c.execute("DELETE FROM fsm_state WHERE expires_at <= ?", (time.time(),)).rowcount
+            c.commit()
+            return purged
+
+    def count_pending_broadcasts(self) -> int:
+        with self._conn() as c:
+            return c.execute(
+                "SELECT COUNT(*) FROM broadcast_queue WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+
+    def finish_broadcast_items(
+        self,
+        sent: list[tuple[int, int]],
+        failed: list[tuple[int, int]],
+        retry: list[tuple[int, int, int, float]],
+        owner: str,
+    ) -> list[int]:
+        # результаты пачки одной транзакцией; возвращает id завершённых рассылок.
+        # Трогаем только строки, которые всё ещё за этим воркером: если он не уложился
+        # в аренду и строку уже забрал другой, итог пишет тот, другой
+        mine = "AND status='sending' AND owner=?"
+        with self._conn() as c:
+            counts: dict[int, list[int]] = {}
+            for job_id, chat_id in sent:
+                cur = c.execute(
+                    f"UPDATE broadcast_queue SET status='sent', attempts=attempts+1 "
+                    f"WHERE job_id=? AND chat_id=? {mine}",
+                    (job_id, chat_id, owner)
+                )
+                if cur.rowcount:
+                    counts.setdefault(job_id, [0, 0])[0] += 1
+            for job_id, chat_id in failed:
+                cur = c.execute(
+                    f"UPDATE broadcast_queue SET status='failed', attempts=attempts+1 "
+                    f"WHERE job_id=? AND chat_id=? {mine}",
+                    (job_id, chat_id, owner)
+                )
+                if cur.rowcount:
+                    counts.setdefault(job_id, [0, 0])[1] += 1
+            c.executemany(
+                "UPDATE broadcast_queue SET status='pending', owner=NULL, attempts=?, next_at=? "
+                f"WHERE job_id=? AND chat_id=? {mine}",
+                [(attempts, next_at, job_id, chat_id, owner) for job_id, chat_id, attempts, next_at in retry]
+            )
+
+            finished = []
+            for job_id, (n_sent, n_failed) in sorted(counts.items()):
+                c.execute(
+                    "UPDATE broadcast_jobs SET sent=sent+?, failed=failed+? WHERE id=?",
+                    (n_sent, n_failed, job_id)
+                )
+                pending = c.execute(
+                    "SELECT 1 FROM broadcast_queue WHERE job_id=? AND status IN ('pending', 'sending') LIMIT 1",
+                    (job_id,)
+                ).fetchone()
+                if not pending:
+                    c.execute(
+                        "UPDATE broadcast_jobs SET finished_at=? WHERE id=? AND finished_at IS NULL",
+                        (dt_to_str(now_utc()), job_id)
+                    )
+                    finished.append(job_id)
+            c.commit()
+            return finished
+
+    def list_broadcasts(self, limit: int = 10):
+        with self._conn() as c:
+            return c.execute(
+                "SELECT * FROM broadcast_jobs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+class AsyncDB:
+    # те же методы, что у DB, но awaitable: все запросы идут через одно
+    # соединение в отдельном потоке и не блокируют event loop
+    def __init__(self, path: str = "bot.db", *, profiler: SQLProfiler | None = None):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        self.sync = DB(path, persistent=True, profiler=profiler)
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - started, fn.__name__)
+
+    async def close(self):
+        await self._run(self.sync.close)
+        self._executor.shutdown(wait=False)
+
+    async def ensure_user(self, tg_id: int):
+        return await self._run(self.sync.ensure_user, tg_id)
+
+    async def set_phone(self, tg_id: int, phone: str):
+        return await self._run(self.sync.set_phone, tg_id, phone)
+
+    async def get_phone(self, tg_id: int) -> str | None:
+        return await self._run(self.sync.get_phone, tg_id)
+
+    async def get_access_until(self, tg_id: int):
+        # горячий путь: попадание в кэш отвечает прямо в event loop, без потока БД
+        until = self.sync.access_cache.get(tg_id)
+        if until is not AccessCache.MISS:
+            return until
+        return await self._run(self.sync._load_access_until, tg_id)
+
+    async def has_access(self, tg_id: int) -> bool:
+        until = await self.get_access_until(tg_id)
+        return bool(until and until > now_utc())
+
+    async def grant_access_days(self, tg_id: int, days: int):
+        return await self._run(self.sync.grant_access_days, tg_id, days)
+
+    async def create_access_request(self, tg_id: int, phone: str) -> tuple[int, bool]:
+        return await self._run(self.sync.create_access_request, tg_id, phone)
+
+    async def set_phone_and_request(self, tg_id: int, phone: str) -> tuple[int, bool]:
+        return await self._run(self.sync.set_phone_and_request, tg_id, phone)
+
+    async def get_request(self, req_id: int):
+        return await self._run(self.sync.get_request, req_id)
+
+    async def list_pending(self, limit: int = 20):
+        return await self._run(self.sync.list_pending, limit)
+
+    async def approve_and_grant(self, req_id: int, admin_id: int, days: int) -> tuple[int, datetime] | None:
+        return await self._run(self.sync.approve_and_grant, req_id, admin_id, days)
+
+    async def reject_request(self, req_id: int, admin_id: int) -> int | None:
+        return await self._run(self.sync.reject_request, req_id, admin_id)
+
+    async def get_meta(self, key: str) -> str | None:
+        return await self._run(self.sync.get_meta, key)
+
+    async def set_meta(self, key: str, value: str):
+        return await self._run(self.sync.set_meta, key, value)
+
+    async def list_active_user_ids(self) -> list[int]:
+        return await self._run(self.sync.list_active_user_ids)
+
+    async def add_subscription(self, tg_id: int, origin: str, dest: str, transport: str) -> dict:
+        return await self._run(self.sync.add_subscription, tg_id, origin, dest, transport)
+
+    async def list_subscriptions(self, tg_id: int | None = None) -> list[dict]:
+        return await self._run(self.sync.list_subscriptions, tg_id)
+
+    async def count_subscriptions(self, tg_id: int) -> int:
+        return await self._run(self.sync.count_subscriptions, tg_id)
+
+    async def delete_subscription(self, tg_id: int, sub_id: int) -> bool:
+        return await self._run(self.sync.delete_subscription, tg_id, sub_id)
+
+    async def create_broadcast(self, load_id: int, text: str, chat_ids: list[int]) -> int | None:
+        return await self._run(self.sync.create_broadcast, load_id, text, chat_ids)
+
+    async def next_broadcast_batch(self, limit: int, now: float, owner: str, lease: float = 300.0) -> list[dict]:
+        return await self._run(self.sync.next_broadcast_batch, limit, now, owner, lease)
+
+    async def next_broadcast_at(self) -> float | None:
+        return await self._run(self.sync.next_broadcast_at)
+
+    async def count_pending_broadcasts(self) -> int:
+        return await self._run(self.sync.count_pending_broadcasts)
+
+    async def get_fsm(self, key: str) -> tuple[str | None, str] | None:
+        return await self._run(self.sync.get_fsm, key)
+
+    async def set_fsm_state(self, key: str, state: str | None, ttl: float):
+        return await self._run(self.sync.set_fsm_state, key, state, ttl)
+
+    async def set_fsm_data(self, key: str, data: str, ttl: float):
+        return await self._run(self.sync.set_fsm_data, key, data, ttl)
+
+    async def purge_fsm(self) -> int:
+        return await self._run(self.sync.purge_fsm)
+
+    async def sql_report(self, top: int = 20, order: str = "total_ms") -> list[dict]:
+        return await self._run(self.sync.sql_report, top, order)
+
+    async def finish_broadcast_items(self, sent, failed, retry, owner: str) -> list[int]:
+        return await self._run(self.sync.finish_broadcast_items, sent, failed, retry, owner)
+
+    async def list_broadcasts(self, limit: int = 10):
+        return await self._run(self.sync.list_broadcasts, limit)
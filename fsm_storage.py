@@ -0,0 +1,62 @@
+import asyncio
+import json
+import logging
+import sqlite3
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from db import AsyncDB
+
+log = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    # FSM aiogram в таблице fsm_state базы бота: состояние переживает рестарт и
+    # общее для всех воркеров на одном bot.db. Запись живёт ttl секунд с последнего
+    # изменения; просроченные не читаются, а run() их периодически удаляет.
+    #
+    # get_state зовётся FSM-middleware на каждый апдейт, прошедший троттлинг. Запросы
+    # идут через тот же поток AsyncDB, что и остальные: поиск по первичному ключу дёшев,
+    # а sqlite прямо из event loop отпускает GIL и спорит за него с потоком БД — так
+    # выходит медленнее.
+    def __init__(self, db: AsyncDB, *, ttl: float = 86400.0):
+        self.db = db
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return (
+            f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}"
+        )
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self.db.set_fsm_state(self._key(key), value, self.ttl)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        row = await self.db.get_fsm(self._key(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await self.db.set_fsm_data(self._key(key), json.dumps(data, ensure_ascii=False), self.ttl)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        row = await self.db.get_fsm(self._key(key))
+        return json.loads(row[1]) if row else {}
+
+    async def run(self, interval: float = 3600.0):
+        while True:
+            try:
+                purged = await self.db.purge_fsm()
+                if purged:
+                    log.info("fsm: purged %s expired states", purged)
+            except sqlite3.Error as e:
+                log.warning("fsm purge failed: %s", e)
+            await asyncio.sleep(interval)
+
+    async def close(self) -> None:
+        # соединением владеет AsyncDB, его закрывает on_shutdown
+        pass
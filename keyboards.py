@@ -1,4 +1,10 @@
-﻿from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
+﻿from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
+
+class LoadsPage(CallbackData, prefix="loads"):
+    # "loads:page:<номер>"; кнопки без действия — "loads:noop"
+    action: str
+    page: int
 
 def user_menu():
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -7,6 +13,17 @@ def user_menu():
         [InlineKeyboardButton(text="📞 Изменить номер телефона", callback_data="change_phone")],
     ])
 
+def loads_pager_kb(page: int, pages: int):
+    # ◀ 2/5 ▶ над обычным меню; листание редактирует то же сообщение
+    rows = []
+    if pages > 1:
+        rows.append([
+            InlineKeyboardButton(text="◀", callback_data=LoadsPage(action="page", page=page - 1).pack() if page > 0 else "loads:noop"),
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="loads:noop"),
+            InlineKeyboardButton(text="▶", callback_data=LoadsPage(action="page", page=page + 1).pack() if page < pages - 1 else "loads:noop"),
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=rows + user_menu().inline_keyboard)
+
 def phone_request_kb():
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text="📲 Отправить номер", request_contact=True)]],
@@ -1,29 +1,215 @@
+import asyncio
+import base64
+import bisect
+import codecs
+import functools
+import hashlib
+import hmac
+import json
+import logging
 import os
+import secrets
 import sqlite3
-from datetime import datetime, timezone
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
 
-from flask import Flask, jsonify, redirect, render_template, request, url_for
+from aiohttp import web
+from flask import Flask, Response, flash, jsonify, redirect, render_template, request, session, url_for
+from flask.json.provider import JSONProvider
+from waitress import serve
+
+import wire
+from metrics import CONTENT_TYPE, REGISTRY, Counter, Gauge, Histogram
+from sqlprof import SQLProfiler, format_report
+from textnorm import fold, normalize_city, parse_weight, split_route, tokens
 
 
 UTC = timezone.utc
 
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+# production — waitress с пулом из SERVER_THREADS потоков, dev — встроенный сервер Flask
+SERVER_MODE = os.getenv("SERVER_MODE", "production")
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "8"))
+
+# соединения с loads.db: сколько ждать чужую запись (мс) и режим synchronous (в WAL хватает NORMAL)
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"SQLITE_SYNCHRONOUS: unknown mode {SQLITE_SYNCHRONOUS!r}")
+
+# поток изменений (SSE / long-poll) — отдельный aiohttp-сервер рядом с Flask
+STREAM_ENABLED = os.getenv("STREAM_ENABLED", "1") == "1"
+STREAM_HOST = os.getenv("STREAM_HOST", os.getenv("SERVER_HOST", "127.0.0.1"))
+STREAM_PORT = int(os.getenv("STREAM_PORT", "5005"))
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+STREAM_BUFFER = int(os.getenv("STREAM_BUFFER", "1000"))
+# записи других процессов на той же loads.db notify() не видит — раз в столько секунд
+# поток сверяется с базой сам; 0 — только записи этого процесса
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "1"))
+
+# архивация: заявки с load_date старше ARCHIVE_GRACE_DAYS дней уходят из активных
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "1") == "1"
+ARCHIVE_GRACE_DAYS = int(os.getenv("ARCHIVE_GRACE_DAYS", "2"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "500"))
+
+# поток изменений и архивация стартуют в `python load_server.py`; под другим WSGI-сервером
+# (waitress-serve, gunicorn) их запускает create_app при SERVER_BACKGROUND=1 — ровно в одном процессе
+SERVER_BACKGROUND = os.getenv("SERVER_BACKGROUND", "0") == "1"
+
+# профилировщик SQL: время каждого запроса, лог медленных, отчёт в /admin/sql
+SQL_PROFILE = os.getenv("SQL_PROFILE", "0") == "1"
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "50"))
+
+# повтор POST /api/loads с тем же Idempotency-Key отдаёт сохранённый ответ
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+# /loads/latest и /api/loads: gzip для тел от GZIP_MIN_SIZE байт, закодированные
+# тела последних RESPONSE_CACHE_SIZE вариантов (версия данных, параметры, формат) держим в памяти
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+GZIP_ETAG_SUFFIX = "-gzip"
+
+log = logging.getLogger(__name__)
+
+FTS_PREFIX_MIN = 3
+FTS_PREFIX_MAX = 6
+
+LOAD_COLUMNS = (
+    "id, direction, cargo, transport, load_date, extra, status, created_at, updated_at, "
+    "origin_city, dest_city, weight_tons"
+)
+# только даты вида YYYY-MM-DD можно сравнивать строками
+ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*"
+
+HTTP_REQUESTS = Counter(
+    "loadserver_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "loadserver_http_request_duration_seconds", "HTTP request handling time", ("method", "route")
+)
+DB_LATENCY = Histogram("loadserver_db_query_duration_seconds", "LoadStore call time, SQLite included", ("op",))
+DB_ROWS = Counter("loadserver_db_rows_total", "Rows read or written by LoadStore calls", ("op",))
+LOADS_ROWS = Gauge("loadserver_loads_rows", "Rows in the loads tables", ("table", "status"))
+STREAM_LISTENERS = Gauge("loadserver_stream_listeners", "Open SSE connections")
+STREAM_BUFFERED = Gauge("loadserver_stream_buffered", "Changes held in the stream buffer")
+DUPLICATES = Counter("loadserver_duplicates_total", "Loads not inserted because they were repeats", ("reason",))
+RESPONSE_CACHE = Counter("loadserver_response_cache_total", "Encoded list responses by cache state", ("result",))
+
+
+def db_op(op: str, rows=len):
+    # время вызова LoadStore и число строк в ответе (rows(result))
+    def wrap(fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            DB_LATENCY.observe(time.perf_counter() - started, op)
+            DB_ROWS.inc(op, amount=rows(result))
+            return result
+
+        return timed
+
+    return wrap
+
+
+def found(result) -> int:
+    return 0 if result is None else 1
+
 
 def now_iso() -> str:
     return datetime.now(tz=UTC).isoformat()
 
 
+def encode_cursor(ts: str, load_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts}|{load_id}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    # ValueError на мусор — роуты превращают его в 400
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts, load_id = raw.rsplit("|", 1)
+        return ts, int(load_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def load_fingerprint(direction: str, cargo: str, transport: str, load_date: str) -> str:
+    # одна и та же заявка в разном написании ("Ташкент - Москва" / "tashkent moskva") — один отпечаток
+    key = "\x1f".join((fold(direction), fold(cargo), fold(transport), load_date.strip()))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+INSERT_COLUMNS = (
+    "direction, cargo, transport, load_date, extra, created_at, updated_at, fingerprint, "
+    "origin_city, dest_city, weight_tons"
+)
+INSERT_MARKS = ", ".join("?" * len(INSERT_COLUMNS.split(",")))
+
+
+def fts_values(row) -> tuple:
+    # (id, direction, cargo, transport, extra) -> то же, но текст свёрнут fold, как его видит поиск
+    return (row[0], *(fold(value or "") for value in row[1:5]))
+
+
+def insert_params(row: dict, created_at: str, fingerprint: str) -> tuple:
+    return (
+        row["direction"], row["cargo"], row["transport"], row["load_date"], row.get("extra", ""),
+        created_at, created_at, fingerprint, *route_fields(row["direction"], row["cargo"]),
+    )
+
+
+def route_fields(direction: str, cargo: str) -> tuple[str, str, float | None]:
+    # "Ташкент - Москва", "Текстиль, 20 тонн" -> ("tashkent", "moskva", 20.0)
+    origin, dest = split_route(direction)
+    return normalize_city(origin), normalize_city(dest), parse_weight(cargo)
+
+
 class LoadStore:
-    def __init__(self, path: str):
+    def __init__(self, path: str, *, profiler: SQLProfiler | None = None):
         self.path = path
+        self.profiler = profiler
+        # вызываются после каждой записи (из того потока, который писал)
+        self.listeners: list = []
+        # соединение на поток: открывается при первом запросе и живёт, пока жив поток
+        # (у waitress пул постоянный; werkzeug в dev заводит поток на запрос)
+        self._local = threading.local()
         self._init_db()
 
-    def _conn(self):
-        conn = sqlite3.connect(self.path)
+    def _changed(self):
+        for listener in self.listeners:
+            listener()
+
+    def _connect(self, *, profiled: bool = True):
+        factory = self.profiler.connection_factory if self.profiler is not None and profiled else sqlite3.Connection
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT / 1000, factory=factory)
         conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
         return conn
 
     def _init_db(self):
-        with self._conn() as conn:
+        # схему и миграции могут одновременно начать несколько процессов-воркеров:
+        # всё под BEGIN IMMEDIATE, так что проверки колонок и ALTER идут строго по очереди
+        conn = self._connect()
+        try:
+            # WAL: читатели не ждут писателя; режим хранится в самом файле базы
+            conn.execute("PRAGMA journal_mode = WAL")
+            # только для миграции ниже: в схеме (триггерах, индексах) функций приложения нет,
+            # писать в loads можно и из sqlite3 CLI
+            conn.create_function("load_fingerprint", 4, load_fingerprint, deterministic=True)
+            conn.execute("BEGIN IMMEDIATE")
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS loads(
@@ -38,11 +224,188 @@ class LoadStore:
                 )
                 """
             )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(loads)")}
+            if "updated_at" not in columns:
+                # время последнего изменения строки (вставка или смена статуса) — для дельт
+                conn.execute("ALTER TABLE loads ADD COLUMN updated_at TEXT")
+                conn.execute("UPDATE loads SET updated_at = created_at WHERE updated_at IS NULL")
+            if "fingerprint" not in columns:
+                # отпечаток нормализованных direction/cargo/transport/load_date: среди активных
+                # заявок он уникален, повтор отсекается индексом. Из уже накопленных
+                # дублей отпечаток получает только первая заявка, остальные не трогаем
+                conn.execute("ALTER TABLE loads ADD COLUMN fingerprint TEXT")
+                conn.execute(
+                    """
+                    UPDATE loads SET fingerprint = load_fingerprint(direction, cargo, transport, load_date)
+                    WHERE id IN (
+                        SELECT MIN(id) FROM loads WHERE status = 'active'
+                        GROUP BY load_fingerprint(direction, cargo, transport, load_date)
+                    )
+                    """
+                )
             conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_loads_status_created_at ON loads(status, created_at DESC)"
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_loads_fingerprint ON loads(fingerprint) WHERE status = 'active'"
             )
+
+            # (status, created_at, id) — keyset-пагинация; старый индекс без id — его префикс
+            conn.execute("DROP INDEX IF EXISTS idx_loads_status_created_at")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_loads_status_created_id ON loads(status, created_at DESC, id DESC)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_loads_updated_id ON loads(updated_at, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_loads_status_load_date ON loads(status, load_date)")
+
+            # закрытые и просроченные заявки переезжают сюда, в loads остаются только активные
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS loads_archive(
+                    id INTEGER PRIMARY KEY,
+                    direction TEXT NOT NULL,
+                    cargo TEXT NOT NULL,
+                    transport TEXT NOT NULL,
+                    load_date TEXT NOT NULL,
+                    extra TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    archived_at TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_loads_archive_created_id ON loads_archive(created_at DESC, id DESC)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_loads_archive_updated_id ON loads_archive(updated_at, id)")
+            self._init_route_columns(conn)
+            self._init_fts(conn)
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
 
+    def _init_route_columns(self, conn):
+        # откуда / куда / тоннаж, разобранные из direction и cargo при записи:
+        # по ним фильтры идут по индексу, а не разбором текста каждой строки
+        conn.create_function("route_city", 2, lambda direction, i: route_fields(direction, "")[i], deterministic=True)
+        conn.create_function("parse_weight", 1, parse_weight, deterministic=True)
+        for table in ("loads", "loads_archive"):
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if "origin_city" in columns:
+                continue
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN origin_city TEXT NOT NULL DEFAULT ''")
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN dest_city TEXT NOT NULL DEFAULT ''")
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN weight_tons REAL")
+            # разбор уже накопленных строк, один раз; updated_at не меняется — для ленты это не изменение
+            conn.execute(
+                f"""
+                UPDATE {table} SET origin_city = route_city(direction, 0), dest_city = route_city(direction, 1),
+                                   weight_tons = parse_weight(cargo)
+                """
+            )
+        # "из X, от N тонн, даты с..по": город — равенство, дальше порядок ленты (keyset без сортировки),
+        # а дата и тоннаж проверяются прямо по индексу, без чтения строки
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_loads_origin
+            ON loads(status, origin_city, created_at DESC, id DESC, load_date, weight_tons)
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_loads_dest
+            ON loads(status, dest_city, created_at DESC, id DESC, load_date, weight_tons)
+            """
+        )
+
+    def _init_fts(self, conn):
+        # полнотекстовый индекс без копии текста (content=''): храним только
+        # нормализованные токены, строки берём из loads по rowid = id
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'loads_fts'"
+        ).fetchone()
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS loads_fts USING fts5(
+                direction, cargo, transport, extra,
+                content='', prefix='3 4 5 6', tokenize='ascii'
+            )
+            """
+        )
+        # Триггеров нет: fold — функция Python, и триггер с ней ломал бы любую запись в loads
+        # мимо приложения (sqlite3 CLI, скрипты) ошибкой "no such function". Индекс ведёт
+        # LoadStore: _insert / create_many добавляют строки, move_to_archive удаляет.
+        # Строки, вставленные или изменённые мимо LoadStore, в поиск не попадут до rebuild_fts().
+        # Так же и fingerprint: без него заявка не участвует в отсеве дублей
+        for name in ("loads_fts_ai", "loads_fts_ad", "loads_fts_au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        if not exists:
+            # индекс появился на уже заполненной базе — один раз проиндексировать старые строки
+            self._fts_rebuild(conn)
+
+    def rebuild_fts(self):
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._fts_rebuild(conn)
+            conn.commit()
+
+    @staticmethod
+    def _fts_rebuild(conn):
+        conn.execute("INSERT INTO loads_fts(loads_fts) VALUES('delete-all')")
+        conn.executemany(
+            "INSERT INTO loads_fts(rowid, direction, cargo, transport, extra) VALUES(?, ?, ?, ?, ?)",
+            (fts_values(row) for row in conn.execute("SELECT id, direction, cargo, transport, extra FROM loads")),
+        )
+
+    @staticmethod
+    def _fts_add(conn, rows):
+        # rows: (id, direction, cargo, transport, extra)
+        conn.executemany(
+            "INSERT INTO loads_fts(rowid, direction, cargo, transport, extra) VALUES(?, ?, ?, ?, ?)",
+            [fts_values(row) for row in rows],
+        )
+
+    @staticmethod
+    def _fts_delete(conn, rows):
+        # contentless FTS5 удаляет по тем же токенам, что были вставлены
+        conn.executemany(
+            "INSERT INTO loads_fts(loads_fts, rowid, direction, cargo, transport, extra) VALUES('delete', ?, ?, ?, ?, ?)",
+            [fts_values(row) for row in rows],
+        )
+
+    @staticmethod
+    def _insert(conn, row: dict, created_at: str) -> tuple[int, bool]:
+        # (id, True) — новая заявка; (id, False) — такая активная уже есть, вернули её id.
+        # Дубль ищем до вставки: отвергнутый INSERT в AUTOINCREMENT-таблице всё равно
+        # съедает id, и при повторах клиента в номерах заявок появлялись бы дыры
+        fingerprint = load_fingerprint(row["direction"], row["cargo"], row["transport"], row["load_date"])
+        existing = LoadStore._fingerprint_ids(conn, [fingerprint])
+        if existing:
+            DUPLICATES.inc("fingerprint")
+            return existing[fingerprint], False
+        load_id = conn.execute(
+            f"INSERT INTO loads({INSERT_COLUMNS}) VALUES({INSERT_MARKS}) RETURNING id",
+            insert_params(row, created_at, fingerprint),
+        ).fetchone()[0]
+        LoadStore._fts_add(conn, [(load_id, row["direction"], row["cargo"], row["transport"], row["extra"])])
+        return int(load_id), True
+
+    @staticmethod
+    def _fingerprint_ids(conn, fingerprints: list[str]) -> dict[str, int]:
+        # отпечаток -> id активной заявки с ним
+        ids: dict[str, int] = {}
+        for start in range(0, len(fingerprints), 500):
+            part = fingerprints[start:start + 500]
+            ids.update(
+                conn.execute(
+                    f"SELECT fingerprint, id FROM loads WHERE status = 'active' AND fingerprint IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+            )
+        return ids
+
+    @db_op("create_load", rows=lambda result: int(result[1]))
     def create_load(
         self,
         *,
@@ -51,48 +414,958 @@ class LoadStore:
         transport: str,
         load_date: str,
         extra: str = "",
-    ) -> int:
-        with self._conn() as conn:
-            cur = conn.execute(
-                """
-                INSERT INTO loads(direction, cargo, transport, load_date, extra, created_at)
-                VALUES(?, ?, ?, ?, ?, ?)
-                """,
-                (direction, cargo, transport, load_date, extra, now_iso()),
+    ) -> tuple[int, bool]:
+        row = {"direction": direction, "cargo": cargo, "transport": transport, "load_date": load_date, "extra": extra}
+        conn = self._conn()
+        try:
+            # под BEGIN IMMEDIATE между вставкой и поиском дубля никто не закроет найденную заявку
+            conn.execute("BEGIN IMMEDIATE")
+            load_id, created = self._insert(conn, row, now_iso())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if created:
+            self._changed()
+        return load_id, created
+
+    @db_op("create_many", rows=lambda results: sum(created for _, created in results))
+    def create_many(self, rows: list[dict]) -> list[tuple[int, bool]]:
+        # одна транзакция на пачку; повторы (в том числе внутри самой пачки)
+        # получают id уже существующей заявки, как в create_load
+        if not rows:
+            return []
+        created_at = now_iso()
+        fingerprints = [load_fingerprint(r["direction"], r["cargo"], r["transport"], r["load_date"]) for r in rows]
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # под BEGIN IMMEDIATE никто больше не пишет: что активно сейчас, то и будет дублем.
+            # Вставляем только новое — отвергнутые вставки съедали бы id (см. _insert)
+            unique = list(dict.fromkeys(fingerprints))
+            ids = self._fingerprint_ids(conn, unique)
+            fresh: dict[str, dict] = {}
+            for row, fp in zip(rows, fingerprints):
+                if fp not in ids and fp not in fresh:
+                    fresh[fp] = row
+            conn.executemany(
+                f"INSERT INTO loads({INSERT_COLUMNS}) VALUES({INSERT_MARKS})",
+                [insert_params(row, created_at, fp) for fp, row in fresh.items()],
+            )
+            ids.update(self._fingerprint_ids(conn, list(fresh)))
+            results = []
+            seen: set[str] = set()
+            for fp in fingerprints:
+                # новая — только первая из одинаковых в пачке и только если её не было до пачки
+                created = fp in fresh and fp not in seen
+                seen.add(fp)
+                results.append((ids[fp], created))
+            self._fts_add(
+                conn,
+                [
+                    (load_id, row["direction"], row["cargo"], row["transport"], row.get("extra", ""))
+                    for row, (load_id, created) in zip(rows, results)
+                    if created
+                ],
             )
             conn.commit()
-            return int(cur.lastrowid)
+        except Exception:
+            conn.rollback()
+            raise
+        duplicates = sum(not created for _, created in results)
+        if duplicates:
+            DUPLICATES.inc("fingerprint", amount=duplicates)
+        if duplicates < len(results):
+            self._changed()
+        return results
 
     def list_recent(self, limit: int = 30):
+        return self.list_page(limit=limit)
+
+    @db_op("list_page")
+    def list_page(
+        self,
+        limit: int = 30,
+        before: tuple[str, int] | None = None,
+        *,
+        q: str = "",
+        transport: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        origin: str = "",
+        dest: str = "",
+        min_tons: float | None = None,
+        max_tons: float | None = None,
+    ):
+        # keyset: следующая страница начинается строго после (created_at, id) последней строки;
+        # origin/dest — уже нормализованные normalize_city названия
+        route = {"origin": origin, "dest": dest, "min_tons": min_tons, "max_tons": max_tons}
+        match = fts_query(q, transport)
+        if match:
+            return self._search_page(match, limit, before, date_from, date_to, route)
+        if q.strip() or transport.strip():
+            # в запросе нет ни одного слова (одни знаки препинания)
+            return []
+
+        where = "status = 'active'"
+        params: list = []
+        if before is not None:
+            where += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        # с городом в фильтре "+" не даёт планировщику взять idx_loads_status_load_date с сортировкой
+        # всего диапазона дат: idx_loads_origin/idx_loads_dest проверяют дату сами, уже в порядке ленты
+        load_date = "+load_date" if origin or dest else "load_date"
+        if date_from:
+            where += f" AND {load_date} >= ?"
+            params.append(date_from)
+        if date_to:
+            where += f" AND {load_date} <= ?"
+            params.append(date_to)
+        route_where, route_params = route_filter("", **route)
+        where += route_where
+        params.extend(route_params)
         with self._conn() as conn:
             rows = conn.execute(
-                """
-                SELECT id, direction, cargo, transport, load_date, extra, status, created_at
+                f"""
+                SELECT {LOAD_COLUMNS}
                 FROM loads
-                WHERE status = 'active'
-                ORDER BY created_at DESC
+                WHERE {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+                """,
+                (*params, limit),
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+    def _search_page(self, match: str, limit: int, before, date_from: str, date_to: str, route: dict | None = None):
+        # FTS5 отдаёт совпадения по убыванию rowid без сортировки, остальные
+        # фильтры — поиск по первичному ключу; id растёт вместе с created_at,
+        # поэтому порядок и курсор те же, что у обычной ленты
+        where = "loads_fts MATCH ? AND l.status = 'active'"
+        params: list = [match]
+        if before is not None:
+            where += " AND f.rowid < ?"
+            params.append(before[1])
+        if date_from:
+            where += " AND l.load_date >= ?"
+            params.append(date_from)
+        if date_to:
+            where += " AND l.load_date <= ?"
+            params.append(date_to)
+        route_where, route_params = route_filter("l.", **(route or {}))
+        where += route_where
+        params.extend(route_params)
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT l.id, l.direction, l.cargo, l.transport, l.load_date, l.extra,
+                       l.status, l.created_at, l.updated_at, l.origin_city, l.dest_city, l.weight_tons
+                FROM loads_fts AS f
+                JOIN loads AS l ON l.id = f.rowid
+                WHERE {where}
+                ORDER BY f.rowid DESC
+                LIMIT ?
+                """,
+                (*params, limit),
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+    @db_op("list_changes")
+    def list_changes(self, since: tuple[str, int] | None = None, limit: int = 100):
+        # все вставки и смены статуса после курсора (updated_at, id), по возрастанию;
+        # переезд в архив updated_at не меняет, поэтому архив читается вместе с loads
+        # (обе половины идут по индексу (updated_at, id) и сливаются без сортировки)
+        where = "1"
+        params: list = []
+        if since is not None:
+            where = "(updated_at, id) > (?, ?)"
+            params.extend(since)
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {LOAD_COLUMNS} FROM loads WHERE {where}
+                UNION ALL
+                SELECT {LOAD_COLUMNS} FROM loads_archive WHERE {where}
+                ORDER BY updated_at, id
                 LIMIT ?
                 """,
-                (limit,),
+                (*params, *params, limit),
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+    @db_op("list_after_id")
+    def list_after_id(self, after_id: int, limit: int = 100):
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {LOAD_COLUMNS}
+                FROM loads
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (after_id, limit),
             ).fetchall()
             return [dict(row) for row in rows]
 
     def latest_updated_at(self) -> str | None:
+        latest = self.latest_version()
+        return latest["updated_at"] if latest else None
+
+    @db_op("latest_version", rows=found)
+    def latest_version(self) -> dict | None:
+        # последнее изменение (вставка или смена статуса), в том числе уже уехавшее в архив
         with self._conn() as conn:
             row = conn.execute(
-                "SELECT created_at FROM loads WHERE status = 'active' ORDER BY created_at DESC LIMIT 1"
+                """
+                SELECT id, updated_at FROM loads
+                UNION ALL
+                SELECT id, updated_at FROM loads_archive
+                ORDER BY updated_at DESC, id DESC
+                LIMIT 1
+                """
             ).fetchone()
-            return row["created_at"] if row else None
+            return dict(row) if row else None
+
+    def sql_report(self, top: int = 20, order: str = "total_ms") -> list[dict]:
+        # EXPLAIN QUERY PLAN — через обычное соединение, чтобы не попадать в собственную статистику
+        conn = self._connect(profiled=False)
+        try:
+            return self.profiler.report(top, order, explain_conn=conn)
+        finally:
+            conn.close()
+
+    def count_rows(self) -> dict[tuple[str, str], int]:
+        # для /metrics: в loads после архивации только активные и свежезакрытые — группировка дешёвая
+        with self._conn() as conn:
+            counts = {
+                ("loads", row["status"]): row["n"]
+                for row in conn.execute("SELECT status, COUNT(*) AS n FROM loads GROUP BY status")
+            }
+            counts[("loads_archive", "all")] = conn.execute("SELECT COUNT(*) FROM loads_archive").fetchone()[0]
+            return counts
+
+    @db_op("get_load", rows=found)
+    def get_load(self, load_id: int) -> dict | None:
+        with self._conn() as conn:
+            row = conn.execute(f"SELECT {LOAD_COLUMNS} FROM loads WHERE id = ?", (load_id,)).fetchone()
+            if row is None:
+                row = conn.execute(
+                    f"SELECT {LOAD_COLUMNS} FROM loads_archive WHERE id = ?", (load_id,)
+                ).fetchone()
+            return dict(row) if row else None
+
+    @db_op("list_archive")
+    def list_archive(
+        self,
+        limit: int = 30,
+        before: tuple[str, int] | None = None,
+        *,
+        date_from: str = "",
+        date_to: str = "",
+    ):
+        # та же keyset-пагинация по (created_at, id), что и у активных
+        where = "1"
+        params: list = []
+        if before is not None:
+            where += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        if date_from:
+            where += " AND load_date >= ?"
+            params.append(date_from)
+        if date_to:
+            where += " AND load_date <= ?"
+            params.append(date_to)
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {LOAD_COLUMNS}
+                FROM loads_archive
+                WHERE {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+                """,
+                (*params, limit),
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+    @db_op("close_load", rows=found)
+    def close_load(self, load_id: int) -> tuple[str, bool] | None:
+        # -> (статус, изменилась ли заявка): ("closed", True) — закрыли сейчас,
+        # (прежний статус, False) — уже не активна; None — такой заявки нет
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE loads SET status = 'closed', updated_at = ? WHERE id = ? AND status = 'active'",
+                (now_iso(), load_id),
+            )
+            conn.commit()
+        if cur.rowcount:
+            self._changed()
+            return "closed", True
+        load = self.get_load(load_id)
+        return (load["status"], False) if load else None
+
+    @db_op("expire_loads", rows=int)
+    def expire_loads(self, before_date: str, batch: int = 500) -> int:
+        # active -> archived для заявок с load_date < before_date; пачками, чтобы
+        # не держать блокировку записи дольше одной короткой транзакции.
+        # Дату не в YYYY-MM-DD ("16.04", "завтра") строкой не сравнить — такие
+        # заявки уходят по дате создания: created_at < before_date
+        return self._expire(
+            "load_date < ? AND load_date GLOB ?", (before_date, ISO_DATE_GLOB), batch
+        ) + self._expire(
+            "created_at < ? AND load_date NOT GLOB ?", (before_date, ISO_DATE_GLOB), batch
+        )
+
+    def _expire(self, where: str, params: tuple, batch: int) -> int:
+        total = 0
+        while True:
+            with self._conn() as conn:
+                cur = conn.execute(
+                    f"""
+                    UPDATE loads SET status = 'archived', updated_at = ?
+                    WHERE id IN (
+                        SELECT id FROM loads
+                        WHERE status = 'active' AND {where}
+                        LIMIT ?
+                    )
+                    """,
+                    (now_iso(), *params, batch),
+                )
+                conn.commit()
+            total += cur.rowcount
+            if cur.rowcount:
+                self._changed()
+            if cur.rowcount < batch:
+                return total
+
+    @db_op("move_to_archive", rows=int)
+    def move_to_archive(self, batch: int = 500) -> int:
+        # всё неактивное переносится из loads в loads_archive как есть (updated_at
+        # не трогаем — для ленты изменений переезд незаметен)
+        total = 0
+        while True:
+            conn = self._conn()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                moved = conn.execute(
+                    "SELECT id, direction, cargo, transport, extra FROM loads WHERE status IN ('archived', 'closed') LIMIT ?",
+                    (batch,),
+                ).fetchall()
+                ids = [row[0] for row in moved]
+                if ids:
+                    marks = ",".join("?" * len(ids))
+                    conn.execute(
+                        f"""
+                        INSERT OR REPLACE INTO loads_archive({LOAD_COLUMNS}, archived_at)
+                        SELECT {LOAD_COLUMNS}, ? FROM loads WHERE id IN ({marks})
+                        """,
+                        (now_iso(), *ids),
+                    )
+                    conn.execute(f"DELETE FROM loads WHERE id IN ({marks})", ids)
+                    self._fts_delete(conn, moved)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            total += len(ids)
+            if len(ids) < batch:
+                break
+        if total:
+            # удаления в contentless FTS5 копятся отметками и тормозят поиск;
+            # после переезда индекс содержит только активные заявки и сжимается быстро
+            with self._conn() as conn:
+                conn.execute("INSERT INTO loads_fts(loads_fts) VALUES('optimize')")
+                conn.commit()
+        return total
+
+
+def route_filter(
+    prefix: str = "", origin: str = "", dest: str = "", min_tons: float | None = None, max_tons: float | None = None
+) -> tuple[str, list]:
+    # условия для idx_loads_origin / idx_loads_dest; строки без тоннажа (NULL) под min/max не попадают
+    where = ""
+    params: list = []
+    for column, value in (("origin_city", origin), ("dest_city", dest)):
+        if value:
+            where += f" AND {prefix}{column} = ?"
+            params.append(value)
+    if min_tons is not None:
+        where += f" AND {prefix}weight_tons >= ?"
+        params.append(min_tons)
+    if max_tons is not None:
+        where += f" AND {prefix}weight_tons <= ?"
+        params.append(max_tons)
+    return where, params
+
+
+def fts_term(tok: str) -> str:
+    # префиксный поиск дешёвый только по длинам из prefix-индекса loads_fts (3..6):
+    # короткие слова ищем целиком, длинные — по первым FTS_PREFIX_MAX буквам
+    # ("samarkand" -> "samark"*), иначе FTS5 собирает весь doclist префикса
+    if len(tok) < FTS_PREFIX_MIN:
+        return f'"{tok}"'
+    return f'"{tok[:FTS_PREFIX_MAX]}"*'
+
+
+def fts_query(q: str, transport: str = "") -> str:
+    # "Ташкент тент" -> "tashke"* AND "tent"* (все слова); после fold
+    # в токенах только [0-9a-z], так что кавычки в них не встречаются
+    parts = [fts_term(tok) for tok in tokens(q)]
+    transport_tokens = tokens(transport)
+    if transport_tokens:
+        parts.append("transport : (" + " AND ".join(fts_term(tok) for tok in transport_tokens) + ")")
+    return " AND ".join(parts)
+
+
+def iter_ndjson(stream, chunk_size: int = 64 * 1024):
+    # кусками по chunk_size: тело целиком в память не читается
+    def parse(line: bytes):
+        try:
+            return wire.loads(line)
+        except ValueError as e:
+            return ValueError(f"Invalid JSON: {e}")
+
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse(line)
+    if tail.strip():
+        yield parse(tail)
+
+
+def iter_json_array(stream, chunk_size: int = 64 * 1024):
+    # инкрементальный разбор [obj, obj, ...] поверх потока: в буфере максимум
+    # один недочитанный элемент и один кусок потока
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    eof = False
+    state = "start"
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            buf = buf[pos:] + text_decoder.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        return True
+
+    def skip_ws() -> bool:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n\ufeff":
+                pos += 1
+            if pos < len(buf):
+                return True
+            if not fill():
+                return False
+
+    while True:
+        if not skip_ws():
+            if state == "done":
+                return
+            raise ValueError("Unexpected end of JSON array")
+        ch = buf[pos]
+        if state == "start":
+            if ch != "[":
+                raise ValueError("Expected a JSON array")
+            pos += 1
+            state = "first"
+        elif state in ("first", "value"):
+            if ch == "]" and state == "first":
+                pos += 1
+                state = "done"
+                continue
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # элемент не дочитан — подкачиваем ещё
+                    if fill():
+                        continue
+                    raise ValueError("Invalid JSON array element")
+                truncated = end == len(buf) or (
+                    isinstance(obj, (int, float)) and buf[end] not in ",] \t\r\n"
+                )
+                if truncated and not eof:
+                    # число могло оборваться на границе куска ("3." из "3.5e10")
+                    if fill():
+                        continue
+                break
+            pos = end
+            state = "sep"
+            yield obj
+        elif state == "sep":
+            pos += 1
+            if ch == ",":
+                state = "value"
+            elif ch == "]":
+                state = "done"
+            else:
+                raise ValueError("Expected ',' or ']'")
+        else:
+            raise ValueError("Unexpected data after JSON array")
+
+
+def loads_etag(
+    kind: str, limit: int, latest: dict | None, cursor: str = "", filters: dict | None = None, fmt: str = wire.JSON
+) -> str:
+    variant = json.dumps(filters or {}, sort_keys=True, ensure_ascii=False)
+    if fmt != wire.JSON:
+        # другой формат — другие байты, и ETag другой; сжатому телу encoded_response
+        # добавляет к ETag суффикс GZIP_ETAG_SUFFIX
+        variant += f":{fmt}"
+    if latest:
+        raw = f"{kind}:{limit}:{cursor}:{variant}:{latest['id']}:{latest['updated_at']}"
+    else:
+        raw = f"{kind}:{limit}:{cursor}:{variant}:empty"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def api_item(item: dict) -> dict:
+    return {
+        "id": item["id"],
+        "direction": item["direction"],
+        "cargo": item["cargo"],
+        "transport": item["transport"],
+        "date": item["load_date"],
+        "extra": item["extra"],
+        "created_at": item["created_at"],
+        "origin_city": item["origin_city"],
+        "dest_city": item["dest_city"],
+        "weight_tons": item["weight_tons"],
+    }
+
+
+def change_item(item: dict) -> dict:
+    return {**api_item(item), "status": item["status"], "updated_at": item["updated_at"]}
+
+
+def page_cursor(loads: list[dict], limit: int) -> str | None:
+    if len(loads) < limit:
+        return None
+    last = loads[-1]
+    return encode_cursor(last["created_at"], last["id"])
+
+
+class IdempotencyKeys:
+    # Idempotency-Key -> (отпечаток тела, статус, ответ). Записи живут ttl секунд
+    # с первого запроса, больше maxsize ключей не храним — вытесняются самые старые.
+    # Пока первый запрос выполняется, статус None: параллельный повтор получает 409
+    def __init__(self, maxsize: int = 10000, ttl: float = 86400, *, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: dict[str, tuple[float, str, int | None, dict | None]] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, digest: str) -> tuple[str, int | None, dict | None] | None:
+        # None — ключ новый и теперь занят этим запросом; иначе то, что под ним уже лежит
+        now = self._clock()
+        with self._lock:
+            # dict хранит порядок вставки: в начале самые старые
+            while self._data:
+                oldest = next(iter(self._data))
+                if len(self._data) < self.maxsize and self._data[oldest][0] > now:
+                    break
+                del self._data[oldest]
+            entry = self._data.get(key)
+            if entry is not None:
+                return entry[1:]
+            self._data[key] = (now + self.ttl, digest, None, None)
+            return None
+
+    def finish(self, key: str, digest: str, status: int, body: dict):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data[key] = (entry[0], digest, status, body)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EncodedBodies:
+    # ETag -> готовое тело ответа (bytes, сжато ли). ETag уже включает версию данных,
+    # параметры запроса и формат, так что запись не устаревает, а просто вытесняется:
+    # повторный запрос той же страницы не трогает ни SQLite, ни сериализатор
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple[str, bool], tuple[bytes, bool]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str, gzip: bool) -> tuple[bytes, bool] | None:
+        with self._lock:
+            entry = self._data.get((etag, gzip))
+            if entry is not None:
+                self._data.move_to_end((etag, gzip))
+            return entry
+
+    def put(self, etag: str, gzip: bool, entry: tuple[bytes, bool]):
+        with self._lock:
+            self._data[(etag, gzip)] = entry
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class OrjsonProvider(JSONProvider):
+    # jsonify и request.get_json через orjson; Flask 3 уже не смотрит на JSON_AS_ASCII
+    # и экранировал бы кириллицу в \uXXXX, а так в ответе UTF-8 как есть
+    def dumps(self, obj, **kwargs) -> str:
+        return wire.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return wire.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(wire.dumps(obj), mimetype=wire.JSON)
+
+
+class LoadArchiver:
+    # Фоновая уборка раз в interval секунд: просроченные заявки помечаются
+    # archived (это изменение уходит в ленту и сбрасывает ETag), затем всё
+    # неактивное переносится в loads_archive. В loads и в индексе по статусу
+    # остаются только актуальные заявки, сколько бы ни накопилось истории.
+    def __init__(self, store: LoadStore, *, grace_days: int = 2, interval: float = 3600, batch: int = 500):
+        self.store = store
+        self.grace_days = grace_days
+        self.interval = interval
+        self.batch = batch
+        self.last_run: dict = {}
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="load-archiver", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("load archiver failed")
+            if self._stop.wait(self.interval):
+                return
+
+    def run_once(self, today: date | None = None) -> dict:
+        today = today or datetime.now(tz=UTC).date()
+        before_date = (today - timedelta(days=self.grace_days)).isoformat()
+        expired = self.store.expire_loads(before_date, self.batch)
+        moved = self.store.move_to_archive(self.batch)
+        self.last_run = {"at": now_iso(), "before_date": before_date, "expired": expired, "moved": moved}
+        if expired or moved:
+            log.info("archived loads: %s", self.last_run)
+        return self.last_run
+
+
+class LoadEvents:
+    # Поток изменений для SSE и long-poll. Слушатели живут в отдельном потоке
+    # с event loop (aiohttp): сотня открытых соединений — сотня корутин, а не
+    # потоков. Запись в LoadStore будит их через notify(), без опроса SQLite;
+    # новые строки читаются из базы один раз на всех и последние buffer_size
+    # изменений отдаются из памяти. Записи других процессов ловит опрос
+    # latest_version() раз в poll_interval секунд.
+    START = ("", 0)
+
+    def __init__(self, store: LoadStore, *, buffer_size: int = 1000, poll_interval: float = 1.0):
+        self.store = store
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.listeners = 0
+
+        self._keys: list[tuple[str, int]] = []
+        self._items: list[dict] = []
+        self._floor = self.START  # всё, что новее, есть в буфере
+        self._head = self.START  # курсор последнего известного изменения
+        self._changed: asyncio.Future | None = None
+        self._frames: dict[tuple, bytes] = {}
+        self._refreshing = False
+        self._dirty = False
+
+    def start(self, host: str, port: int, api_key: str = "") -> web.AppRunner:
+        ready = threading.Event()
+        result: dict = {}
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                result["runner"] = loop.run_until_complete(self._serve(host, port, api_key))
+            except Exception as e:
+                result["error"] = e
+                ready.set()
+                return
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="load-stream", daemon=True).start()
+        ready.wait()
+        if "error" in result:
+            raise result["error"]
+        return result["runner"]
+
+    async def _serve(self, host: str, port: int, api_key: str) -> web.AppRunner:
+        self.loop = asyncio.get_running_loop()
+        latest = await self.loop.run_in_executor(None, self.store.latest_version)
+        if latest:
+            self._head = self._floor = (latest["updated_at"], latest["id"])
+        self._changed = self.loop.create_future()
+        if self.poll_interval > 0:
+            self.loop.create_task(self._poll())
+
+        runner = web.AppRunner(create_stream_app(self, api_key))
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        log.info("load stream on %s:%s", host, port)
+        return runner
+
+    @property
+    def head(self) -> tuple[str, int]:
+        return self._head
+
+    def notify(self):
+        # из любого потока (Flask): до старта event loop — ничего не делаем
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._schedule_refresh)
+
+    async def _poll(self):
+        seen = self._head
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                latest = await self.loop.run_in_executor(None, self.store.latest_version)
+            except sqlite3.Error as e:
+                log.warning("load stream poll failed: %s", e)
+                continue
+            version = (latest["updated_at"], latest["id"]) if latest else self.START
+            if version != seen:
+                seen = version
+                self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        # пачка записей подряд — одно чтение из базы, а не по одному на каждую
+        if self._refreshing:
+            self._dirty = True
+            return
+        self._refreshing = True
+        self.loop.create_task(self._refresh())
+
+    async def _refresh(self):
+        try:
+            while True:
+                self._dirty = False
+                rows = await self.loop.run_in_executor(None, self.store.list_changes, self._head, 500)
+                if rows:
+                    self._append(rows)
+                if len(rows) < 500 and not self._dirty:
+                    return
+        except Exception:
+            log.exception("load stream refresh failed")
+        finally:
+            self._refreshing = False
+
+    def _append(self, rows: list[dict]):
+        for row in rows:
+            self._keys.append((row["updated_at"], row["id"]))
+            self._items.append(change_item(row))
+        self._head = self._keys[-1]
+        if len(self._keys) > 2 * self.buffer_size:
+            drop = len(self._keys) - self.buffer_size
+            self._floor = self._keys[drop - 1]
+            del self._keys[:drop]
+            del self._items[:drop]
+        self._frames.clear()
+        # один future на всех ждущих: разбудить сотню слушателей — один set_result
+        changed, self._changed = self._changed, self.loop.create_future()
+        changed.set_result(None)
+
+    async def read(self, since: tuple[str, int], limit: int = 100):
+        if since >= self._floor:
+            start = bisect.bisect_right(self._keys, since)
+            items = self._items[start:start + limit]
+            cursor = self._keys[start + len(items) - 1] if items else since
+            return items, cursor, start + limit < len(self._keys)
+        # клиент отстал дальше буфера — догоняет из базы
+        rows = await self.loop.run_in_executor(None, self.store.list_changes, since, limit)
+        cursor = (rows[-1]["updated_at"], rows[-1]["id"]) if rows else since
+        return [change_item(row) for row in rows], cursor, len(rows) == limit
+
+    async def wait(self, since: tuple[str, int] | None, limit: int = 100, timeout: float = 25.0):
+        # -> (items, cursor, has_more); since=None — только то, что появится после подключения
+        if since is None:
+            since = self._head
+        deadline = self.loop.time() + timeout
+        while True:
+            changed = self._changed
+            items, cursor, has_more = await self.read(since, limit)
+            if items:
+                return items, cursor, has_more
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                return [], since, False
+            try:
+                await asyncio.wait_for(asyncio.shield(changed), remaining)
+            except asyncio.TimeoutError:
+                return [], since, False
+
+    async def next_frame(self, since: tuple[str, int], timeout: float):
+        # -> (SSE-кадр или None, курсор); слушатели с одинаковым since получают
+        # один и тот же кадр — JSON кодируется один раз на изменение, а не на слушателя
+        items, cursor, has_more = await self.wait(since, timeout=timeout)
+        if not items:
+            return None, since
+        key = (since, cursor)
+        frame = self._frames.get(key)
+        if frame is None:
+            event_id = encode_cursor(*cursor)
+            payload = json.dumps({"loads": items, "cursor": event_id, "has_more": has_more}, ensure_ascii=False)
+            frame = self._frames[key] = f"id: {event_id}\nevent: loads\ndata: {payload}\n\n".encode("utf-8")
+        return frame, cursor
+
+    def stats(self) -> dict:
+        return {"listeners": self.listeners, "buffered": len(self._keys)}
+
+
+def create_stream_app(events: LoadEvents, api_key: str = "") -> web.Application:
+    def is_authorized(req: web.Request) -> bool:
+        if not api_key:
+            return True
+        return req.headers.get("Authorization", "") == f"Bearer {api_key}"
+
+    def json_response(data: dict, status: int = 200) -> web.Response:
+        return web.json_response(data, status=status, dumps=lambda o: json.dumps(o, ensure_ascii=False))
+
+    def parse_since(req: web.Request) -> tuple[str, int] | None:
+        # без since — только то, что появится после подключения; пустой since= — с самого начала
+        raw = req.query.get("since")
+        if raw is None:
+            raw = req.headers.get("Last-Event-ID")
+        if raw is None:
+            return None
+        return decode_cursor(raw) if raw else LoadEvents.START
+
+    async def stream(request: web.Request):
+        # SSE: event "loads" с дельтой на каждое изменение, ": ping" раз в STREAM_HEARTBEAT
+        if not is_authorized(request):
+            return json_response({"ok": False, "error": "Unauthorized"}, 401)
+        try:
+            since = parse_since(request)
+        except ValueError:
+            return json_response({"ok": False, "error": "Invalid since"}, 400)
+        if since is None:
+            # до заголовков ответа: всё, что клиент увидит подключённым, уже попадёт в поток
+            since = events.head
+
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream; charset=utf-8",
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            }
+        )
+        await response.prepare(request)
+        events.listeners += 1
+        try:
+            await response.write(b"retry: 3000\n\n")
+            while True:
+                frame, since = await events.next_frame(since, STREAM_HEARTBEAT)
+                await response.write(frame or b": ping\n\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            events.listeners -= 1
+        return response
+
+    async def changes(request: web.Request):
+        # long-poll: как GET /api/loads?since=, но ждёт до ?wait= секунд, если изменений нет
+        if not is_authorized(request):
+            return json_response({"ok": False, "error": "Unauthorized"}, 401)
+        try:
+            since = parse_since(request)
+            wait = max(0.0, min(float(request.query.get("wait", "25")), 60.0))
+            limit = max(1, min(int(request.query.get("limit", "100")), 100))
+        except ValueError:
+            return json_response({"ok": False, "error": "Invalid since/wait/limit"}, 400)
+
+        items, cursor, has_more = await events.wait(since, limit, timeout=wait)
+        return json_response(
+            {
+                "ok": True,
+                "loads": items,
+                "cursor": encode_cursor(*cursor),
+                "last_id": items[-1]["id"] if items else None,
+                "has_more": has_more,
+            }
+        )
+
+    async def health(request: web.Request):
+        return json_response({"ok": True, **events.stats()})
+
+    app = web.Application()
+    app.router.add_get("/api/loads/stream", stream)
+    app.router.add_get("/api/loads/changes", changes)
+    app.router.add_get("/health", health)
+    return app
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
-    app.config["JSON_AS_ASCII"] = False
+    app.json = OrjsonProvider(app)
     app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET_KEY", "dev-secret")
 
     db_path = os.getenv("LOADS_DB_PATH", "loads.db")
     api_key = os.getenv("SERVER_API_KEY", "")
-    store = LoadStore(db_path)
+    profiler = SQLProfiler(slow_ms=SQL_SLOW_MS, name="loads.db") if SQL_PROFILE else None
+    store = LoadStore(db_path, profiler=profiler)
+    idempotency = IdempotencyKeys(IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL)
+    bodies = EncodedBodies(RESPONSE_CACHE_SIZE)
+    events = LoadEvents(store, buffer_size=STREAM_BUFFER, poll_interval=STREAM_POLL_INTERVAL)
+    store.listeners.append(events.notify)
+    app.extensions["load_events"] = events
+    app.extensions["load_archiver"] = LoadArchiver(
+        store, grace_days=ARCHIVE_GRACE_DAYS, interval=ARCHIVE_INTERVAL, batch=ARCHIVE_BATCH
+    )
+    LOADS_ROWS.fn = store.count_rows
+    STREAM_LISTENERS.fn = lambda: events.listeners
+    STREAM_BUFFERED.fn = lambda: len(events._keys)
+
+    @app.before_request
+    def start_timer():
+        request.environ["metrics.started"] = time.perf_counter()
+
+    @app.after_request
+    def record_request(response: Response):
+        started = request.environ.get("metrics.started")
+        if started is not None:
+            # шаблон маршрута (/api/loads/<int:load_id>), а не путь — число меток ограничено
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - started, request.method, route)
+            HTTP_REQUESTS.inc(request.method, route, response.status_code)
+        return response
 
     def is_authorized(req) -> bool:
         if not api_key:
@@ -100,6 +1373,21 @@ def create_app() -> Flask:
         auth_header = req.headers.get("Authorization", "")
         return auth_header == f"Bearer {api_key}"
 
+    def csrf_token() -> str:
+        # один токен на сессию браузера; форма кладёт его в скрытое поле csrf_token
+        if "csrf_token" not in session:
+            session["csrf_token"] = secrets.token_urlsafe(32)
+        return session["csrf_token"]
+
+    def form_allowed(req) -> bool:
+        # POST из формы: токен из сессии и Origin/Referer этого же сервера.
+        # Без обоих заголовков не пускаем — браузер шлёт хотя бы один
+        origin = req.headers.get("Origin") or req.headers.get("Referer")
+        if not origin or not (origin.rstrip("/") == req.host_url.rstrip("/") or origin.startswith(req.host_url)):
+            return False
+        expected = session.get("csrf_token")
+        return bool(expected) and hmac.compare_digest(expected, req.form.get("csrf_token", ""))
+
     def normalize_payload(data: dict) -> dict:
         return {
             "direction": (data.get("direction") or "").strip(),
@@ -121,6 +1409,91 @@ def create_app() -> Flask:
             errors["load_date"] = "Укажите дату загрузки."
         return errors
 
+    def list_filters() -> dict:
+        # ?q=, ?transport=, ?date_from=/?date_to= (YYYY-MM-DD), ?origin=/?dest= (город),
+        # ?min_tons=/?max_tons=; ValueError -> 400
+        filters = {
+            "q": request.args.get("q", "").strip()[:200],
+            "transport": request.args.get("transport", "").strip()[:100],
+            "date_from": request.args.get("date_from", "").strip(),
+            "date_to": request.args.get("date_to", "").strip(),
+            "origin": normalize_city(request.args.get("origin", "")[:100]),
+            "dest": normalize_city(request.args.get("dest", "")[:100]),
+        }
+        for key in ("date_from", "date_to"):
+            if filters[key]:
+                filters[key] = date.fromisoformat(filters[key]).isoformat()
+        for key in ("min_tons", "max_tons"):
+            value = request.args.get(key, "").strip().replace(",", ".")
+            if value:
+                filters[key] = float(value)
+                if not 0 <= filters[key] < 1000:
+                    raise ValueError(f"{key} out of range")
+        return {k: v for k, v in filters.items() if v or v == 0}
+
+    def not_modified(etag: str) -> Response | None:
+        # клиент мог получить любой вариант ответа — сжатый или нет, оба ещё актуальны
+        for variant in (etag, etag + GZIP_ETAG_SUFFIX):
+            if variant in request.if_none_match:
+                return with_etag(Response(status=304), variant)
+        return None
+
+    def with_etag(response: Response, etag: str) -> Response:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    def negotiate() -> tuple[str, bool]:
+        # Accept: application/msgpack -> MessagePack, иначе JSON; Accept-Encoding: gzip -> сжимаем
+        fmt = request.accept_mimetypes.best_match(wire.FORMATS, default=wire.JSON)
+        return fmt, request.accept_encodings["gzip"] > 0
+
+    def encoded_response(etag: str, fmt: str, gzip: bool, build) -> Response:
+        # build() -> тело ответа; зовётся только если этого варианта ещё нет в кэше
+        entry = bodies.get(etag, gzip)
+        if entry is None:
+            RESPONSE_CACHE.inc("miss")
+            body = wire.dumps(build(), fmt)
+            compressed = gzip and len(body) >= GZIP_MIN_SIZE
+            entry = (wire.compress(body, GZIP_LEVEL) if compressed else body, compressed)
+            bodies.put(etag, gzip, entry)
+        else:
+            RESPONSE_CACHE.inc("hit")
+        response = Response(entry[0], mimetype=fmt)
+        if entry[1]:
+            # у сжатого и несжатого тела разные байты — значит, и сильные ETag разные
+            response.headers["Content-Encoding"] = "gzip"
+            etag += GZIP_ETAG_SUFFIX
+        response.vary.update(("Accept", "Accept-Encoding"))
+        return with_etag(response, etag)
+
+    def list_changes_response(limit: int):
+        # дельта-режим: ?since=<cursor> (вставки и смены статуса) или ?after_id=<id> (только новые)
+        since_arg = request.args.get("since")
+        after_id_arg = request.args.get("after_id")
+        try:
+            if after_id_arg is not None:
+                loads = store.list_after_id(int(after_id_arg), limit=limit)
+            else:
+                since = decode_cursor(since_arg) if since_arg else None
+                loads = store.list_changes(since=since, limit=limit)
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid since/after_id"}), 400
+
+        if loads:
+            cursor = encode_cursor(loads[-1]["updated_at"], loads[-1]["id"])
+        else:
+            cursor = since_arg
+        return jsonify(
+            {
+                "ok": True,
+                "loads": [change_item(item) for item in loads],
+                "cursor": cursor,
+                "last_id": loads[-1]["id"] if loads else (int(after_id_arg) if after_id_arg else None),
+                "has_more": len(loads) == limit,
+            }
+        )
+
     @app.get("/")
     def index():
         loads = store.list_recent(limit=20)
@@ -140,7 +1513,7 @@ def create_app() -> Flask:
                 success_message=None,
             ), 400
 
-        load_id = store.create_load(**form_data)
+        load_id, _ = store.create_load(**form_data)
         return redirect(url_for("index", created=load_id))
 
     @app.get("/api/loads")
@@ -154,25 +1527,36 @@ def create_app() -> Flask:
         except ValueError:
             return jsonify({"ok": False, "error": "Invalid limit"}), 400
 
-        loads = store.list_recent(limit=limit)
-        return jsonify(
-            {
+        if "since" in request.args or "after_id" in request.args:
+            return list_changes_response(limit)
+
+        cursor = request.args.get("cursor", "")
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid cursor"}), 400
+        try:
+            filters = list_filters()
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid filters"}), 400
+
+        fmt, gzip = negotiate()
+        latest = store.latest_version()
+        etag = loads_etag("api", limit, latest, cursor, filters, fmt)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        def build() -> dict:
+            loads = store.list_page(limit=limit, before=before, **filters)
+            return {
                 "ok": True,
-                "updated_at": store.latest_updated_at(),
-                "loads": [
-                    {
-                        "id": item["id"],
-                        "direction": item["direction"],
-                        "cargo": item["cargo"],
-                        "transport": item["transport"],
-                        "date": item["load_date"],
-                        "extra": item["extra"],
-                        "created_at": item["created_at"],
-                    }
-                    for item in loads
-                ],
+                "updated_at": latest["updated_at"] if latest else None,
+                "loads": [api_item(item) for item in loads],
+                "next_cursor": page_cursor(loads, limit),
             }
-        )
+
+        return encoded_response(etag, fmt, gzip, build)
 
     @app.post("/api/loads")
     def create_load_api():
@@ -185,8 +1569,170 @@ def create_app() -> Flask:
         if errors:
             return jsonify({"ok": False, "errors": errors}), 400
 
-        load_id = store.create_load(**data)
-        return jsonify({"ok": True, "id": load_id}), 201
+        # Idempotency-Key: повтор запроса (ретрай после таймаута) получает тот же ответ
+        key = request.headers.get("Idempotency-Key", "").strip()
+        if key:
+            if len(key) > 255:
+                return jsonify({"ok": False, "error": "Idempotency-Key is too long"}), 400
+            digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+            entry = idempotency.begin(key, digest)
+            if entry is not None:
+                seen_digest, status, body = entry
+                if seen_digest != digest:
+                    return jsonify({"ok": False, "error": "Idempotency-Key reused with a different payload"}), 422
+                if status is None:
+                    return jsonify({"ok": False, "error": "Request with this Idempotency-Key is in progress"}), 409
+                DUPLICATES.inc("idempotency_key")
+                response = jsonify(body)
+                response.headers["Idempotent-Replayed"] = "true"
+                return response, status
+
+        try:
+            load_id, created = store.create_load(**data)
+        except Exception:
+            if key:
+                idempotency.discard(key)
+            raise
+        # такая активная заявка уже есть — новая не создаётся, отдаём id существующей
+        body = {"ok": True, "id": load_id, "duplicate": not created}
+        status = 201 if created else 200
+        if key:
+            idempotency.finish(key, digest, status, body)
+        return jsonify(body), status
+
+    @app.get("/api/loads/<int:load_id>")
+    def get_load_api(load_id: int):
+        # активная или уже архивная заявка
+        if not is_authorized(request):
+            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+        load = store.get_load(load_id)
+        if load is None:
+            return jsonify({"ok": False, "error": "Not found"}), 404
+        return jsonify({"ok": True, "load": change_item(load)})
+
+    @app.post("/api/loads/<int:load_id>/close")
+    def close_load_api(load_id: int):
+        if not is_authorized(request):
+            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+        result = store.close_load(load_id)
+        if result is None:
+            return jsonify({"ok": False, "error": "Not found"}), 404
+        status, changed = result
+        if not changed:
+            return jsonify({"ok": False, "error": f"Load is already {status}", "status": status}), 409
+        return jsonify({"ok": True, "id": load_id, "status": status})
+
+    @app.post("/loads/<int:load_id>/close")
+    def close_load_from_form(load_id: int):
+        # Bearer-ключ браузерная форма прислать не может — вместо него CSRF-токен сессии
+        if not form_allowed(request):
+            flash("Не удалось закрыть заявку: обновите страницу и попробуйте снова.", "error")
+            return redirect(url_for("index"))
+        result = store.close_load(load_id)
+        if result is None:
+            flash(f"Заявки #{load_id} нет.", "error")
+        elif not result[1]:
+            flash(f"Заявка #{load_id} уже не активна.", "error")
+        else:
+            flash(f"Заявка #{load_id} закрыта.", "success")
+        return redirect(url_for("index"))
+
+    @app.get("/api/loads/archive")
+    def list_archive():
+        if not is_authorized(request):
+            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+        try:
+            limit = max(1, min(int(request.args.get("limit", "30")), 100))
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid limit"}), 400
+        cursor = request.args.get("cursor", "")
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid cursor"}), 400
+        try:
+            filters = list_filters()
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid filters"}), 400
+
+        loads = store.list_archive(
+            limit=limit, before=before, date_from=filters.get("date_from", ""), date_to=filters.get("date_to", "")
+        )
+        return jsonify(
+            {
+                "ok": True,
+                "loads": [change_item(item) for item in loads],
+                "next_cursor": page_cursor(loads, limit),
+            }
+        )
+
+    @app.post("/api/loads/bulk")
+    def create_loads_bulk():
+        # JSON-массив или NDJSON (Content-Type: application/x-ndjson), разбор по мере чтения
+        if not is_authorized(request):
+            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+        if request.mimetype in ("application/x-ndjson", "application/jsonl", "application/json-seq"):
+            records = iter_ndjson(request.stream)
+        else:
+            records = iter_json_array(request.stream)
+
+        results: list[dict] = []
+        chunk: list[dict] = []
+        chunk_index: list[int] = []
+
+        def flush():
+            for index, (load_id, created) in zip(chunk_index, store.create_many(chunk)):
+                results.append({"index": index, "id": load_id} if created else {"index": index, "id": load_id, "duplicate": True})
+            chunk.clear()
+            chunk_index.clear()
+
+        try:
+            for index, record in enumerate(records):
+                if isinstance(record, ValueError):
+                    results.append({"index": index, "errors": {"json": str(record)}})
+                    continue
+                if not isinstance(record, dict):
+                    results.append({"index": index, "errors": {"json": "Ожидался JSON-объект."}})
+                    continue
+                data = normalize_payload(record)
+                errors = validate_payload(data)
+                if errors:
+                    results.append({"index": index, "errors": errors})
+                    continue
+                chunk.append(data)
+                chunk_index.append(index)
+                if len(chunk) >= BULK_CHUNK_SIZE:
+                    flush()
+        except ValueError as e:
+            # битый JSON-массив: то, что уже разобрано, сохраняем, остальное — ошибка
+            flush()
+            results.sort(key=lambda r: r["index"])
+            inserted = sum(1 for r in results if "id" in r and not r.get("duplicate"))
+            duplicates = sum(1 for r in results if r.get("duplicate"))
+            return jsonify(
+                {"ok": False, "error": str(e), "inserted": inserted, "duplicates": duplicates, "results": results}
+            ), 400
+        flush()
+
+        results.sort(key=lambda r: r["index"])
+        # повторно присланные заявки — не ошибка: ретрай пачки целиком безопасен
+        inserted = sum(1 for r in results if "id" in r and not r.get("duplicate"))
+        duplicates = sum(1 for r in results if r.get("duplicate"))
+        failed = len(results) - inserted - duplicates
+        status = 201 if inserted else (400 if failed and not duplicates else 200)
+        return jsonify(
+            {
+                "ok": inserted > 0 or duplicates > 0 or not failed,
+                "inserted": inserted,
+                "duplicates": duplicates,
+                "failed": failed,
+                "results": results,
+            }
+        ), status
 
     @app.get("/loads/latest")
     def loads_latest():
@@ -199,22 +1745,78 @@ def create_app() -> Flask:
         except ValueError:
             limit = 30
 
-        loads = store.list_recent(limit=limit)
-        return jsonify(
-            {
+        cursor = request.args.get("cursor", "")
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid cursor"}), 400
+        try:
+            filters = list_filters()
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid filters"}), 400
+
+        fmt, gzip = negotiate()
+        latest = store.latest_version()
+        etag = loads_etag("latest", limit, latest, cursor, filters, fmt)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        def build() -> dict:
+            loads = store.list_page(limit=limit, before=before, **filters)
+            return {
                 "loads": [
                     {
+                        "id": item["id"],
                         "direction": item["direction"],
                         "cargo": item["cargo"],
                         "transport": item["transport"],
                         "date": item["load_date"],
                         "extra": item["extra"],
+                        "updated_at": item["updated_at"],
                     }
                     for item in loads
                 ],
-                "updated_at": store.latest_updated_at(),
+                "updated_at": latest["updated_at"] if latest else None,
+                "next_cursor": page_cursor(loads, limit),
             }
-        )
+
+        return encoded_response(etag, fmt, gzip, build)
+
+    @app.get("/metrics")
+    def metrics():
+        if not is_authorized(request):
+            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+    @app.get("/admin/sql")
+    def sql_report():
+        # ?top=20&order=total_ms|max_ms|calls|slow&format=text
+        if not is_authorized(request):
+            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+        if store.profiler is None:
+            return jsonify({"ok": False, "error": "SQL_PROFILE is off"}), 404
+        order = request.args.get("order", "total_ms")
+        if order not in ("total_ms", "max_ms", "calls", "slow"):
+            return jsonify({"ok": False, "error": "Invalid order"}), 400
+        try:
+            top = max(1, min(int(request.args.get("top", "20")), 200))
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid top"}), 400
+
+        report = store.sql_report(top, order)
+        if request.args.get("format") == "text":
+            return Response(format_report(report) + "\n", content_type="text/plain; charset=utf-8")
+        return jsonify({"ok": True, "slow_ms": store.profiler.slow_ms, "statements": report})
+
+    @app.delete("/admin/sql")
+    def sql_report_reset():
+        if not is_authorized(request):
+            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+        if store.profiler is None:
+            return jsonify({"ok": False, "error": "SQL_PROFILE is off"}), 404
+        store.profiler.reset()
+        return jsonify({"ok": True})
 
     @app.context_processor
     def inject_query_flags():
@@ -222,15 +1824,32 @@ def create_app() -> Flask:
         success_message = None
         if created:
             success_message = f"Заявка #{created} успешно сохранена."
-        return {"query_success_message": success_message}
+        return {"query_success_message": success_message, "csrf_token": csrf_token}
 
+    if SERVER_BACKGROUND:
+        start_background(app)
     return app
 
 
+def start_background(app: Flask) -> None:
+    # поток изменений и архивация: одни на процесс, повторный вызов ничего не делает
+    if app.extensions.get("background_started"):
+        return
+    app.extensions["background_started"] = True
+    if STREAM_ENABLED:
+        app.extensions["load_events"].start(STREAM_HOST, STREAM_PORT, os.getenv("SERVER_API_KEY", ""))
+    if ARCHIVE_ENABLED:
+        app.extensions["load_archiver"].start()
+
+
 app = create_app()
 
 
 if __name__ == "__main__":
     host = os.getenv("SERVER_HOST", "127.0.0.1")
     port = int(os.getenv("SERVER_PORT", "5004"))
-    app.run(host=host, port=port, debug=False)
+    start_background(app)
+    if SERVER_MODE == "dev":
+        app.run(host=host, port=port, debug=False, threaded=True)
+    else:
+        serve(app, host=host, port=port, threads=SERVER_THREADS, ident="load_server")
@@ -0,0 +1,211 @@
+import bisect
+import threading
+import time
+import weakref
+
+# Метрики в текстовом формате Prometheus без внешних зависимостей.
+# На горячем пути нет блокировок: каждый поток пишет в свой шард (dict в
+# threading.local), а при чтении /metrics шарды складываются. Шард
+# регистрируется под локом один раз на поток; когда поток завершается
+# (werkzeug заводит поток на каждый запрос), шард вливается в общий итог.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        out: list[str] = []
+        for metric in list(self._metrics):
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.samples())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    def __init__(self, name: str, help: str, labels: tuple = (), registry: Registry | None = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: dict[int, dict] = {}
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _shard(self) -> dict:
+        owner = getattr(self._local, "owner", None)
+        if owner is None:
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(owner.shard)] = owner.shard
+            # threading.local очищается при завершении потока — тогда и сливаем
+            weakref.finalize(owner, self._retire, owner.shard)
+        return owner.shard
+
+    def _retire(self, shard: dict):
+        with self._lock:
+            self._shards.pop(id(shard), None)
+            self._merge(self._retired, shard)
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            shards = list(self._shards.values())
+            total: dict = {}
+            self._merge(total, self._retired)
+        for shard in shards:
+            self._merge(total, shard)
+        return total
+
+
+class _ShardOwner:
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self):
+        self.shard: dict = {}
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    @staticmethod
+    def _merge(into: dict, shard: dict):
+        for key, value in list(shard.items()):
+            into[key] = into.get(key, 0) + value
+
+    def values(self) -> dict[tuple, float]:
+        return self._snapshot()
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), *, buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [счётчики по корзинам (последняя — +Inf), сумма, количество]
+            state = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, *labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    @staticmethod
+    def _merge(into: dict, shard: dict):
+        for key, (counts, sum_, count) in list(shard.items()):
+            acc = into.get(key)
+            if acc is None:
+                acc = into[key] = [[0] * len(counts), 0.0, 0]
+            for i, c in enumerate(counts):
+                acc[0][i] += c
+            acc[1] += sum_
+            acc[2] += count
+
+    def samples(self) -> list[str]:
+        out = []
+        for key, (counts, sum_, count) in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, c in zip((*self.buckets, float("inf")), counts):
+                cumulative += c
+                le = 'le="' + format_value(float(bound)) + '"'
+                out.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(sum_)}")
+            out.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Gauge:
+    # значение считается при чтении /metrics: fn() -> число или {labels: число}
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), fn=None, registry: Registry | None = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+        self._values: dict[tuple, float] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def samples(self) -> list[str]:
+        values = dict(self._values)
+        if self.fn is not None:
+            try:
+                got = self.fn()
+            except Exception:
+                got = None
+            if isinstance(got, dict):
+                values.update(got)
+            elif got is not None:
+                values[()] = got
+        return [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
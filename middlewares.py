@@ -0,0 +1,120 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from metrics import Counter, Histogram
+from ratelimit import TokenBucket
+
+HANDLER_LATENCY = Histogram("bot_handler_duration_seconds", "Update handling time per handler", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised", ("handler",))
+
+
+class MetricsMiddleware(BaseMiddleware):
+    # inner-middleware: к этому моменту фильтры пройдены и известен хендлер
+    # (start, loads, approve...), его имя и становится меткой
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+
+THROTTLED = Counter("bot_throttled_total", "Updates dropped before reaching a handler", ("event", "reason"))
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    # outer-middleware на dp.update, зарегистрированный раньше FSM (см. create_dispatcher
+    # в bot.py): флуд отсекается до чтения состояния FSM из bot.db, до фильтров и хендлеров.
+    # Смотрит только на message и callback_query, остальные апдейты пропускает.
+    # У каждого tg_id свой TokenBucket (rate в секунду, burst про запас); повтор той же
+    # callback-кнопки в пределах debounce секунд отбрасывается, не тратя токен.
+    # Состояние — LRU на maxsize пользователей, молчавшие дольше idle секунд выкидываются.
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 5.0,
+        *,
+        debounce: float = 1.0,
+        maxsize: int = 10000,
+        idle: float = 600.0,
+        exempt: set[int] | frozenset = frozenset(),
+        clock=time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.debounce = debounce
+        self.maxsize = maxsize
+        self.idle = idle
+        self.exempt = exempt
+        self._clock = clock
+        # tg_id -> [bucket, последние callback data, когда нажата, когда видели, предупреждён ли]
+        self._users: OrderedDict[int, list] = OrderedDict()
+
+    def _state(self, tg_id: int, now: float) -> list:
+        state = self._users.get(tg_id)
+        if state is None:
+            state = self._users[tg_id] = [TokenBucket(self.rate, self.burst, clock=self._clock), None, 0.0, now, False]
+        else:
+            self._users.move_to_end(tg_id)
+            state[3] = now
+        # в начале — те, кого дольше всех не было
+        while self._users:
+            oldest = next(iter(self._users.values()))
+            if len(self._users) <= self.maxsize and now - oldest[3] < self.idle:
+                break
+            self._users.popitem(last=False)
+        return state
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        # дальше по цепочке уходит сам апдейт, а проверяется сообщение или нажатие в нём
+        inner = (event.message or event.callback_query) if isinstance(event, Update) else event
+        user = getattr(inner, "from_user", None)
+        if user is None or user.id in self.exempt:
+            return await handler(event, data)
+
+        now = self._clock()
+        state = self._state(user.id, now)
+        is_callback = isinstance(inner, CallbackQuery)
+        kind = "callback" if is_callback else "message"
+
+        if is_callback and self.debounce > 0:
+            if inner.data == state[1] and now - state[2] < self.debounce:
+                THROTTLED.inc(kind, "debounce")
+                await inner.answer()
+                return None
+            state[1], state[2] = inner.data, now
+
+        if state[0].try_acquire():
+            state[4] = False
+            return await handler(event, data)
+
+        THROTTLED.inc(kind, "rate")
+        if is_callback:
+            await inner.answer("⏳ Слишком часто, подожди немного.")
+        elif not state[4] and isinstance(inner, Message):
+            # предупреждаем один раз за серию, дальше сообщения просто отбрасываются
+            await inner.answer("⏳ Слишком часто, подожди немного.")
+        state[4] = True
+        return None
@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+import logging
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from ratelimit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+HIGH = 0
+NORMAL = 1
+DIGEST = 2
+
+DIGEST_LIMIT = 3500
+
+
+class AdminNotifier:
+    # Фоновая очередь уведомлений админам: хендлер только кладёт сообщение
+    # в очередь и сразу отвечает пользователю. Мелкие события (DIGEST)
+    # копятся и уходят одной сводкой раз в digest_interval секунд.
+    def __init__(
+        self,
+        admins: set[int],
+        *,
+        rate: float = 10.0,
+        concurrency: int = 4,
+        digest_interval: float = 60.0,
+        max_attempts: int = 5,
+    ):
+        self.admins = admins
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.digest_interval = digest_interval
+        self.max_attempts = max_attempts
+
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._digest: list[str] = []
+        self._tasks: list[asyncio.Task] = []
+        self._bot = None
+
+        self.sent = 0
+        self.failed = 0
+
+    def notify(self, text: str, *, priority: int = NORMAL, reply_markup=None):
+        if priority == DIGEST:
+            self._digest.append(text)
+            return
+        for admin_id in self.admins:
+            self._put(priority, admin_id, text, reply_markup, attempt=0)
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _put(self, priority: int, chat_id: int, text: str, reply_markup, *, attempt: int):
+        self._queue.put_nowait((priority, next(self._seq), chat_id, text, reply_markup, attempt))
+
+    async def start(self, bot):
+        self._bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._digest_loop()))
+
+    async def stop(self, timeout: float = 5.0):
+        self._flush_digest()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("admin notifier stopped with %s messages in queue", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _digest_loop(self):
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            self._flush_digest()
+
+    def _flush_digest(self):
+        if not self._digest:
+            return
+        lines, self._digest = self._digest, []
+        chunk = [f"🗒 *Сводка за {int(self.digest_interval)} с* ({len(lines)})"]
+        size = len(chunk[0])
+        for line in lines:
+            if size + len(line) + 1 > DIGEST_LIMIT:
+                self.notify("\n".join(chunk), priority=NORMAL)
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line) + 1
+        if chunk:
+            self.notify("\n".join(chunk), priority=NORMAL)
+
+    async def _worker(self):
+        while True:
+            priority, _, chat_id, text, reply_markup, attempt = await self._queue.get()
+            try:
+                await self._send(priority, chat_id, text, reply_markup, attempt)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, priority: int, chat_id: int, text: str, reply_markup, attempt: int):
+        chat_bucket = self._chat_buckets.setdefault(chat_id, TokenBucket(1.0))
+        await chat_bucket.acquire()
+        await self.bucket.acquire()
+        try:
+            await self._bot.send_message(chat_id, text, reply_markup=reply_markup)
+        except TelegramRetryAfter as e:
+            self.bucket.pause(e.retry_after)
+            self._retry_later(e.retry_after, priority, chat_id, text, reply_markup, attempt)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            self.failed += 1
+            log.warning("admin notify to %s failed: %s", chat_id, e)
+        except Exception as e:
+            attempt += 1
+            if attempt >= self.max_attempts:
+                self.failed += 1
+                log.warning("admin notify to %s gave up after %s attempts: %r", chat_id, attempt, e)
+            else:
+                self._retry_later(2 ** attempt, priority, chat_id, text, reply_markup, attempt)
+        else:
+            self.sent += 1
+
+    def _retry_later(self, delay: float, priority: int, chat_id: int, text: str, reply_markup, attempt: int):
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, lambda: self._put(priority, chat_id, text, reply_markup, attempt=attempt))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "digest": len(self._digest),
+            "sent": self.sent,
+            "failed": self.failed,
+        }
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    # rate токенов в секунду, не больше capacity про запас
+    def __init__(self, rate: float, capacity: float | None = None, *, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        # через сколько секунд наберётся нужное количество токенов
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1.0):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+    def pause(self, seconds: float):
+        # RetryAfter от Telegram: никто не получает токены ближайшие seconds секунд
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
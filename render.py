@@ -0,0 +1,94 @@
+import re
+from collections import OrderedDict
+
+# лимит Telegram — 4096 символов (UTF-16) после разбора разметки;
+# разметка только добавляет символы, так что считаем по исходному тексту с запасом
+PAGE_LIMIT = 4000
+FIELD_LIMIT = 700
+
+MD_SPECIAL_RE = re.compile(r"([_*`\[])")
+
+
+def escape_md(s) -> str:
+    return MD_SPECIAL_RE.sub(r"\\\1", str(s))
+
+
+def tg_len(s: str) -> int:
+    # длина в единицах UTF-16, как её считает Telegram (эмодзи — 2)
+    return len(s.encode("utf-16-le")) // 2
+
+
+def clip(s, limit: int = FIELD_LIMIT) -> str:
+    s = str(s)
+    return s if len(s) <= limit else s[: limit - 1] + "…"
+
+
+class LoadRenderer:
+    # Каждая заявка рендерится (с экранированием Markdown) один раз и живёт
+    # в LRU-кэше по (id, updated_at); страницы собираются из готовых кусков.
+    def __init__(self, *, maxsize: int = 5000, page_limit: int = PAGE_LIMIT):
+        self.maxsize = maxsize
+        self.page_limit = page_limit
+        self._fragments: OrderedDict[tuple, tuple[str, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def fragment(self, item: dict) -> tuple[str, int]:
+        if "id" in item:
+            key = (item["id"], item.get("updated_at"))
+        else:
+            key = tuple(item.get(f, "") for f in ("direction", "cargo", "transport", "date", "extra"))
+        cached = self._fragments.get(key)
+        if cached is not None:
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        out = [
+            f"*Направление:* {escape_md(clip(item.get('direction', '—')))}",
+            f"*Карго и тоннаж:* {escape_md(clip(item.get('cargo', '—')))}",
+            f"*Тип транспорта:* {escape_md(clip(item.get('transport', '—')))}",
+        ]
+        if item.get("extra"):
+            out.append(f"*Доп информация:* {escape_md(clip(item['extra']))}")
+        out.append(f"*Дата:* {escape_md(clip(item.get('date', '—')))}")
+        text = "\n".join(out)
+        entry = (text, tg_len(text))
+        self._fragments[key] = entry
+        if len(self._fragments) > self.maxsize:
+            self._fragments.popitem(last=False)
+        return entry
+
+    def pages(self, data: dict, *, title: str = "🚚 *Актуальные заявки:*", empty: str = "Пока нет актуальных заявок.") -> list[str]:
+        if not (isinstance(data, dict) and isinstance(data.get("loads"), list)):
+            return [f"Ответ:\n`{str(data)[:3500].replace('`', '')}`"]
+        loads = data["loads"]
+        if not loads:
+            return [empty]
+
+        header = title
+        if data.get("updated_at"):
+            header += f"\n_Обновлено: {escape_md(data['updated_at'])}_"
+        # запас под "Стр. 12/34"
+        budget = self.page_limit - tg_len(header) - 20
+
+        chunks: list[list[str]] = [[]]
+        size = 0
+        for n, item in enumerate(loads, 1):
+            text, text_len = self.fragment(item)
+            prefix = f"\n\n*{n})*\n"
+            part_len = len(prefix) + text_len
+            if chunks[-1] and size + part_len > budget:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(prefix + text)
+            size += part_len
+
+        total = len(chunks)
+        if total == 1:
+            return [header + "".join(chunks[0])]
+        return [header + "".join(chunk) + f"\n\n_Стр. {i}/{total}_" for i, chunk in enumerate(chunks, 1)]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._fragments), "maxsize": self.maxsize}
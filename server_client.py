@@ -1,31 +1,239 @@
 ﻿import os
+import json
+import time
+import asyncio
+import logging
 import aiohttp
 
+import wire
+from metrics import Counter, Histogram
+
+log = logging.getLogger(__name__)
+
+SERVER_LATENCY = Histogram("bot_server_request_duration_seconds", "Calls to the loads server", ("endpoint",))
+SERVER_ERRORS = Counter("bot_server_errors_total", "Failed calls to the loads server", ("endpoint", "reason"))
+LOADS_CACHE = Counter("bot_loads_cache_total", "get_loads answers by cache state", ("result",))
+
 class ServerClient:
     def __init__(self):
         self.base = os.getenv("SERVER_BASE_URL", "").rstrip("/")
         self.endpoint = os.getenv("SERVER_ENDPOINT", "/loads/latest")
         self.api_key = os.getenv("SERVER_API_KEY", "")
         self.timeout = int(os.getenv("SERVER_TIMEOUT", "10"))
+        # формат ответов /loads/latest и /api/loads: json или msgpack; gzip aiohttp
+        # просит (Accept-Encoding) и распаковывает сам. JSON через orjson разбирается
+        # быстрее msgpack, а сжатый выходит не больше — msgpack для клиентов без gzip
+        self.format = wire.MSGPACK if os.getenv("SERVER_FORMAT", "json") == "msgpack" else wire.JSON
+
+        # пул keep-alive соединений к серверу заявок
+        self.pool_size = int(os.getenv("SERVER_POOL_SIZE", "20"))
+        self.pool_per_host = int(os.getenv("SERVER_POOL_PER_HOST", "10"))
+        self.keepalive = float(os.getenv("SERVER_KEEPALIVE", "30"))
+
+        self._session: aiohttp.ClientSession | None = None
+
+        # /loads/latest одинаков для всех пользователей — держим общий кэш
+        self.cache_ttl = float(os.getenv("SERVER_CACHE_TTL", "15"))
+        self.stale_ttl = float(os.getenv("SERVER_STALE_TTL", "300"))
+        self._cached: dict | None = None
+        self._cached_at = 0.0
+        self._etag: str | None = None
+        self._etags: dict[str, str | None] = {}
+        self._inflight: asyncio.Task | None = None
+
+        # SSE-поток изменений load_server (STREAM_PORT); пусто — только опрос
+        self.stream_base = os.getenv("SERVER_STREAM_URL", "").rstrip("/")
+        self.stream_heartbeat = float(os.getenv("SERVER_STREAM_HEARTBEAT", "15"))
+
+    async def start(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def get_loads(self, tg_id: int) -> dict:
         if not self.base:
             return {"ok": False, "error": "SERVER_BASE_URL not set"}
 
+        age = time.monotonic() - self._cached_at
+        if self._cached is not None and age < self.cache_ttl:
+            LOADS_CACHE.inc("fresh")
+            return self._cached
+
+        refresh = self._refresh()
+        if self._cached is not None and age < self.stale_ttl:
+            # stale-while-revalidate: отдаём последнее хорошее, обновляем в фоне
+            LOADS_CACHE.inc("stale")
+            return self._cached
+        LOADS_CACHE.inc("miss")
+        return await asyncio.shield(refresh)
+
+    def mark_stale(self):
+        # на сервере что-то поменялось: обновляем кэш в фоне сразу (запрос с ETag),
+        # не дожидаясь cache_ttl; до ответа пользователи видят прежний список
+        if self.base and self._cached is not None:
+            self._cached_at = min(self._cached_at, time.monotonic() - self.cache_ttl)
+            self._refresh()
+
+    async def stream_loads(self, on_connect=None):
+        # события SSE /api/loads/stream: {"loads": [...], "cursor": ..., "has_more": ...};
+        # on_connect вызывается, когда сервер принял подписку, — чтобы догнать пропущенное
+        headers = {"Accept": "text/event-stream"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        # сервер шлёт ping раз в heartbeat секунд; три пропуска подряд — соединение мёртвое
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.timeout, sock_read=self.stream_heartbeat * 3)
+
+        session = await self.start()
+        async with session.get(f"{self.stream_base}/api/loads/stream", headers=headers, timeout=timeout) as r:
+            if r.status != 200:
+                raise aiohttp.ClientResponseError(
+                    r.request_info, r.history, status=r.status, message=(await r.text())[:200]
+                )
+            if on_connect is not None:
+                await on_connect()
+            data: list[str] = []
+            async for raw in r.content:
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if not line:
+                    if data:
+                        yield json.loads("\n".join(data))
+                        data = []
+                    continue
+                if line.startswith(":"):
+                    continue
+                field, _, value = line.partition(":")
+                if field == "data":
+                    data.append(value[1:] if value.startswith(" ") else value)
+
+    def _refresh(self) -> asyncio.Task:
+        # все одновременные промахи ждут один и тот же запрос
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch_and_store())
+            self._inflight.add_done_callback(self._refresh_done)
+        return self._inflight
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._inflight = None
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("loads refresh failed: %r", task.exception())
+
+    async def _fetch_and_store(self) -> dict:
+        started = time.perf_counter()
+        try:
+            resp = await self._fetch_loads()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            SERVER_ERRORS.inc("latest", type(e).__name__)
+            resp = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        else:
+            if not resp.get("ok"):
+                SERVER_ERRORS.inc("latest", f"http_{resp.get('status')}")
+        SERVER_LATENCY.observe(time.perf_counter() - started, "latest")
+
+        if resp is self._cached:
+            # 304 Not Modified — переиспользуем закэшированный ответ
+            self._cached_at = time.monotonic()
+            return resp
+
+        if not resp.get("ok"):
+            if self._cached is not None and time.monotonic() - self._cached_at < self.stale_ttl:
+                log.warning("loads server error, serving cached list: %s", resp)
+                return self._cached
+            return resp
+
+        data = resp["data"]
+        version = data.get("updated_at") if isinstance(data, dict) else None
+        resp["version"] = version
+        if self._cached is not None and version is not None and self._cached.get("version") == version:
+            # данные не изменились — оставляем прежний объект вместе с отрендеренным текстом
+            resp = self._cached
+        self._cached = resp
+        self._cached_at = time.monotonic()
+        return resp
+
+    async def _fetch_loads(self) -> dict:
         url = f"{self.base}{self.endpoint}"
-        headers = {}
+        headers = {"Accept": wire.ACCEPT[self.format]}
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
+        if self._cached is not None and self._etag:
+            headers["If-None-Match"] = self._etag
+
+        session = await self.start()
+        async with session.get(url, headers=headers) as r:
+            ct = r.headers.get("content-type", "")
+            if r.status == 304 and self._cached is not None:
+                return self._cached
+            if r.status != 200:
+                text = await r.text()
+                return {"ok": False, "status": r.status, "body": text[:2000], "content_type": ct}
+            if r.content_type in wire.FORMATS:
+                data = wire.loads(await r.read(), r.content_type)
+                self._etag = r.headers.get("ETag")
+                return {"ok": True, "data": data}
+            return {"ok": True, "data": {"raw": (await r.text())[:4000]}}
+
+    async def get_recent_loads(self, limit: int = 100) -> dict:
+        # /api/loads с id заявок; при 304 -> {"ok": True, "not_modified": True}
+        return await self._api_get("/api/loads", {"limit": limit}, etag_key="recent", endpoint="recent")
 
-        params = {"tg_id": tg_id}
+    async def get_loads_after(self, after_id: int, limit: int = 100) -> dict:
+        # дельта: только заявки с id > after_id, по возрастанию id
+        return await self._api_get("/api/loads", {"after_id": after_id, "limit": limit}, endpoint="after_id")
+
+    async def search_loads(self, q: str, *, transport: str = "", limit: int = 30) -> dict:
+        # полнотекстовый поиск по активным заявкам (?q=, ?transport=)
+        params = {"q": q, "limit": limit}
+        if transport:
+            params["transport"] = transport
+        return await self._api_get("/api/loads", params, endpoint="search")
+
+    async def _api_get(
+        self, path: str, params: dict, *, etag_key: str | None = None, endpoint: str = "api"
+    ) -> dict:
+        if not self.base:
+            return {"ok": False, "error": "SERVER_BASE_URL not set"}
+        started = time.perf_counter()
+        try:
+            resp = await self._api_request(path, params, etag_key)
+        finally:
+            SERVER_LATENCY.observe(time.perf_counter() - started, endpoint)
+        if not resp.get("ok"):
+            # "ClientConnectorError: ..." -> ClientConnectorError
+            reason = f"http_{resp['status']}" if "status" in resp else resp["error"].split(":", 1)[0]
+            SERVER_ERRORS.inc(endpoint, reason)
+        return resp
+
+    async def _api_request(self, path: str, params: dict, etag_key: str | None) -> dict:
+        headers = {"Accept": wire.ACCEPT[self.format]}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        if etag_key and self._etags.get(etag_key):
+            headers["If-None-Match"] = self._etags[etag_key]
 
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, headers=headers, params=params) as r:
-                ct = r.headers.get("content-type", "")
+        session = await self.start()
+        try:
+            async with session.get(f"{self.base}{path}", headers=headers, params=params) as r:
+                if r.status == 304:
+                    return {"ok": True, "not_modified": True}
                 if r.status != 200:
-                    text = await r.text()
-                    return {"ok": False, "status": r.status, "body": text[:2000], "content_type": ct}
-                if "application/json" in ct:
-                    return {"ok": True, "data": await r.json()}
-                return {"ok": True, "data": {"raw": (await r.text())[:4000]}}
+                    return {"ok": False, "status": r.status, "body": (await r.text())[:2000]}
+                data = wire.loads(await r.read(), r.content_type)
+                if etag_key:
+                    self._etags[etag_key] = r.headers.get("ETag")
+                return {"ok": True, "data": data}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
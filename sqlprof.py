@@ -0,0 +1,194 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+# Профилировщик SQL для LoadStore и DB. Включается подменой класса соединения
+# (sqlite3.connect(..., factory=profiler.connection_factory)); выключенный
+# профилировщик ничего не стоит — соединения обычные.
+#
+# Каждый запрос засекается от execute() до первого fetch*() или конца
+# итерации, то есть вместе с чтением строк. Статистика копится по
+# нормализованному тексту (литералы -> ?, списки IN (...) схлопнуты);
+# EXPLAIN QUERY PLAN снимается для медленных запросов при построении отчёта,
+# с параметрами самого медленного вызова, а не на горячем пути.
+
+log = logging.getLogger(__name__)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+SPACE_RE = re.compile(r"\s+")
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+
+def normalize_sql(sql: str) -> str:
+    sql = STRING_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql)
+    sql = IN_LIST_RE.sub("IN (...)", sql)
+    return SPACE_RE.sub(" ", sql).strip()
+
+
+class SQLProfiler:
+    def __init__(self, *, slow_ms: float = 50.0, name: str = "sql"):
+        self.slow_ms = slow_ms
+        self.name = name
+        self._stats: dict[str, dict] = {}
+        self._normalized: dict[str, str] = {}
+        self._plans: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+        self.connection_factory = type("ProfiledConnection", (ProfiledConnection,), {"profiler": self})
+
+    def record(self, sql: str, params, elapsed: float):
+        ms = elapsed * 1000
+        key = self._normalized.get(sql)
+        if key is None:
+            key = normalize_sql(sql)
+            if len(self._normalized) < 10_000:
+                self._normalized[sql] = key
+        with self._lock:
+            st = self._stats.get(key)
+            if st is None:
+                st = self._stats[key] = {
+                    "sql": key, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0, "sample": None,
+                }
+            st["calls"] += 1
+            st["total_ms"] += ms
+            if ms > st["max_ms"]:
+                st["max_ms"] = ms
+                st["sample"] = (sql, params)
+            if ms >= self.slow_ms:
+                st["slow"] += 1
+        if ms >= self.slow_ms:
+            log.warning("%s: slow query %.1f ms: %s", self.name, ms, key[:300])
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._plans.clear()
+
+    def report(self, top: int = 20, order: str = "total_ms", explain_conn: sqlite3.Connection | None = None) -> list[dict]:
+        # order: total_ms / max_ms / calls / slow; план — только у запросов, бывших медленными
+        with self._lock:
+            rows = [dict(st) for st in self._stats.values()]
+        rows.sort(key=lambda st: st[order], reverse=True)
+        out = []
+        for st in rows[:top]:
+            sql, params = st.pop("sample") or (st["sql"], None)
+            st["avg_ms"] = round(st["total_ms"] / st["calls"], 3)
+            st["total_ms"] = round(st["total_ms"], 3)
+            st["max_ms"] = round(st["max_ms"], 3)
+            if st["slow"] and explain_conn is not None:
+                st["plan"] = self._plan(explain_conn, st["sql"], sql, params)
+            out.append(st)
+        return out
+
+    def _plan(self, conn: sqlite3.Connection, key: str, sql: str, params) -> list[str]:
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+        if not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return []
+        if params is None or isinstance(params, dict):
+            params = params or ()
+        try:
+            if not params and "?" in sql:
+                params = (None,) * sql.count("?")
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plan = [row[3] for row in rows]
+        except sqlite3.Error as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        self._plans[key] = plan
+        return plan
+
+
+def format_report(rows: list[dict]) -> str:
+    out = []
+    for n, st in enumerate(rows, 1):
+        out.append(
+            f"{n}. calls={st['calls']} total={st['total_ms']:.1f}ms avg={st['avg_ms']:.3f}ms "
+            f"max={st['max_ms']:.1f}ms slow={st['slow']}"
+        )
+        out.append(f"   {st['sql'][:500]}")
+        for line in st.get("plan", []):
+            out.append(f"     plan: {line}")
+    return "\n".join(out)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    # profiler подставляет SQLProfiler.connection_factory
+    profiler: SQLProfiler
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or ProfiledCursor)
+
+    def execute(self, sql, parameters=(), /):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        return self.cursor().executemany(sql, parameters)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    _sql = None
+
+    def execute(self, sql, parameters=(), /):
+        self._finish()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._begin(sql, parameters, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, parameters, /):
+        self._finish()
+        # генератор не трогаем, для плана хватит NULL вместо параметров
+        sample = parameters[0] if isinstance(parameters, (list, tuple)) and parameters else None
+        started = time.perf_counter()
+        super().executemany(sql, parameters)
+        self._begin(sql, sample, time.perf_counter() - started)
+        return self
+
+    def _begin(self, sql, params, elapsed: float):
+        self._sql, self._params, self._elapsed = sql, params, elapsed
+        if self.description is None:
+            # не SELECT и без RETURNING — запрос уже выполнен целиком
+            self._finish()
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            self.connection.profiler.record(sql, self._params, self._elapsed)
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            if self._sql is not None:
+                self._elapsed += time.perf_counter() - started
+                self._finish()
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, self.arraysize if size is None else size)
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        finally:
+            if self._sql is not None:
+                self._elapsed += time.perf_counter() - started
+
+    def close(self):
+        self._finish()
+        super().close()
@@ -0,0 +1,165 @@
+import functools
+import itertools
+import logging
+import time
+
+from textnorm import normalize_city, split_route, tokens
+
+log = logging.getLogger(__name__)
+
+FIELDS = ("origin", "dest", "transport")
+# origin и dest сравниваются после normalize_city: "Toshkent" = "Ташкент", "Moscow" = "Москва"
+CITY_FIELDS = (0, 1)
+
+# какие поля заданы у подписки: все непустые комбинации origin/dest/transport
+FIELD_MASKS = [
+    mask
+    for size in range(1, len(FIELDS) + 1)
+    for mask in itertools.combinations(range(len(FIELDS)), size)
+]
+
+# защита от длинного текста в direction: ключей на заявку не больше 8^3 на маску
+MAX_FIELD_TOKENS = 8
+
+ANY = {"", "*", "любой", "любое", "any"}
+
+
+def parse_subscription(text: str) -> dict:
+    # "Ташкент - Москва / Реф", "Ташкент -", "- Москва", "/ Реф"; "*" = любое значение
+    route, _, transport = (text or "").partition("/")
+    origin, dest = split_route(route.strip())
+
+    sub = {}
+    for field, value in zip(FIELDS, (origin, dest, transport)):
+        value = value.strip()[:100]
+        sub[field] = "" if value.lower() in ANY else value
+    if not any(tokens(sub[field]) for field in FIELDS):
+        raise ValueError("empty subscription")
+    return sub
+
+
+def describe_subscription(sub: dict) -> str:
+    origin = sub.get("origin") or "любой"
+    dest = sub.get("dest") or "любой"
+    out = f"{origin} → {dest}"
+    if sub.get("transport"):
+        out += f", {sub['transport']}"
+    return out
+
+
+@functools.lru_cache(maxsize=4096)
+def field_tokens(value: str, city: bool = False) -> frozenset[str]:
+    # при сборке индекса одни и те же города повторяются тысячи раз
+    return frozenset(tokens(normalize_city(value) if city else value))
+
+
+def load_fields(item: dict) -> tuple[set[str], set[str], set[str]]:
+    origin, dest = split_route(item.get("direction", ""))
+    return (
+        set(tokens(normalize_city(origin))[:MAX_FIELD_TOKENS]),
+        set(tokens(normalize_city(dest))[:MAX_FIELD_TOKENS]),
+        set(tokens(item.get("transport", ""))[:MAX_FIELD_TOKENS]),
+    )
+
+
+class RouteMatcher:
+    # Инвертированный индекс подписок. Каждая подписка лежит ровно под одним
+    # ключом: по одному (самому длинному) токену из каждого заданного поля,
+    # например ((0, "tashkent"), (2, "ref")). Для заявки перебираем только
+    # ключи, которые из неё можно составить, — их десятки, а не число подписок.
+    # Остальные токены многословных полей ("Ташкентская обл.") проверяются
+    # у найденных кандидатов; однословные подписки берутся без проверки.
+    def __init__(self):
+        # ключ -> (точные: sub_id -> tg_id, с проверкой: sub_id -> (tg_id, check))
+        self._index: dict[tuple, tuple[dict[int, int], dict[int, tuple[int, tuple]]]] = {}
+        self._keys: dict[int, tuple] = {}
+        self._owners: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, rows):
+        started = time.perf_counter()
+        self._index.clear()
+        self._keys.clear()
+        self._owners.clear()
+        for row in rows:
+            self.add(row)
+        field_tokens.cache_clear()
+        log.info(
+            "route index: %s subscriptions, %s keys in %.0f ms",
+            len(self._keys), len(self._index), (time.perf_counter() - started) * 1000,
+        )
+
+    def add(self, row: dict):
+        key = []
+        check = []
+        for i, field in enumerate(FIELDS):
+            toks = field_tokens(row.get(field) or "", i in CITY_FIELDS)
+            if not toks:
+                continue
+            anchor = max(toks, key=lambda t: (len(t), t))
+            key.append((i, anchor))
+            if len(toks) > 1:
+                check.append((i, toks - {anchor}))
+        if not key:
+            return
+        key = tuple(key)
+        sub_id, tg_id = int(row["id"]), int(row["tg_id"])
+        if sub_id in self._keys:
+            self.remove(sub_id)
+        exact, checked = self._index.setdefault(key, ({}, {}))
+        if check:
+            checked[sub_id] = (tg_id, tuple(check))
+        else:
+            exact[sub_id] = tg_id
+        self._keys[sub_id] = key
+        self._owners[tg_id] = self._owners.get(tg_id, 0) + 1
+
+    def remove(self, sub_id: int):
+        key = self._keys.pop(sub_id, None)
+        if key is None:
+            return
+        exact, checked = self._index[key]
+        if sub_id in exact:
+            tg_id = exact.pop(sub_id)
+        else:
+            tg_id, _ = checked.pop(sub_id)
+        if not exact and not checked:
+            del self._index[key]
+        left = self._owners[tg_id] - 1
+        if left:
+            self._owners[tg_id] = left
+        else:
+            del self._owners[tg_id]
+
+    def has_subscriptions(self, tg_id: int) -> bool:
+        return tg_id in self._owners
+
+    def match(self, item: dict) -> set[int]:
+        fields = load_fields(item)
+        matched: set[int] = set()
+        index = self._index
+        for mask in FIELD_MASKS:
+            values = [fields[i] for i in mask]
+            if not all(values):
+                continue
+            for combo in itertools.product(*values):
+                posting = index.get(tuple(zip(mask, combo)))
+                if posting is None:
+                    continue
+                exact, checked = posting
+                matched.update(exact.values())
+                for tg_id, check in checked.values():
+                    if all(rest <= fields[i] for i, rest in check):
+                        matched.add(tg_id)
+        return matched
+
+    def recipients(self, chat_ids: list[int], item: dict) -> list[int]:
+        # без подписок пользователь получает все заявки, с подписками — только подходящие
+        matched = self.match(item)
+        owners = self._owners
+        return [chat_id for chat_id in chat_ids if chat_id not in owners or chat_id in matched]
+
+    def stats(self) -> dict:
+        return {"subscriptions": len(self._keys), "keys": len(self._index), "users": len(self._owners)}
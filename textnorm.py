@@ -0,0 +1,124 @@
+import re
+
+# кириллица (русская и узбекская) -> латиница; "Ташкент" и "Tashkent" сводятся к "tashkent"
+CYR_TO_LAT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h", "і": "i", "ї": "yi", "є": "ye",
+}
+
+# разные латинские написания одного звука
+LAT_VARIANTS = (
+    ("kh", "h"),
+    ("x", "h"),
+    ("q", "k"),
+    ("shch", "sh"),
+    ("ts", "c"),
+    ("yo", "e"),
+    ("ʻ", ""),
+    ("'", ""),
+    ("`", ""),
+)
+
+NON_WORD_RE = re.compile(r"[^0-9a-z]+")
+
+_TRANSLIT = str.maketrans(CYR_TO_LAT)
+
+
+def fold(text: str | None) -> str:
+    # нормальная форма для поиска: нижний регистр, латиница, только [0-9a-z] и пробелы
+    if not text:
+        return ""
+    s = text.lower().translate(_TRANSLIT)
+    for src, dst in LAT_VARIANTS:
+        s = s.replace(src, dst)
+    return NON_WORD_RE.sub(" ", s).strip()
+
+
+def tokens(text: str | None) -> list[str]:
+    return fold(text).split()
+
+
+# разделитель в конце ("Санкт-Петербург -") — тоже разделитель, а не дефис в названии
+ROUTE_SEP_RE = re.compile(r"\s+[-–—>]+(?:\s+|$)|\s*(?:→|—|–|->)\s*")
+
+
+def split_route(direction: str | None) -> tuple[str, str]:
+    # "Ташкент - Москва" -> ("Ташкент", "Москва"); дефис без пробелов ("Улан-Удэ")
+    # разделителем считается, только если других нет
+    if not direction:
+        return "", ""
+    parts = ROUTE_SEP_RE.split(direction, maxsplit=1)
+    if len(parts) == 1:
+        parts = direction.split("-", 1)
+    if len(parts) == 1:
+        return direction.strip(), ""
+    return parts[0].strip(), parts[1].strip()
+
+
+# города: узбекское, английское и бытовое написание -> одно (русское в латинице, как его даёт fold)
+CITY_ALIASES = {
+    "toshkent": "tashkent",
+    "moscow": "moskva",
+    "msk": "moskva",
+    "spb": "sankt peterburg",
+    "piter": "sankt peterburg",
+    "peterburg": "sankt peterburg",
+    "saint petersburg": "sankt peterburg",
+    "st petersburg": "sankt peterburg",
+    "fargona": "fergana",
+    "andijon": "andizhan",
+    "andijan": "andizhan",
+    "buhoro": "buhara",
+    "bukhara": "buhara",
+    "urganch": "urgench",
+    "termiz": "termez",
+    "jizzah": "dzhizak",
+    "jizzakh": "dzhizak",
+    "jizak": "dzhizak",
+    "navoiy": "navoi",
+    "guliston": "gulistan",
+    "kokon": "kokand",
+    "alma ata": "almaty",
+    "almati": "almaty",
+    "nur sultan": "astana",
+    "frunze": "bishkek",
+    "istanbul": "stambul",
+    "ekb": "ekaterinburg",
+    "yekaterinburg": "ekaterinburg",
+}
+
+# "г. Ташкент", "Ташкентская обл." — служебные слова в названии не нужны
+CITY_NOISE = {"g", "gor", "gorod", "shahri", "shahar", "obl", "oblast", "viloyati", "city", "rn", "rayon", "tumani"}
+
+
+def normalize_city(name: str | None) -> str:
+    # "Toshkent", "г. Ташкент" и "Tashkent" -> "tashkent"; неизвестный город остаётся как есть после fold
+    folded = fold(name)
+    if folded in CITY_ALIASES:
+        return CITY_ALIASES[folded]
+    words = [w for w in folded.split() if w not in CITY_NOISE]
+    folded = " ".join(words)
+    return CITY_ALIASES.get(folded, folded)
+
+
+WEIGHT_RE = re.compile(
+    r"(\d+(?:[.,]\d+)?)(?:\s*-\s*(\d+(?:[.,]\d+)?))?\s*"
+    r"(тонн\w*|тн\b|т\b|t\b|tn\b|tonn\w*|tons?\b|кг\b|kg\b)",
+    re.IGNORECASE,
+)
+
+
+def parse_weight(cargo: str | None) -> float | None:
+    # "Текстиль, 20 тонн" -> 20.0; "18-20 т" -> 20.0 (берём верхнюю границу); "500 кг" -> 0.5
+    if not cargo:
+        return None
+    m = WEIGHT_RE.search(cargo)
+    if m is None:
+        return None
+    value = float((m.group(2) or m.group(1)).replace(",", "."))
+    if m.group(3).lower() in ("кг", "kg"):
+        value /= 1000
+    return round(value, 3)
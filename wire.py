@@ -0,0 +1,31 @@
+import gzip
+
+import msgpack
+import orjson
+
+# Форматы ответов load_server для бота: JSON (через orjson — быстрее json и
+# сразу UTF-8, без \u-экранирования кириллицы) или MessagePack. Формат выбирается
+# по Accept, gzip поверх — по Accept-Encoding.
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+FORMATS = (JSON, MSGPACK)
+# что просит клиент: MessagePack, если сервер умеет, иначе JSON
+ACCEPT = {JSON: JSON, MSGPACK: f"{MSGPACK}, {JSON};q=0.9"}
+
+
+def dumps(obj, fmt: str = JSON) -> bytes:
+    if fmt == MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True)
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def loads(body: bytes, fmt: str = JSON):
+    if fmt == MSGPACK:
+        return msgpack.unpackb(body)
+    return orjson.loads(body)
+
+
+def compress(body: bytes, level: int = 6) -> bytes:
+    # mtime=0: одинаковые данные дают одинаковые байты
+    return gzip.compress(body, compresslevel=level, mtime=0)